@@ -0,0 +1,64 @@
+"""Compare the per-update overhead of the middlewares chained layer by layer and of the fused pipeline.
+Run: python -m benchmarks.middlewares
+"""
+import asyncio
+import timeit
+
+from swiftbots import ChatBot, SwiftBots
+from swiftbots.middlewares import chain_middlewares, compose_middlewares
+
+UPDATES_COUNT = 2000
+REPEATS = 20
+
+
+def make_bot() -> ChatBot:
+    bot = ChatBot()
+
+    @bot.listener()
+    async def listen_async():
+        while True:
+            yield {'message': 'add note apple, cheese', 'sender': 'user'}
+
+    @bot.sender()
+    async def send_async(message, user):
+        pass
+
+    @bot.message_handler(commands=['add note'])
+    async def add_note(args: str):
+        pass
+
+    @bot.default_handler()
+    async def default_handler():
+        pass
+
+    SwiftBots().add_bots([bot])
+    return bot
+
+
+def measure(bot: ChatBot, entry) -> float:
+    async def handle_updates() -> None:
+        generator = bot.listener_func()
+        for _ in range(UPDATES_COUNT):
+            generator = await entry(generator)
+        await generator.aclose()
+
+    loop = asyncio.new_event_loop()
+    try:
+        return min(timeit.repeat(lambda: loop.run_until_complete(handle_updates()), number=1, repeat=REPEATS))
+    finally:
+        loop.close()
+
+
+def main() -> None:
+    bot = make_bot()
+    entries = {
+        'chained': chain_middlewares(bot, bot._middlewares),
+        'fused': compose_middlewares(bot, bot._middlewares),
+    }
+    for name, entry in entries.items():
+        seconds = measure(bot, entry)
+        print(f'{name} middlewares: {seconds / UPDATES_COUNT * 1e6:.2f} us per update')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Compare the compiled and the pure-Python implementations of the trie search.
+Run: python -m benchmarks.search_trie
+"""
+import random
+import string
+import timeit
+
+from swiftbots.c_ext import SEARCH_IMPLEMENTATION, search_py
+from swiftbots.message_handlers import (
+    CompiledChatCommand,
+    build_command_index,
+    compile_command_as_regex,
+    insert_trie,
+    search_best_command_match,
+)
+
+COMMANDS_COUNT = 2000
+MESSAGES_COUNT = 1000
+REPEATS = 20
+
+
+def random_word(length: int) -> str:
+    return ''.join(random.choices(string.ascii_lowercase, k=length))
+
+
+def main() -> None:
+    random.seed(0)
+    names = {random_word(random.randint(3, 12)) for _ in range(COMMANDS_COUNT)}
+    commands = [CompiledChatCommand(name, lambda: None, compile_command_as_regex(name), None, None) for name in names]
+    trie: dict = {}
+    for command in commands:
+        insert_trie(trie, command.command_name, command)
+    known = list(names)
+    messages = [
+        f'{random.choice(known)} {random_word(20)}' if i % 2 else random_word(15)
+        for i in range(MESSAGES_COUNT)
+    ]
+    words = [message.lower() for message in messages]
+
+    implementations = {'python': search_py.search_trie}
+    try:
+        from swiftbots.c_ext import search_ext
+        implementations['c'] = search_ext.search_trie
+    except ImportError:
+        print('The C extension is not built, only the pure-Python implementation is measured')
+
+    for name, search_trie in implementations.items():
+        seconds = min(timeit.repeat(lambda: [search_trie(trie, word) for word in words], number=1, repeat=REPEATS))
+        print(f'search_trie ({name}): {seconds / MESSAGES_COUNT * 1e6:.2f} us per message')
+
+    seconds = min(timeit.repeat(lambda: [search_best_command_match(trie, message) for message in messages],
+                                number=1, repeat=REPEATS))
+    print(f'search_best_command_match ({SEARCH_IMPLEMENTATION}): {seconds / MESSAGES_COUNT * 1e6:.2f} us per message')
+
+    index = build_command_index(commands)
+    seconds = min(timeit.repeat(lambda: [index.match(message) for message in messages], number=1, repeat=REPEATS))
+    print(f'CommandIndex.match: {seconds / MESSAGES_COUNT * 1e6:.2f} us per message')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,7 @@
-from swiftbots.tasks.triggers import PeriodTrigger as PeriodTrigger
+from swiftbots.tasks.triggers import (PeriodTrigger as PeriodTrigger,
+                                     JitteredPeriodTrigger as JitteredPeriodTrigger,
+                                     CronTrigger as CronTrigger,
+                                     AtTrigger as AtTrigger)
 from swiftbots.functions import depends as depends
 from swiftbots.bots import (Bot as Bot,
                             StubBot as StubBot,
@@ -0,0 +1,94 @@
+import asyncio
+import inspect
+import os
+from collections.abc import Awaitable, Callable, Iterable
+from pathlib import Path
+from typing import cast
+
+AccessListSource = str | os.PathLike | Callable[[], Iterable[str | int] | Awaitable[Iterable[str | int]]]
+
+
+class AccessList:
+    """An immutable set of users checked in O(1), which can be shared by many commands and bots.
+    Users are compared case-insensitively as strings, so `123` and `'123'` are the same user.
+    Users may be loaded from a source: a text file with one user per line (empty lines
+    and lines starting with `#` are skipped) or a function returning users, which may be asynchronous.
+    If `refresh_interval` is set, the bot using the list reloads it in the background with this period.
+    A reloaded set replaces the old one at once, so checks never see a partially loaded list.
+    """
+
+    __slots__ = ('__loaded', '__static_users', '__users', 'refresh_interval', 'source')
+
+    def __init__(self,
+                 users: Iterable[str | int] = (),
+                 source: AccessListSource | None = None,
+                 refresh_interval: float | None = None,
+                 ):
+        """:param users: users which are always in the list, along with the users from the source.
+        :param source: a path to a file or a function returning users.
+        :param refresh_interval: number of seconds between reloads of the source.
+        """
+        assert refresh_interval is None or refresh_interval > 0, 'Refresh interval must be positive'
+        assert source is not None or refresh_interval is None, 'Only a list with a source can be refreshed'
+        self.source = source
+        self.refresh_interval = refresh_interval
+        self.__users = make_users_set(users)
+        self.__static_users = self.__users
+        self.__loaded = source is None
+
+    @property
+    def users(self) -> frozenset[str]:
+        return self.__users
+
+    @property
+    def is_loaded(self) -> bool:
+        """Whether the users from the source are loaded at least once"""
+        return self.__loaded
+
+    @property
+    def is_async(self) -> bool:
+        """Whether the source is an asynchronous function, which can't be loaded with `load`"""
+        return callable(self.source) and inspect.iscoroutinefunction(self.source)
+
+    def __contains__(self, user: str | int) -> bool:
+        return str(user).casefold() in self.__users
+
+    def __len__(self) -> int:
+        return len(self.__users)
+
+    def load(self) -> None:
+        """Load the users from the source synchronously. Used when the bot is built"""
+        assert not self.is_async, 'Asynchronous source must be loaded with `load_async`'
+        self.__set_users(self.__read_source())
+
+    async def load_async(self) -> None:
+        """Load the users from the source without blocking the event loop"""
+        if self.is_async:
+            load_users = cast('Callable[[], Awaitable[Iterable[str | int]]]', self.source)
+            users = await load_users()
+        else:
+            users = await asyncio.to_thread(self.__read_source)
+        self.__set_users(users)
+
+    def __read_source(self) -> Iterable[str | int]:
+        source = self.source
+        if source is None:
+            return ()
+        if callable(source):
+            return cast('Iterable[str | int]', source())
+        lines = (line.strip() for line in Path(source).read_text(encoding='utf-8').splitlines())
+        return [line for line in lines if line and not line.startswith('#')]
+
+    def __set_users(self, users: Iterable[str | int]) -> None:
+        self.__users = self.__static_users | make_users_set(users)
+        self.__loaded = True
+
+
+def make_users_set(users: Iterable[str | int]) -> frozenset[str]:
+    return frozenset(str(user).casefold() for user in users)
+
+
+def make_access_list(users: 'AccessList | Iterable[str | int] | None') -> AccessList | None:
+    if users is None or isinstance(users, AccessList):
+        return users
+    return AccessList(users)
@@ -2,9 +2,8 @@ import asyncio
 from textwrap import wrap
 from typing import Any
 
-import httpx
-
 from swiftbots.all_types import ExitApplicationException, StartBotException
+from swiftbots.http_clients import HttpClientPool, get_default_http_pool
 from swiftbots.runners import get_all_tasks
 
 
@@ -65,40 +64,53 @@ async def start_bot_async(bot_name: str) -> int:
 
 
 async def send_telegram_message_async(
-    message: str, admin: str, token: str, data: dict[str, Any] | None = None,
+    message: str,
+    admin: str,
+    token: str,
+    data: dict[str, Any] | None = None,
+    http_pool: HttpClientPool | None = None,
 ) -> None:
+    """:param http_pool: pooled connections to send the message. The default app pool is used if not set.
+    """
     if data is None:
         data = {}
 
     is_traceback = "Traceback" in message and "parse_mode" not in data
-    async with httpx.AsyncClient() as session:
-        for msg in wrap(
-                message,
-                4096,
-                expand_tabs=False,
-                replace_whitespace=False,
-                fix_sentence_endings=False,
-                break_long_words=False,
-                break_on_hyphens=False,
-                drop_whitespace=False,
-        ):
-            send_data = {
-                "chat_id": admin,
-                "text": f"```\n{msg}\n```" if is_traceback else msg,
-            }
-            if is_traceback:
-                send_data["parse_mode"] = "markdown"
-            send_data.update(data)
-            await session.post(
-                f"https://api.telegram.org/bot{token}/sendMessage", json=send_data,
-            )
+    session = (http_pool or get_default_http_pool()).async_client
+    for msg in wrap(
+            message,
+            4096,
+            expand_tabs=False,
+            replace_whitespace=False,
+            fix_sentence_endings=False,
+            break_long_words=False,
+            break_on_hyphens=False,
+            drop_whitespace=False,
+    ):
+        send_data = {
+            "chat_id": admin,
+            "text": f"```\n{msg}\n```" if is_traceback else msg,
+        }
+        if is_traceback:
+            send_data["parse_mode"] = "markdown"
+        send_data.update(data)
+        await session.post(
+            f"https://api.telegram.org/bot{token}/sendMessage", json=send_data,
+        )
 
 
 def send_telegram_message(
-    message: str, admin: str, token: str, data: dict[str, Any] | None = None,
+    message: str,
+    admin: str,
+    token: str,
+    data: dict[str, Any] | None = None,
+    http_pool: HttpClientPool | None = None,
 ) -> None:
+    """:param http_pool: pooled connections to send the message. The default app pool is used if not set.
+    """
     if data is None:
         data = {}
+    session = (http_pool or get_default_http_pool()).client
     is_traceback = "Traceback" in message and "parse_mode" not in data
     for msg in wrap(
             message,
@@ -117,4 +129,4 @@ def send_telegram_message(
         if is_traceback:
             send_data["parse_mode"] = "markdown"
         send_data.update(data)
-        httpx.post(f"https://api.telegram.org/bot{token}/sendMessage", json=send_data)
+        session.post(f"https://api.telegram.org/bot{token}/sendMessage", json=send_data)
@@ -0,0 +1,37 @@
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from swiftbots.tasks.job_stores import JobState
+
+
+class IJobStore(ABC):
+    """Keeps the run times of tasks between restarts of the app.
+    Tasks are identified by names, so give names to tasks which must be persisted.
+    """
+
+    @abstractmethod
+    def load(self, name: str) -> 'JobState | None':
+        """Return the saved state of the task or None if the task has never been run"""
+        ...
+
+    @abstractmethod
+    def save(self, name: str, state: 'JobState') -> None:
+        """Remember the state of the task. It may be written to the storage later, on `flush_async`"""
+        ...
+
+    @abstractmethod
+    def delete(self, name: str) -> None:
+        """Forget the state of the task. It's called when the task is unscheduled"""
+        ...
+
+    async def flush_async(self) -> None:
+        """Write the states saved since the last flush to the storage.
+        Schedulers call it once per iteration, so the states are written in batches.
+        Does nothing by default, for stores which write the states right in `save`.
+        """
+        return
+
+    async def close_async(self) -> None:
+        """Flush the states and release the resources of the storage"""
+        await self.flush_async()
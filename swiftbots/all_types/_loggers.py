@@ -9,6 +9,15 @@ class ILogger(ABC):
 
     bot_name: str
 
+    def is_enabled_for(self, level: int) -> bool:
+        """Whether a message with the level (e.g. `logging.INFO`) would be logged.
+        Use it to skip preparing expensive arguments of a message.
+        Messages may also be given as %-style format strings with arguments, which are formatted lazily.
+        By default, messages of every level are logged.
+        """
+        del level
+        return True
+
     @abstractmethod
     async def debug_async(self, msg: str, *args, **kwargs) -> None:
         """Logs a message with level DEBUG on this logger"""
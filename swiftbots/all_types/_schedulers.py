@@ -13,6 +13,7 @@ class IScheduler(ABC):
                  caller: Callable[[], Any],
                  ) -> None:
         """Add the task as a candidate for scheduling.
+        A task which won't run at all isn't kept, so `has_task` tells whether it's scheduled.
         """
         ...
 
@@ -21,11 +22,22 @@ class IScheduler(ABC):
         """Unschedule task by name. This task won't be executed until `add_task` will be called"""
         ...
 
+    def delete_task(self, name: str) -> None:
+        """Unschedule the task if it's scheduled and forget its saved state, e.g. the last run time.
+        Schedulers with job stores should override it to delete the state from the store.
+        """
+        if self.has_task(name):
+            self.remove_task(name)
+
     @abstractmethod
     def list_tasks(self) -> list[str]:
         """Return a list of tasks which now are scheduled"""
         ...
 
+    def has_task(self, name: str) -> bool:
+        """Whether the task is scheduled now. Schedulers should override it with a faster check"""
+        return name in self.list_tasks()
+
     @abstractmethod
     async def start(self) -> None:
         """The framework will call this method once, just when the app is started.
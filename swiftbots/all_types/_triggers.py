@@ -1,9 +1,22 @@
 from abc import ABC, abstractmethod
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 
 class ITrigger(ABC):
-    ...
+    @abstractmethod
+    def next_fire_after(self, t: datetime) -> datetime | None:
+        """When the trigger fires next time after the moment `t`, which is the last run of the task
+        or the moment the task was scheduled. None if the trigger won't fire anymore.
+        Schedulers call it once per run, so the result can be random (e.g. jittered).
+        """
+        ...
+
+    def first_fire_time(self, start: datetime) -> datetime | None:
+        """When the trigger fires first if the task is scheduled at the moment `start` and has never been run.
+        Triggers fixed to a moment return it even if it's already past, then the misfire policy of the task
+        is applied to it.
+        """
+        return self.next_fire_after(start)
 
 
 class IPeriodTrigger(ITrigger, ABC):
@@ -26,3 +39,6 @@ class IPeriodTrigger(ITrigger, ABC):
     @abstractmethod
     def get_period(self) -> timedelta:
         ...
+
+    def next_fire_after(self, t: datetime) -> datetime | None:
+        return t + self.get_period()
@@ -4,6 +4,7 @@ from typing import Any
 from swiftbots.all_types import ILogger, ILoggerFactory, IScheduler
 from swiftbots.app.container import AppContainer
 from swiftbots.bots import Bot, build_scheduler
+from swiftbots.http_clients import HttpClientPool, get_default_http_pool
 from swiftbots.loggers import SysIOLoggerFactory
 from swiftbots.runners import run_async
 from swiftbots.tasks.schedulers import SimpleScheduler
@@ -14,7 +15,11 @@ class SwiftBots:
                  logger_factory: ILoggerFactory | None = None,
                  scheduler: IScheduler | None = None,
                  runner: Callable[[AppContainer, ...], Any] | None = None,
+                 http_pool: HttpClientPool | None = None,
                  ):
+        """:param http_pool: HTTP connections shared by all the bots. By default, the pool
+        from `get_default_http_pool` is used, which is also used by admin reporters.
+        """
         assert logger_factory is None or isinstance(
             logger_factory, ILoggerFactory,
         ), "Logger factory must be of type ILoggerFactory"
@@ -24,6 +29,7 @@ class SwiftBots:
         self.__logger: ILogger = self.__logger_factory.get_logger()
         self.__scheduler: IScheduler = scheduler or SimpleScheduler()
         self.__runner: Callable[[AppContainer, ...], Any] = runner or run_async
+        self.__http_pool: HttpClientPool = http_pool or get_default_http_pool()
 
     def add_bot(self, bot: Bot) -> None:
         assert isinstance(bot, Bot), "Bot must be of type Bot or an inherited class"
@@ -34,6 +40,8 @@ class SwiftBots:
 
         bot.build()
         bot.assert_configured()
+        if bot._http_pool is None:
+            bot._http_pool = self.__http_pool
 
         self.__bots[bot.name] = bot
 
@@ -58,6 +66,6 @@ class SwiftBots:
 
         if scheduler_enabled:
             build_scheduler(bots, self.__scheduler)
-        app_container = AppContainer(bots, self.__logger, self.__scheduler)
+        app_container = AppContainer(bots, self.__logger, self.__scheduler, self.__http_pool)
 
         self.__runner(app_container, *args, **kwargs)
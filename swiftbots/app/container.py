@@ -4,9 +4,11 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from swiftbots.all_types import ILogger, IScheduler
     from swiftbots.bots import Bot
+    from swiftbots.http_clients import HttpClientPool
 
 @dataclass
 class AppContainer:
     bots: list['Bot']
     logger: 'ILogger'
     scheduler: 'IScheduler'
+    http_pool: 'HttpClientPool'
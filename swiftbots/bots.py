@@ -1,12 +1,16 @@
 import asyncio
-from collections.abc import AsyncGenerator, Callable
+from collections.abc import AsyncGenerator, Callable, Coroutine, Mapping
 from http import HTTPStatus
+from itertools import chain
 from textwrap import wrap
 from traceback import format_exc
+from types import MappingProxyType
 from typing import Any, TypeVar
+from urllib.parse import urlsplit
 
 import httpx
 
+from swiftbots.access_lists import AccessList
 from swiftbots.all_types import (
     ExitBotException,
     ILogger,
@@ -16,18 +20,25 @@ from swiftbots.all_types import (
     TelegramError,
 )
 from swiftbots.chats import Chat, TelegramChat
+from swiftbots.dispatchers import ConcurrentDispatcher, KeyedDispatcher
+from swiftbots.filters import BannedSendersFilter
 from swiftbots.functions import (
-    decompose_bot_as_dependencies,
+    NO_LAZY_DEPENDENCIES,
+    DependencyCache,
+    UpdateDependencies,
+    call_plan_with_resolved_args_async,
     generate_name,
-    resolve_function_args,
+    get_function_plan,
+    make_shared_dependencies,
 )
+from swiftbots.http_clients import HttpClientPool, get_default_http_pool
 from swiftbots.loggers import SysIOLoggerFactory
 from swiftbots.message_handlers import (
     ChatMessageHandler,
+    CommandIndex,
     CompiledChatCommand,
-    Trie,
+    build_command_index,
     compile_chat_commands,
-    insert_trie,
 )
 from swiftbots.middlewares import (
     call_with_dependencies_injected,
@@ -39,10 +50,26 @@ from swiftbots.middlewares import (
     process_listener_exceptions,
     route_chat_message,
 )
+from swiftbots.rate_limiters import TelegramRateLimiter
 from swiftbots.tasks.tasks import TaskInfo
-from swiftbots.types import AsyncListenerFunction, AsyncSenderFunction, DecoratedCallable, Middleware
+from swiftbots.tasks.triggers import PeriodTrigger
+from swiftbots.types import (
+    MISFIRE_POLICIES,
+    TASK_OVERLAP_POLICIES,
+    AsyncListenerFunction,
+    AsyncSenderFunction,
+    DecoratedCallable,
+    Middleware,
+    MisfirePolicy,
+    TaskOverlapPolicy,
+    UpdateFilter,
+)
+from swiftbots.webhooks import WebhookServer
 
 HTTPStatus_FLOOD = 420
+DEFAULT_RETRY_AFTER_SECONDS = 5
+# Maximum number of updates Telegram API returns for one `getUpdates` request
+UPDATES_BATCH_LIMIT = 100
 
 
 class Bot:
@@ -60,16 +87,31 @@ class Bot:
             bot_logger_factory: ILoggerFactory | None = None,
             run_at_start: bool = True,
             middlewares: list[Middleware] | None = None,
+            max_concurrency: int | None = None,
     ):
+        """:param max_concurrency: if set, updates are handled concurrently as separate tasks,
+        at most `max_concurrency` of them at the same time. Otherwise, updates are handled one by one.
+        """
         assert bot_logger_factory is None or isinstance(
             bot_logger_factory, ILoggerFactory,
         ), "Logger must be of type ILoggerFactory"
 
         self.task_infos: list[TaskInfo] = []
+        self._scheduled_tasks: dict[str, TaskInfo] = {}
+        self._scheduler: IScheduler | None = None
+        self.__closing_tasks: set[asyncio.Task] = set()
         self.name: str = name or generate_name()
         self.run_at_start: bool = run_at_start
         self._custom_middlewares: list[Middleware] | None = middlewares
         self._user_middlewares: list[Middleware] = []
+        self._update_filters: list[UpdateFilter] = []
+        self._access_lists: list[AccessList] = []
+        self._http_pool: HttpClientPool | None = None
+        self._dependency_cache = DependencyCache()
+        self._shared_dependencies: Mapping[str, Any] = {}
+        self._dispatcher: ConcurrentDispatcher | None = None
+        if max_concurrency is not None:
+            self._dispatcher = self._make_dispatcher(max_concurrency)
         self._configure_middlewares()
         bot_logger_factory = bot_logger_factory or SysIOLoggerFactory()
         self.__logger: ILogger = bot_logger_factory.get_logger()
@@ -110,30 +152,85 @@ class Bot:
             triggers: ITrigger | list[ITrigger],
             run_at_start: bool = False,
             name: str | None = None,
+            overlap: TaskOverlapPolicy = 'skip',
+            timeout: float | None = None,
+            misfire: MisfirePolicy = 'run_once',
     ) -> Callable[[DecoratedCallable], TaskInfo]:
         """Mark a bot method as a task.
         Will be executed by SwiftBots automatically.
+        :param overlap: what to do if the task must run again while the previous run is not finished yet.
+            'skip' - don't run it this time, 'queue' - run once more right after the current run,
+            'parallel' - run alongside the current run.
+        :param timeout: cancel the run if it lasts longer than this number of seconds.
+        :param misfire: what to do on start if the job store of the scheduler says that runs were missed
+            while the app was stopped. 'run_once' - run once at once, 'run_all' - run every missed run one by one,
+            'skip' - wait for the next run time.
         """
-        assert isinstance(triggers, (ITrigger, list)), 'Trigger must be the type of ITrigger or a list of ITriggers'
-
-        if isinstance(triggers, list):
-            for trigger in triggers:
-                assert isinstance(trigger, ITrigger), 'Triggers must be the type of ITrigger'
-        assert isinstance(triggers, ITrigger) or len(triggers) > 0, 'Empty list of triggers'
         if name is None:
             name = generate_name()
-        assert isinstance(name, str), 'Name must be a string'
+        check_task_options(triggers, name, overlap, timeout, misfire)
 
         def wrapper(func: DecoratedCallable) -> TaskInfo:
-            task_info = TaskInfo(name=name,
-                                 func=func,
-                                 triggers=triggers if isinstance(triggers, list) else [triggers],
-                                 run_at_start=run_at_start)
+            task_info = make_task_info(func, triggers, run_at_start, name, overlap, timeout, misfire)
             self.task_infos.append(task_info)
             return task_info
 
         return wrapper
 
+    def schedule(
+            self,
+            func: DecoratedCallable,
+            triggers: ITrigger | list[ITrigger],
+            key: str | None = None,
+            run_at_start: bool = False,
+            overlap: TaskOverlapPolicy = 'skip',
+            timeout: float | None = None,
+            misfire: MisfirePolicy = 'run_once',
+            **data: Any,
+    ) -> str:
+        """Add a task while the app is running, e.g. a reminder requested by a user.
+        Tasks which won't run anymore (e.g. with a one-shot trigger) are forgotten after the last run.
+        :param key: the name of the task. If the bot already has a task with this key, the task is replaced.
+        :param data: values given to the function as dependencies, along with the dependencies of the bot.
+        Other parameters are the same as in `task`.
+        :return: the key of the task, which can be used to unschedule it.
+        """
+        if key is None:
+            key = generate_name()
+        check_task_options(triggers, key, overlap, timeout, misfire)
+        task_info = make_task_info(func, triggers, run_at_start, key, overlap, timeout, misfire, data or None)
+        if task_info.name in self._scheduled_tasks:
+            self.unschedule(task_info.name)
+        self._scheduled_tasks[task_info.name] = task_info
+        # If the app isn't running yet, the task is added to the scheduler with other tasks
+        if self._scheduler is not None:
+            self._scheduler.add_task(task_info, build_task_caller(task_info, self))
+            if not self._scheduler.has_task(task_info.name):
+                # The task won't run at all
+                del self._scheduled_tasks[task_info.name]
+        return task_info.name
+
+    def unschedule(self, key: str) -> None:
+        """Remove the task added by `schedule` and its saved state. Does nothing if there is no such task.
+        It can be called from sync code, task scoped dependencies of the task are cleaned up in the background.
+        """
+        task_info = self._scheduled_tasks.pop(key, None)
+        if task_info is None:
+            return
+        if self._scheduler is not None:
+            self._scheduler.delete_task(key)
+        cache, task_info.dependency_cache = task_info.dependency_cache, None
+        if cache is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Caches are made only while the app runs, and they are closed by `before_close_async` when it stops
+            return
+        closing = loop.create_task(cache.close_async())
+        self.__closing_tasks.add(closing)
+        closing.add_done_callback(self.__closing_tasks.discard)
+
     def middleware(self) -> Callable[[Middleware], Middleware]:
         def wrapper(func: Middleware) -> Middleware:
             self._user_middlewares.append(func)
@@ -142,11 +239,31 @@ class Bot:
 
         return wrapper
 
+    def update_filter(self) -> Callable[[UpdateFilter], UpdateFilter]:
+        """Add a function `(bot, update) -> bool` which is called with every update produced by the listener
+        before the middlewares load dependencies for it. The update is dropped if any filter returns False.
+        Filters must be quick and synchronous. Ready ones are in `swiftbots.filters`,
+        e.g. `bot.update_filter()(BannedSendersFilter([123]))`.
+        """
+        def wrapper(func: UpdateFilter) -> UpdateFilter:
+            self._update_filters.append(func)
+            return func
+
+        return wrapper
+
     def build(self) -> None:
         """Build everything that is needed to run the bot.
         Need to override this method.
         Use it like `super().build()`.
         """
+        # Compile dependency plans in advance, so they aren't compiled while handling the first updates
+        handler = vars(self).get('handler_func')
+        if handler is not None:
+            get_function_plan(handler)
+        for task_info in self.task_infos:
+            get_function_plan(task_info.func)
+        self._prepare_access_lists()
+        self._shared_dependencies = make_shared_dependencies(self)
         self._built = True
 
     def assert_configured(self) -> None:
@@ -158,12 +275,45 @@ class Bot:
     async def before_start_async(self) -> None:
         """Do something right before the app starts.
         Should be quick, because it runs every request when the app is started in serverless mode.
-        Need to override this method.
+        Access lists with asynchronous sources are loaded here.
         Use it like `super().before_start_async()`.
         """
+        for access_list in self._access_lists:
+            if not access_list.is_loaded:
+                await access_list.load_async()
 
     async def before_close_async(self) -> None:
-        ...
+        """Do something right before the app is closed.
+        Bot and task scoped dependencies are cleaned up here.
+        Use it like `super().before_close_async()`.
+        """
+        for task_info in chain(self.task_infos, self._scheduled_tasks.values()):
+            if task_info.dependency_cache is not None:
+                await task_info.dependency_cache.close_async()
+        await self._dependency_cache.close_async()
+
+    def _make_dispatcher(self, max_concurrency: int) -> ConcurrentDispatcher:
+        return ConcurrentDispatcher(max_concurrency)
+
+    def _collect_access_lists(self) -> list[AccessList]:
+        return [update_filter.senders for update_filter in self._update_filters
+                if isinstance(update_filter, BannedSendersFilter)]
+
+    def _prepare_access_lists(self) -> None:
+        """Load the access lists used by the bot and schedule their refreshing"""
+        self._access_lists = list({id(access_list): access_list for access_list in self._collect_access_lists()
+                                   if access_list.source is not None}.values())
+        for position, access_list in enumerate(self._access_lists):
+            if not access_list.is_loaded and not access_list.is_async:
+                access_list.load()
+            if access_list.refresh_interval is not None:
+                # The key must be the same after restarts to keep the single job state of the task in the job store
+                self.schedule(access_list.load_async, PeriodTrigger(seconds=access_list.refresh_interval),
+                              key=f'{self.name}-refresh-access-list-{position}')
+
+    def _extract_sender(self, output: Any) -> str | int | None:
+        """Get the sender from an update, produced by the listener"""
+        return output.get('sender') if isinstance(output, dict) else None
 
     def _configure_middlewares(self) -> None:
         self._middlewares = self._custom_middlewares or [
@@ -205,7 +355,7 @@ class ChatBot(Bot):
     _compiled_chat_commands: list[CompiledChatCommand]
     _message_handlers: list[ChatMessageHandler]
     _admin: str | None = None
-    _trie: Trie
+    _command_index: CommandIndex
 
     def __init__(self,
                  name: str | None = None,
@@ -216,23 +366,26 @@ class ChatBot(Bot):
                  admin: int | str | None = None,
                  run_at_start: bool = True,
                  middlewares: list[Middleware] | None = None,
+                 max_concurrency: int | None = None,
                  ):
         super().__init__(name=name,
                          bot_logger_factory=bot_logger_factory,
                          run_at_start=run_at_start,
-                         middlewares=middlewares)
+                         middlewares=middlewares,
+                         max_concurrency=max_concurrency)
         self._message_handlers = []
         self._admin = admin
-        self._trie = {}
+        self.__admins = AccessList(() if admin is None else [admin])
         self._chat_error_message: str = chat_error_message
         self._chat_unknown_message: str = chat_unknown_error_message
         self._chat_refuse_message: str = chat_refuse_message
+        self._lazy_chat_dependencies = NO_LAZY_DEPENDENCIES
 
     def message_handler(self,
                         commands: list[str],
                         admin_only: bool = False,
-                        whitelist_users: list[str | int] | None = None,
-                        blacklist_users: list[str | int] | None = None) -> DecoratedCallable:
+                        whitelist_users: AccessList | list[str | int] | None = None,
+                        blacklist_users: AccessList | list[str | int] | None = None) -> DecoratedCallable:
         """:param commands: commands, that will fire the method. For example: ['add', '+'].
         Message "add 2 2" will execute in this method.
         :param admin_only: only admin will be able to use this command. If True, whitelist_users list will be ignored.
@@ -240,6 +393,8 @@ class ChatBot(Bot):
         then whitelist_users will be ignored.
         :param blacklist_users: the users from list won't be able to use this command.
         blacklist has a privilege upon whitelist.
+        An `AccessList` may be given instead of a list to share the users between commands,
+        or to load a large list from a file or a function.
         """
         assert isinstance(commands, list), 'Commands must be a list of strings'
         assert len(commands) > 0, 'Empty list of commands'
@@ -249,7 +404,7 @@ class ChatBot(Bot):
         def wrapper(func: DecoratedCallable) -> ChatMessageHandler:
             handler = ChatMessageHandler(commands=commands,
                                          function=func,
-                                         whitelist_users=whitelist_users if not admin_only else [self._admin],
+                                         whitelist_users=whitelist_users if not admin_only else self.__admins,
                                          blacklist_users=blacklist_users)
             self._message_handlers.append(handler)
             return handler
@@ -266,8 +421,8 @@ class ChatBot(Bot):
     def default_handler(
             self,
             admin_only: bool = False,
-            whitelist_users: list[str | int] | None = None,
-            blacklist_users: list[str | int] | None = None) -> DecoratedCallable:
+            whitelist_users: AccessList | list[str | int] | None = None,
+            blacklist_users: AccessList | list[str | int] | None = None) -> DecoratedCallable:
         return self.message_handler(
             commands=[''],
             admin_only=admin_only,
@@ -281,16 +436,28 @@ class ChatBot(Bot):
         assert len(self._compiled_chat_commands) > 0, 'You have to set at least one message handler or default handler'
 
     def build(self) -> None:
-        super().build()
         self._compiled_chat_commands = compile_chat_commands(self._message_handlers)
         self._message_handlers.clear()
+        self._command_index = build_command_index(self._compiled_chat_commands)
         for command in self._compiled_chat_commands:
-            insert_trie(self._trie, command.command_name.lower(), command)
+            get_function_plan(command.method)
+        self._lazy_chat_dependencies = MappingProxyType({'chat': self._make_chat})
+        super().build()
 
     def handler_func(self) -> None:
         msg = "You should use message handler or default handler for ChatBot"
         raise NotImplementedError(msg)
 
+    def _collect_access_lists(self) -> list[AccessList]:
+        command_lists = (access_list for command in self._compiled_chat_commands
+                         for access_list in (command.whitelist_users, command.blacklist_users)
+                         if access_list is not None)
+        return [*super()._collect_access_lists(), *command_lists]
+
+    def _make_dispatcher(self, max_concurrency: int) -> KeyedDispatcher:
+        """Messages from the same sender are processed in order, different senders are processed in parallel"""
+        return KeyedDispatcher(max_concurrency, key=self._extract_sender)
+
     def _configure_middlewares(self) -> None:
         self._middlewares = self._custom_middlewares or [
                 process_listener_exceptions,
@@ -334,7 +501,21 @@ class TelegramBot(ChatBot):
                  chat_refuse_message: str = "Access forbidden",
                  run_at_start: bool = True,
                  middlewares: list[Middleware] | None = None,
+                 max_concurrency: int | None = None,
+                 webhook_server: WebhookServer | None = None,
+                 webhook_url: str | None = None,
+                 webhook_path: str | None = None,
+                 webhook_secret_token: str | None = None,
+                 rate_limiter: TelegramRateLimiter | None = None,
                  ):
+        """:param webhook_server: if set, the bot receives updates from the webhook server instead of long polling.
+        One server can be shared by many bots.
+        :param webhook_url: the public HTTPS url of the webhook. If set, the bot registers it in Telegram at start.
+        :param webhook_path: the path the server routes to this bot. By default, it is the path of `webhook_url`.
+        :param webhook_secret_token: the secret token Telegram puts into every webhook request.
+        :param rate_limiter: keeps outgoing messages within Telegram limits. By default, the limits from
+        Telegram FAQ are used.
+        """
         super().__init__(name=name,
                          bot_logger_factory=bot_logger_factory,
                          chat_error_message=chat_error_message,
@@ -342,13 +523,34 @@ class TelegramBot(ChatBot):
                          chat_refuse_message=chat_refuse_message,
                          admin=admin,
                          run_at_start=run_at_start,
-                         middlewares=middlewares)
+                         middlewares=middlewares,
+                         max_concurrency=max_concurrency)
         self.__token = token
         self.__greeting_enabled = greeting_enabled
         self._sender_func = self._send_async
         self.__should_skip_old_updates = skip_old_updates
+        self.__updates_offset: int | None = None
         self.listener_func = self.telegram_listener
         self.ALLOWED_UPDATES = ["messages"]
+        if webhook_server is not None:
+            webhook_path = webhook_path or (urlsplit(webhook_url).path if webhook_url else None)
+            assert webhook_path, 'You have to set a webhook url or a webhook path to use a webhook server'
+        self.__webhook_server = webhook_server
+        self.__webhook_url = webhook_url
+        self.__webhook_path = webhook_path
+        self.__webhook_secret_token = webhook_secret_token
+        self.__webhook_queue: asyncio.Queue | None = None
+        self.__rate_limiter = rate_limiter or TelegramRateLimiter()
+
+    @property
+    def rate_limiter(self) -> TelegramRateLimiter:
+        return self.__rate_limiter
+
+    def _extract_sender(self, update: dict) -> int | None:
+        message = update.get('message')
+        if message is None:
+            return None
+        return message['from']['id']
 
     def _make_chat(self, deps: dict) -> TelegramChat:
         return TelegramChat(
@@ -389,6 +591,9 @@ class TelegramBot(ChatBot):
             timeout: float = 30.,
     ) -> dict:
         url = f"https://api.telegram.org/bot{self.__token}/{method}"
+        chat_id = data.get("chat_id")
+        if chat_id is not None:
+            await self.__rate_limiter.acquire_async(chat_id)
         response = await self.__http_session.post(url=url, json=data, headers=headers, timeout=timeout)
 
         answer = response.json()
@@ -396,7 +601,9 @@ class TelegramBot(ChatBot):
         if not answer["ok"] and not ignore_errors:
             state = await self._handle_error_async(answer)
             if state == 0:  # repeat request
-                await asyncio.sleep(4)
+                if answer["error_code"] != HTTPStatus.TOO_MANY_REQUESTS:
+                    await asyncio.sleep(4)
+                await self.__rate_limiter.acquire_async(chat_id)
                 response = await self.__http_session.post(
                     url=url, json=data, headers=headers, timeout=timeout,
                 )
@@ -410,7 +617,8 @@ class TelegramBot(ChatBot):
         if self.__first_time_launched and self.__greeting_enabled and self._admin is not None:
             await self._sender_func(f"{self.name} is started!", self._admin)
 
-        async for update in self._get_updates_async():
+        updates = self._get_updates_async() if self.__webhook_server is None else self._get_webhook_updates_async()
+        async for update in updates:
             yield update
 
     def _configure_middlewares(self) -> None:
@@ -427,17 +635,18 @@ class TelegramBot(ChatBot):
             ]
 
     async def _handle_server_connection_error_async(self) -> None:
-        await self.logger.info_async(
-            f"Connection ERROR in {self.name}. Sleep 5 seconds",
-        )
+        await self.logger.info_async("Connection ERROR in %s. Sleep 5 seconds", self.name)
         await asyncio.sleep(5)
 
     async def _get_updates_async(self) -> AsyncGenerator[dict, None]:
         """Long Polling: Telegram BOT API https://core.telegram.org/bots/api
         """
         timeout = 1000
-        data = {"timeout": timeout, "limit": 1, "allowed_updates": self.ALLOWED_UPDATES}
-        if self.__first_time_launched or self.__should_skip_old_updates:
+        data = {"timeout": timeout, "limit": UPDATES_BATCH_LIMIT, "allowed_updates": self.ALLOWED_UPDATES}
+        if self.__updates_offset is not None:
+            # The listener is restarted. Continue with the updates the previous listener didn't yield
+            data["offset"] = self.__updates_offset
+        elif self.__first_time_launched or self.__should_skip_old_updates:
             self.first_time_launched = False
             data["offset"] = await self._skip_old_updates_async()
         while True:
@@ -454,9 +663,23 @@ class TelegramBot(ChatBot):
                 else:
                     msg = f"Error {ans} while receiving long polling server"
                     raise ExitBotException(msg)
-            if len(ans["result"]) != 0:
-                data["offset"] = ans["result"][0]["update_id"] + 1
-                yield ans
+            # The offset is moved with every update, so the rest of the batch isn't lost if the listener is restarted
+            for update in ans["result"]:
+                data["offset"] = self.__updates_offset = update["update_id"] + 1
+                yield update
+
+    async def _get_webhook_updates_async(self) -> AsyncGenerator[dict, None]:
+        """Webhook: Telegram BOT API https://core.telegram.org/bots/api#setwebhook
+        """
+        if self.__webhook_url is not None:
+            data = {"url": self.__webhook_url, "allowed_updates": self.ALLOWED_UPDATES}
+            if self.__webhook_secret_token is not None:
+                data["secret_token"] = self.__webhook_secret_token
+            await self.fetch_async("setWebhook", data)
+        queue = self.__webhook_queue
+        assert queue is not None, 'Webhook server must be started before listening'
+        while True:
+            yield await queue.get()
 
     async def _handle_error_async(self, error: dict) -> int:
         """https://core.telegram.org/api/errors
@@ -475,14 +698,20 @@ class TelegramBot(ChatBot):
                 HTTPStatus.NOT_FOUND,
                 HTTPStatus.NOT_ACCEPTABLE,
                 HTTPStatus.SEE_OTHER,
-        ) or HTTPStatus(error_code).is_server_error:
+        ) or HTTPStatus.INTERNAL_SERVER_ERROR <= error_code <= HTTPStatus.NETWORK_AUTHENTICATION_REQUIRED:
             await self.logger.error_async(msg)
             return 1
+        # too many requests. The rate limiter waits for `retry_after` seconds before the next requests
+        if error_code == HTTPStatus.TOO_MANY_REQUESTS:
+            retry_after = error.get("parameters", {}).get("retry_after", DEFAULT_RETRY_AFTER_SECONDS)
+            await self.logger.warning_async(
+                "%s reached the rate limit. Sending is paused for %s seconds", self.name, retry_after,
+            )
+            self.__rate_limiter.block(retry_after)
+            return 0
         # too many requests (flood)
         if error_code == HTTPStatus_FLOOD:
-            await self.logger.error_async(
-                f"{self.name} reached Flood error. Fix the code",
-            )
+            await self.logger.error_async("%s reached Flood error. Fix the code", self.name)
             await asyncio.sleep(10)
             return 0
         # unauthorized
@@ -508,47 +737,120 @@ class TelegramBot(ChatBot):
         return -1
 
     async def before_start_async(self) -> None:
-        await super().before_close_async()
-        self.__http_session = httpx.AsyncClient()
+        await super().before_start_async()
+        self.__http_session = (self._http_pool or get_default_http_pool()).async_client
+        if self.__webhook_server is not None:
+            assert self.__webhook_path is not None, 'Webhook path must be set to use a webhook server'
+            self.__webhook_queue = self.__webhook_server.add_route(self.__webhook_path, self.__webhook_secret_token)
+            await self.__webhook_server.start()
 
     async def before_close_async(self) -> None:
         await super().before_close_async()
-        if not self.__http_session.is_closed:
-            await self.__http_session.aclose()
-
-
-def build_task_caller(info: TaskInfo, bot: Bot) -> Callable[..., Any]:
-    func = info.func
+        if self.__webhook_server is not None and self.__webhook_path is not None:
+            self.__webhook_server.remove_route(self.__webhook_path)
+            if not self.__webhook_server.list_routes():
+                await self.__webhook_server.stop()
+
+
+def make_task_info(
+        func: DecoratedCallable,
+        triggers: ITrigger | list[ITrigger],
+        run_at_start: bool,
+        name: str,
+        overlap: TaskOverlapPolicy,
+        timeout: float | None,
+        misfire: MisfirePolicy,
+        data: dict[str, Any] | None = None,
+) -> TaskInfo:
+    return TaskInfo(name=name,
+                    func=func,
+                    triggers=triggers if isinstance(triggers, list) else [triggers],
+                    run_at_start=run_at_start,
+                    overlap=overlap,
+                    timeout=timeout,
+                    misfire=misfire,
+                    data=data)
+
+
+def check_task_options(
+        triggers: ITrigger | list[ITrigger],
+        name: str,
+        overlap: TaskOverlapPolicy,
+        timeout: float | None,
+        misfire: MisfirePolicy,
+) -> None:
+    assert isinstance(triggers, (ITrigger, list)), 'Trigger must be the type of ITrigger or a list of ITriggers'
+
+    if isinstance(triggers, list):
+        for trigger in triggers:
+            assert isinstance(trigger, ITrigger), 'Triggers must be the type of ITrigger'
+    assert isinstance(triggers, ITrigger) or len(triggers) > 0, 'Empty list of triggers'
+    assert isinstance(name, str), 'Name must be a string'
+    assert overlap in TASK_OVERLAP_POLICIES, f'Overlap policy must be one of {TASK_OVERLAP_POLICIES}'
+    assert timeout is None or timeout > 0, 'Timeout must be positive'
+    assert misfire in MISFIRE_POLICIES, f'Misfire policy must be one of {MISFIRE_POLICIES}'
+
+
+class TaskCaller:
+    """Calls the task. Its arguments plan and the given dependencies are prepared once,
+    when the task is added to the scheduler, instead of on every run.
+    """
 
-    async def caller() -> Any:
-        try:
-            if bot.is_enabled:
-                min_deps = decompose_bot_as_dependencies(bot)
-                args = resolve_function_args(func, min_deps)
-                return await func(**args)
-        except (AttributeError, TypeError, KeyError, AssertionError) as e:
-            await bot.logger.critical_async(
-                f"Fix the code. Critical `{e.__class__.__name__}` "
-                f"raised:\n{e}.\nFull traceback:\n{format_exc()}",
-            )
-        except Exception as e:
-            await bot.logger.exception_async(
-                f"Bot {bot.name} was raised with unhandled `{e.__class__.__name__}` "
-                f"and kept on working:\n{e}.\nFull traceback:\n{format_exc()}",
-            )
-        else:
-            return None
+    __slots__ = ('bot', 'given_data', 'info', 'plan')
+
+    def __init__(self, info: TaskInfo, bot: Bot):
+        self.info = info
+        self.bot = bot
+        self.plan = get_function_plan(info.func)
+        # The values of the task are layered over the shared dependencies of the bot instead of copying them
+        shared = bot._shared_dependencies or make_shared_dependencies(bot)
+        self.given_data = UpdateDependencies(shared, {'task': info, **(info.data or {})})
+
+    def __call__(self) -> Coroutine[Any, Any, Any]:
+        return call_task_async(self)
+
+
+async def call_task_async(caller: TaskCaller) -> Any:
+    info = caller.info
+    bot = caller.bot
+    try:
+        if bot.is_enabled:
+            if info.timeout is None:
+                return await call_plan_with_resolved_args_async(caller.plan, caller.given_data)
+            return await asyncio.wait_for(call_plan_with_resolved_args_async(caller.plan, caller.given_data),
+                                          info.timeout)
+    except asyncio.TimeoutError:
+        await bot.logger.error_async('Task %s of bot %s was cancelled because it lasted longer than %s seconds',
+                                     info.name, bot.name, info.timeout)
+    except (AttributeError, TypeError, KeyError, AssertionError) as e:
+        await bot.logger.critical_async(
+            "Fix the code. Critical `%s` raised:\n%s.\nFull traceback:\n%s",
+            e.__class__.__name__, e, format_exc(),
+        )
+    except Exception as e:
+        await bot.logger.exception_async(
+            "Bot %s was raised with unhandled `%s` and kept on working:\n%s.\nFull traceback:\n%s",
+            bot.name, e.__class__.__name__, e, format_exc(),
+        )
+    finally:
+        # The scheduler forgets tasks which won't run anymore, so the bot does too
+        if (bot._scheduled_tasks.get(info.name) is info
+                and bot._scheduler is not None and not bot._scheduler.has_task(info.name)):
+            del bot._scheduled_tasks[info.name]
+            if info.dependency_cache is not None:
+                await info.dependency_cache.close_async()
+    return None
 
-    def wrapped_caller() -> Any:
-        return caller()
 
-    return wrapped_caller
+def build_task_caller(info: TaskInfo, bot: Bot) -> Callable[..., Any]:
+    return TaskCaller(info, bot)
 
 
 def build_scheduler(bots: list[Bot], scheduler: IScheduler) -> None:
     task_names = set()
     for bot in bots:
-        for task_info in bot.task_infos:
+        bot._scheduler = scheduler
+        for task_info in chain(bot.task_infos, bot._scheduled_tasks.values()):
             assert task_info.name not in task_names, f'Task {task_info.name} met twice. Tasks must have different names'
             task_names.add(task_info.name)
             scheduler.add_task(task_info, build_task_caller(task_info, bot))
@@ -557,10 +859,9 @@ def build_scheduler(bots: list[Bot], scheduler: IScheduler) -> None:
 
 def disable_tasks(bot: Bot, scheduler: IScheduler) -> None:
     """Method is used to disable tasks when the bot is exiting or disabling."""
-    scheduled_tasks = scheduler.list_tasks()
-    for bot_task in (ti.name for ti in bot.task_infos):
-        if bot_task in scheduled_tasks:
-            scheduler.remove_task(bot_task)
+    for task_info in chain(bot.task_infos, list(bot._scheduled_tasks.values())):
+        if scheduler.has_task(task_info.name):
+            scheduler.remove_task(task_info.name)
 
 
 async def stop_bot_async(bot: Bot, scheduler: IScheduler) -> None:
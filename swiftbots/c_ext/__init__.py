@@ -0,0 +1,19 @@
+"""Compiled extensions. Each of them has a pure-Python equivalent, which is used automatically
+if the extension isn't built (PyPy, slim containers, serverless packages, etc.).
+Set the environment variable `SWIFTBOTS_PURE_PYTHON=1` to use pure-Python implementations anyway.
+`SEARCH_IMPLEMENTATION` tells which implementation is used.
+"""
+import os
+
+__all__ = ['SEARCH_IMPLEMENTATION', 'search_trie']
+
+if os.environ.get('SWIFTBOTS_PURE_PYTHON', '') not in ('', '0'):
+    from swiftbots.c_ext.search_py import search_trie
+    SEARCH_IMPLEMENTATION = 'python'
+else:
+    try:
+        from swiftbots.c_ext.search_ext import search_trie
+        SEARCH_IMPLEMENTATION = 'c'
+    except ImportError:
+        from swiftbots.c_ext.search_py import search_trie
+        SEARCH_IMPLEMENTATION = 'python'
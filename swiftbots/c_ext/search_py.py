@@ -0,0 +1,15 @@
+"""Pure-Python equivalent of `search_ext`"""
+FINAL_INDICATOR = '**'
+
+
+def search_trie(trie: dict, word: str) -> dict | None:
+    """Walk the trie along the word and return the first node where a command ends"""
+    node: dict = trie
+    for ch in word:
+        next_node = node.get(ch)
+        if next_node is None:
+            return None
+        node = next_node
+        if FINAL_INDICATOR in node:
+            return node
+    return None
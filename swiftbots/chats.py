@@ -1,3 +1,4 @@
+import logging
 from collections.abc import Callable
 from textwrap import wrap
 
@@ -6,6 +7,9 @@ from swiftbots.types import AsyncSenderFunction
 
 
 class Chat:
+    __slots__ = ('error_message', 'function_sender', 'logger', 'message', 'refuse_message', 'sender',
+                 'unknown_message')
+
     def __init__(
             self,
             sender: str | int,
@@ -32,23 +36,27 @@ class Chat:
     async def error_async(self) -> dict:
         """Inform the user there is an internal error.
         """
-        await self.logger.error_async(f"Error in the bot. The sender: {self.sender}, the message: {self.message}")
+        await self.logger.error_async("Error in the bot. The sender: %s, the message: %s", self.sender, self.message)
         return await self.reply_async(self.error_message)
 
     async def unknown_command_async(self) -> dict:
         """If the user sends some unknown shit, then needed to warn him
         """
-        await self.logger.info_async(f"{self.sender} sent unknown command. {self.message}")
+        if self.logger.is_enabled_for(logging.INFO):
+            await self.logger.info_async("%s sent unknown command. %s", self.sender, self.message)
         return await self.reply_async(self.unknown_message)
 
     async def refuse_async(self) -> dict:
         """If the user can't use it, then he must be aware.
         """
-        await self.logger.info_async(f"Forbidden. The sender: {self.sender}, the message: {self.message}")
+        if self.logger.is_enabled_for(logging.INFO):
+            await self.logger.info_async("Forbidden. The sender: %s, the message: %s", self.sender, self.message)
         return await self.reply_async(self.refuse_message)
 
 
 class TelegramChat(Chat):
+    __slots__ = ('fetch_async', 'message_id', 'username')
+
     def __init__(
             self,
             sender: str | int,
@@ -0,0 +1,223 @@
+import asyncio
+from collections import deque
+from collections.abc import Callable, Coroutine, Hashable
+from functools import partial
+from typing import TYPE_CHECKING, Any
+
+from swiftbots.types import CallNextMiddleware
+
+if TYPE_CHECKING:
+    from swiftbots.bots import Bot
+
+PENDING_UPDATES_PER_WORKER = 16
+
+
+class ConcurrentDispatcher:
+    """Runs the rest of the middleware chain for every update as a separate asyncio task,
+    so a slow handler doesn't stop the listener from pulling the next updates.
+    At most `max_concurrency` updates are processed at the same time. When the limit is reached,
+    the listener waits until one of the handlers is finished.
+    Base exceptions raised by the handlers (e.g. `ExitBotException`) stop the listener the same way
+    they do without a dispatcher.
+    """
+
+    def __init__(self, max_concurrency: int):
+        assert isinstance(max_concurrency, int), 'Max concurrency must be an integer'
+        assert max_concurrency >= 1, 'Max concurrency must be a positive number'
+        self.max_concurrency = max_concurrency
+        self._tasks: set[asyncio.Task] = set()
+        self._semaphore: asyncio.Semaphore | None = None
+        self._failure: asyncio.Future | None = None
+        self._bot: Bot | None = None
+
+    @property
+    def in_flight(self) -> int:
+        """Number of updates that are being processed right now"""
+        return len(self._tasks)
+
+    async def dispatch(self, call_next: CallNextMiddleware, obj: Any) -> None:
+        semaphore = self._semaphore
+        assert semaphore is not None, 'Dispatcher must be started with `supervise` before dispatching'
+        await semaphore.acquire()
+        task = asyncio.create_task(call_next(obj))
+        self._tasks.add(task)
+        # The semaphore is replaced when the dispatcher is restarted,
+        # so a handler of the previous run must release the semaphore it acquired
+        task.add_done_callback(partial(self._on_task_done, semaphore))
+
+    async def supervise(self, bot: 'Bot', listening: Coroutine) -> Any:
+        """Run the listening loop of the bot until it finishes or one of the handlers raises a base exception.
+        All the unfinished handlers are cancelled when the listening is over.
+        """
+        self._bot = bot
+        self._failure = asyncio.get_running_loop().create_future()
+        self._start()
+        listening_task = asyncio.ensure_future(listening)
+        try:
+            await asyncio.wait((listening_task, self._failure), return_when=asyncio.FIRST_COMPLETED)
+            if self._failure.done():
+                return self._failure.result()
+            return listening_task.result()
+        finally:
+            listening_task.cancel()
+            self._stop()
+
+    def _start(self) -> None:
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def _stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+
+    def _on_task_done(self, semaphore: asyncio.Semaphore, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        semaphore.release()
+        if not task.cancelled():
+            exc = task.exception()
+            if exc is not None:
+                self._handle_exception(exc)
+
+    def _handle_exception(self, exc: BaseException) -> None:
+        bot, failure = self._bot, self._failure
+        assert bot is not None, 'Dispatcher must be started with `supervise`'
+        assert failure is not None, 'Dispatcher must be started with `supervise`'
+        # A handler may raise `CancelledError` itself, e.g. by awaiting a cancelled future
+        if isinstance(exc, (Exception, asyncio.CancelledError)):
+            bot.logger.error(
+                "Bot %s was raised with unhandled `%s` in a concurrent handler and kept on working:\n%s",
+                bot.name, exc.__class__.__name__, exc,
+                exc_info=exc,
+            )
+        elif not failure.done():
+            failure.set_exception(exc)
+
+
+class KeyedDispatcher(ConcurrentDispatcher):
+    """Processes updates with the same key (e.g. a sender) strictly in order,
+    while updates with different keys are processed in parallel by `max_concurrency` workers.
+    Each key has its own queue, which is evicted as soon as it's drained,
+    so the memory doesn't grow with the number of distinct keys.
+    At most `max_pending` updates may wait in the queues. When the limit is reached,
+    the listener waits until one of them is processed.
+    Updates with the key `None` have no ordering guarantees.
+    """
+
+    def __init__(self,
+                 max_concurrency: int,
+                 key: Callable[[Any], Hashable | None],
+                 max_pending: int | None = None,
+                 ):
+        super().__init__(max_concurrency)
+        assert max_pending is None or max_pending >= max_concurrency, \
+            'Max pending updates must not be less than max concurrency'
+        self.max_pending = max_pending or max_concurrency * PENDING_UPDATES_PER_WORKER
+        self._key = key
+        self._queues: dict[Hashable, deque[tuple[CallNextMiddleware, Any]]] = {}
+        self._ready_keys: asyncio.Queue[Hashable] | None = None
+        self._workers: set[asyncio.Task] = set()
+        self._stopped: asyncio.Event | None = None
+        self._pending = 0
+
+    @property
+    def in_flight(self) -> int:
+        """Number of updates that are being processed or waiting in the queues"""
+        return self._pending
+
+    @property
+    def queues_count(self) -> int:
+        """Number of keys which have unprocessed updates"""
+        return len(self._queues)
+
+    async def dispatch(self, call_next: CallNextMiddleware, obj: Any) -> None:
+        semaphore, ready_keys = self._semaphore, self._ready_keys
+        assert semaphore is not None, 'Dispatcher must be started with `supervise` before dispatching'
+        assert ready_keys is not None, 'Dispatcher must be started with `supervise` before dispatching'
+        await semaphore.acquire()
+        self._pending += 1
+        key = self._key(obj)
+        if key is None:
+            key = object()
+        queue = self._queues.get(key)
+        if queue is None:
+            # The key is new, so nobody is processing it now
+            self._queues[key] = deque(((call_next, obj),))
+            ready_keys.put_nowait(key)
+        else:
+            # A worker is already processing the key, or the key is waiting for a worker
+            queue.append((call_next, obj))
+
+    def _start(self) -> None:
+        self._semaphore = asyncio.Semaphore(self.max_pending)
+        self._ready_keys = asyncio.Queue()
+        self._queues = {}
+        self._pending = 0
+        # Tells the workers that their cancellation is the end of the run, not an error of a handler
+        self._stopped = asyncio.Event()
+        self._workers = set()
+        for _ in range(self.max_concurrency):
+            self._spawn_worker(self._semaphore, self._ready_keys, self._queues, self._stopped)
+
+    def _stop(self) -> None:
+        if self._stopped is not None:
+            self._stopped.set()
+        for worker in self._workers:
+            worker.cancel()
+        self._workers.clear()
+
+    def _spawn_worker(self,
+                      semaphore: asyncio.Semaphore,
+                      ready_keys: 'asyncio.Queue[Hashable]',
+                      queues: dict[Hashable, deque[tuple[CallNextMiddleware, Any]]],
+                      stopped: asyncio.Event,
+                      ) -> None:
+        # Workers keep the state of their run, so the workers of the previous run, which are still
+        # being cancelled, don't touch the state of the new one
+        worker = asyncio.create_task(self._work(semaphore, ready_keys, queues, stopped))
+        self._workers.add(worker)
+        worker.add_done_callback(partial(self._on_worker_done, semaphore, ready_keys, queues, stopped))
+
+    def _on_worker_done(self,
+                        semaphore: asyncio.Semaphore,
+                        ready_keys: 'asyncio.Queue[Hashable]',
+                        queues: dict[Hashable, deque[tuple[CallNextMiddleware, Any]]],
+                        stopped: asyncio.Event,
+                        worker: asyncio.Task,
+                        ) -> None:
+        self._workers.discard(worker)
+        if stopped.is_set():
+            return
+        # Workers never exit while the run goes on, so the one which did is replaced
+        bot = self._bot
+        if bot is not None:
+            exc = None if worker.cancelled() else worker.exception()
+            bot.logger.error('Worker of bot %s exited unexpectedly and was replaced: %r', bot.name, exc)
+        self._spawn_worker(semaphore, ready_keys, queues, stopped)
+
+    async def _work(self,
+                    semaphore: asyncio.Semaphore,
+                    ready_keys: 'asyncio.Queue[Hashable]',
+                    queues: dict[Hashable, deque[tuple[CallNextMiddleware, Any]]],
+                    stopped: asyncio.Event,
+                    ) -> None:
+        while True:
+            key = await ready_keys.get()
+            queue = queues[key]
+            call_next, obj = queue.popleft()
+            try:
+                await call_next(obj)
+            except asyncio.CancelledError as e:
+                if stopped.is_set():
+                    raise
+                # The handler raised it, the worker must keep on working
+                self._handle_exception(e)
+            except BaseException as e:
+                self._handle_exception(e)
+            finally:
+                self._pending -= 1
+                semaphore.release()
+                if queue:
+                    # Let other keys go first, then continue with the rest of this queue
+                    ready_keys.put_nowait(key)
+                else:
+                    del queues[key]
+
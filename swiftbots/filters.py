@@ -0,0 +1,63 @@
+from collections import deque
+from collections.abc import Hashable, Iterable
+from typing import TYPE_CHECKING, Any
+
+from swiftbots.access_lists import AccessList
+
+if TYPE_CHECKING:
+    from swiftbots.bots import Bot
+
+
+class BannedSendersFilter:
+    """Drops updates from the senders. Senders are compared case-insensitively as strings,
+    so `123` and `'123'` are the same sender. A large list may be loaded from a file with `AccessList`.
+    """
+
+    __slots__ = ('senders',)
+
+    def __init__(self, senders: AccessList | Iterable[str | int]):
+        self.senders = senders if isinstance(senders, AccessList) else AccessList(senders)
+
+    def __call__(self, bot: 'Bot', update: Any) -> bool:
+        sender = bot._extract_sender(update)
+        return sender is None or sender not in self.senders
+
+
+class UpdateTypesFilter:
+    """Passes only the updates having at least one of the keys, e.g. `['message']` for Telegram updates"""
+
+    __slots__ = ('types',)
+
+    def __init__(self, types: Iterable[str]):
+        self.types = frozenset(types)
+        assert self.types, 'At least one update type must be allowed'
+
+    def __call__(self, _: 'Bot', update: Any) -> bool:
+        return isinstance(update, dict) and not self.types.isdisjoint(update.keys())
+
+
+class DuplicateUpdatesFilter:
+    """Drops updates which ids were seen recently, e.g. webhook requests retried by Telegram.
+    Only the last `capacity` ids are remembered. Updates without the id are passed.
+    """
+
+    __slots__ = ('__order', '__seen', 'capacity', 'key')
+
+    def __init__(self, key: str = 'update_id', capacity: int = 1000):
+        assert capacity >= 1, 'Capacity must be a positive number'
+        self.key = key
+        self.capacity = capacity
+        self.__seen: set[Hashable] = set()
+        self.__order: deque[Hashable] = deque()
+
+    def __call__(self, _: 'Bot', update: Any) -> bool:
+        update_id = update.get(self.key) if isinstance(update, dict) else None
+        if update_id is None:
+            return True
+        if update_id in self.__seen:
+            return False
+        if len(self.__order) >= self.capacity:
+            self.__seen.discard(self.__order.popleft())
+        self.__seen.add(update_id)
+        self.__order.append(update_id)
+        return True
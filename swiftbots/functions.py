@@ -1,56 +1,404 @@
+import asyncio
 import inspect
 import random
 import string
-from collections.abc import Callable
+from collections.abc import Awaitable, Callable, Iterator, Mapping
+from contextlib import AsyncExitStack, asynccontextmanager, contextmanager, suppress
+from functools import partial
+from types import MappingProxyType
 from typing import TYPE_CHECKING, Any
 
-from swiftbots.types import DependencyContainer
+from swiftbots.types import DEPENDENCY_SCOPES, DependencyContainer, DependencyScope
 
 if TYPE_CHECKING:
+    from _collections_abc import dict_items, dict_keys, dict_values
+
     from swiftbots.bots import Bot
 
 
-def depends(dependency: Callable[..., Any]) -> DependencyContainer:
+def depends(dependency: Callable[..., Any], scope: DependencyScope = 'request') -> DependencyContainer:
     """:param dependency: A "dependable" argument, must be function.
+    It can be a regular function, a coroutine function, or a generator (sync or async) function.
+    A generator must yield once: the yielded value is injected, and the code after `yield`
+    is executed when the scope is over (e.g. to close a DB session).
+    :param scope: how long the result of the dependency lives.
+    'request' - the dependency is called once per update or task run, even if several parameters use it.
+    'task' - the dependency is called once per task. The result is cleaned up when the task is removed
+    or the bot is closed. Can be used only by tasks.
+    'bot' - the dependency is called once per bot. The result is cleaned up when the bot is closed.
+    'app' - the dependency is called once per app. The result is cleaned up when the app is closed.
     """
-    return DependencyContainer(dependency)
+    assert scope in DEPENDENCY_SCOPES, f'Scope must be one of {DEPENDENCY_SCOPES}'
+    return DependencyContainer(dependency, scope)
 
 
 def is_dependable_param(param: inspect.Parameter) -> bool:
     return isinstance(param.default, DependencyContainer)
 
 
-def resolve_function_args(function: Callable[..., Any], given_data: dict) -> dict:
-    sig = inspect.signature(function)
-    args = {}
-    for param in sig.parameters.values():
-        name = param.name
-        if is_dependable_param(param):  # dependency to resolve
+class DependencyCache:
+    """Results of the dependencies which are shared within a scope (a bot or an app),
+    and cleanups of generator dependencies of the scope.
+    """
+
+    __slots__ = ('_pending', 'exit_stack', 'values')
+
+    def __init__(self) -> None:
+        self.values: dict[Callable[..., Any], Any] = {}
+        self.exit_stack = AsyncExitStack()
+        self._pending: dict[Callable[..., Any], asyncio.Future] = {}
+
+    async def get_or_create_async(self, key: Callable[..., Any], create: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value. If there is none, create it once, even if requested concurrently.
+        If the creator is cancelled, one of the waiters creates the value again.
+        """
+        while True:
+            if key in self.values:
+                return self.values[key]
+            pending = self._pending.get(key)
+            if pending is None:
+                break
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise  # the waiter itself is cancelled
+        future = self._pending[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = self.values[key] = await create()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark as retrieved if nobody else waits for it
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            del self._pending[key]
+
+    async def close_async(self) -> None:
+        self.values.clear()
+        await self.exit_stack.aclose()
+
+
+app_dependency_cache = DependencyCache()
+
+
+class FunctionPlan:
+    """The parameters of a function, resolved once from its signature.
+    Each parameter is a tuple of its name, the plan of its dependency function (or None if it's a simple parameter),
+    the scope of the dependency and its description for error messages.
+    """
+
+    __slots__ = ('call', 'function', 'has_dependencies', 'kind', 'needs_async', 'needs_exit_stack', 'parameters')
+
+    def __init__(self,
+                 function: Callable[..., Any],
+                 parameters: tuple[tuple[str, 'FunctionPlan | None', DependencyScope, str], ...],
+                 ):
+        self.function = function
+        self.parameters = parameters
+        self.kind: str
+        self.call: Callable[..., Any]
+        if inspect.isasyncgenfunction(function):
+            self.kind = 'async_generator'
+            self.call = asynccontextmanager(function)
+        elif inspect.isgeneratorfunction(function):
+            self.kind = 'generator'
+            self.call = contextmanager(function)
+        elif inspect.iscoroutinefunction(function):
+            self.kind = 'coroutine'
+            self.call = function
+        else:
+            self.kind = 'function'
+            self.call = function
+        dependencies = [(plan, scope) for _, plan, scope, _ in parameters if plan is not None]
+        self.has_dependencies = len(dependencies) > 0
+        # Whether resolving the arguments requires awaiting. Scoped dependencies with cleanups
+        # are created asynchronously too, because their cleanups are kept by the cache of the scope
+        self.needs_async: bool = any(
+            plan.kind in ('coroutine', 'async_generator') or plan.needs_async
+            or (scope != 'request' and (plan.kind == 'generator' or plan.needs_exit_stack))
+            for plan, scope in dependencies
+        )
+        # Whether there are request dependencies with cleanups
+        self.needs_exit_stack: bool = any(
+            scope == 'request' and (plan.kind in ('generator', 'async_generator') or plan.needs_exit_stack)
+            for plan, scope in dependencies
+        )
+
+    def bind(self, method: Callable[..., Any]) -> 'FunctionPlan':
+        """The plan of a bound method of the function. It's made without inspecting the method again,
+        because bound methods are made on every attribute access and can't keep their plans.
+        """
+        plan = object.__new__(FunctionPlan)
+        plan.function = method
+        plan.parameters = self.parameters[1:]
+        plan.kind = self.kind
+        if self.kind == 'async_generator':
+            plan.call = asynccontextmanager(method)
+        elif self.kind == 'generator':
+            plan.call = contextmanager(method)
+        else:
+            plan.call = method
+        # The first parameter is the instance, it's never a dependency
+        plan.has_dependencies = self.has_dependencies
+        plan.needs_async = self.needs_async
+        plan.needs_exit_stack = self.needs_exit_stack
+        return plan
+
+
+# The plan is kept by the function itself, so it's freed with the function,
+# e.g. with a closure of a task which is scheduled and then finished
+PLAN_ATTRIBUTE = '__swiftbots_plan__'
+
+
+def compile_function_plan(function: Callable[..., Any]) -> FunctionPlan:
+    parameters: list[tuple[str, FunctionPlan | None, DependencyScope, str]] = []
+    for param in inspect.signature(function).parameters.values():
+        dependency_plan = None
+        scope: DependencyScope = 'request'
+        if is_dependable_param(param):
             # Dependency function also can have dependencies
-            dep: DependencyContainer = param.default
-            dep_func = dep.dependency
-            dep_args = resolve_function_args(dep_func, given_data)
-            # Call dependency function
-            result = dep_func(**dep_args)
-            args[name] = result
-        elif name not in given_data:
-            msg = f"Can't use parameter {param}"
-            raise AssertionError(msg)
+            dependency_plan = get_function_plan(param.default.dependency)
+            scope = param.default.scope
+        parameters.append((param.name, dependency_plan, scope, str(param)))
+    return FunctionPlan(function, tuple(parameters))
+
+
+def get_function_plan(function: Callable[..., Any]) -> FunctionPlan:
+    """Return the plan of the function. Plans are compiled once and cached"""
+    if inspect.ismethod(function):
+        # A bound method is made on every attribute access, so the plan of its function is cached instead
+        return get_function_plan(function.__func__).bind(function)
+    try:
+        plan: FunctionPlan | None = vars(function).get(PLAN_ATTRIBUTE)
+    except TypeError:  # a callable without attributes isn't cached
+        return compile_function_plan(function)
+    # `functools.wraps` copies the plan of the wrapped function to the wrapper, then the wrapper needs its own
+    if plan is None or plan.function is not function:
+        plan = compile_function_plan(function)
+        with suppress(AttributeError, TypeError):  # e.g. a read-only class
+            setattr(function, PLAN_ATTRIBUTE, plan)
+    return plan
+
+
+def get_scope_cache(scope: DependencyScope, given_data: dict) -> DependencyCache:
+    if scope == 'app':
+        return app_dependency_cache
+    if scope == 'task':
+        assert 'task' in given_data, 'Task scoped dependencies can be used only in tasks'
+        task = given_data['task']
+        if task.dependency_cache is None:
+            task.dependency_cache = DependencyCache()
+        return task.dependency_cache
+    assert 'bot' in given_data, 'Bot scoped dependencies can be used only with a bot'
+    return given_data['bot']._dependency_cache
+
+
+def resolve_plan_args(plan: FunctionPlan, given_data: dict, request_cache: dict | None = None) -> dict:
+    """Resolve the arguments without awaiting. Asynchronous dependencies and dependencies with cleanups
+    are not supported here, use `resolve_plan_args_async` for them.
+    """
+    assert not plan.needs_async, f'Function {plan.function} has async dependencies. Resolve them asynchronously'
+    assert not plan.needs_exit_stack, \
+        f'Function {plan.function} has dependencies with cleanups. Resolve them asynchronously'
+    if request_cache is None and plan.has_dependencies:
+        request_cache = {}
+    args = {}
+    for name, dependency_plan, scope, description in plan.parameters:
+        if dependency_plan is not None:  # dependency to resolve
+            cache = request_cache if scope == 'request' else get_scope_cache(scope, given_data).values
+            assert cache is not None
+            key = dependency_plan.function
+            if key not in cache:
+                # Dependency function also can have dependencies
+                dep_args = resolve_plan_args(dependency_plan, given_data, request_cache)
+                assert dependency_plan.kind == 'function', \
+                    f'Dependency {key} must be resolved asynchronously'
+                # Call dependency function
+                cache[key] = dependency_plan.call(**dep_args)
+            args[name] = cache[key]
         else:  # simple parameter
-            args[name] = given_data[name]
+            try:
+                args[name] = given_data[name]
+            except KeyError:
+                msg = f"Can't use parameter {description}"
+                raise AssertionError(msg) from None
 
     return args
 
 
+async def resolve_plan_args_async(plan: FunctionPlan,
+                                  given_data: dict,
+                                  exit_stack: AsyncExitStack | None = None,
+                                  request_cache: dict | None = None,
+                                  ) -> dict:
+    """Resolve the arguments, awaiting asynchronous dependencies.
+    Cleanups of the request generator dependencies are pushed to `exit_stack`.
+    """
+    if request_cache is None and plan.has_dependencies:
+        request_cache = {}
+    args = {}
+    for name, dependency_plan, scope, description in plan.parameters:
+        if dependency_plan is not None:  # dependency to resolve
+            key = dependency_plan.function
+            if scope == 'request':
+                assert request_cache is not None
+                if key not in request_cache:
+                    dep_args = await resolve_plan_args_async(dependency_plan, given_data, exit_stack, request_cache)
+                    request_cache[key] = await call_dependency_async(dependency_plan, dep_args, exit_stack)
+                args[name] = request_cache[key]
+            else:
+                cache = get_scope_cache(scope, given_data)
+                create = partial(create_scoped_dependency_async, dependency_plan, given_data, cache)
+                args[name] = await cache.get_or_create_async(key, create)
+        else:  # simple parameter
+            try:
+                args[name] = given_data[name]
+            except KeyError:
+                msg = f"Can't use parameter {description}"
+                raise AssertionError(msg) from None
+
+    return args
+
+
+async def create_scoped_dependency_async(plan: FunctionPlan, given_data: dict, cache: DependencyCache) -> Any:
+    # The scope outlives the request, so its dependencies have their own cleanups and cache
+    dep_args = await resolve_plan_args_async(plan, given_data, cache.exit_stack)
+    return await call_dependency_async(plan, dep_args, cache.exit_stack)
+
+
+async def call_dependency_async(plan: FunctionPlan, args: dict, exit_stack: AsyncExitStack | None) -> Any:
+    kind = plan.kind
+    if kind == 'function':
+        return plan.call(**args)
+    if kind == 'coroutine':
+        return await plan.call(**args)
+    assert exit_stack is not None, f'Dependency {plan.function} has a cleanup, but there is no scope to run it'
+    if kind == 'async_generator':
+        return await exit_stack.enter_async_context(plan.call(**args))
+    return exit_stack.enter_context(plan.call(**args))
+
+
+def resolve_function_args(function: Callable[..., Any], given_data: dict) -> dict:
+    return resolve_plan_args(get_function_plan(function), given_data)
+
+
+async def resolve_function_args_async(function: Callable[..., Any],
+                                      given_data: dict,
+                                      exit_stack: AsyncExitStack | None = None,
+                                      ) -> dict:
+    return await resolve_plan_args_async(get_function_plan(function), given_data, exit_stack)
+
+
+async def call_with_resolved_args_async(function: Callable[..., Any], given_data: dict) -> Any:
+    """Resolve the arguments of the coroutine function and await it.
+    Cleanups of the request dependencies are executed right after the function is finished.
+    """
+    return await call_plan_with_resolved_args_async(get_function_plan(function), given_data)
+
+
+async def call_plan_with_resolved_args_async(plan: FunctionPlan, given_data: dict) -> Any:
+    function = plan.function
+    if plan.needs_exit_stack:
+        async with AsyncExitStack() as exit_stack:
+            args = await resolve_plan_args_async(plan, given_data, exit_stack)
+            return await function(**args)
+    if plan.needs_async:
+        args = await resolve_plan_args_async(plan, given_data)
+    else:
+        args = resolve_plan_args(plan, given_data)
+    return await function(**args)
+
+
 def decompose_bot_as_dependencies(bot: 'Bot') -> dict[str, Any]:
-    deps: dict[str, Any] = {
+    deps: dict[str, Any] = dict(make_shared_dependencies(bot))
+    deps['all_deps'] = deps
+    return deps
+
+
+def make_shared_dependencies(bot: 'Bot') -> Mapping[str, Any]:
+    """The dependencies of the bot which are the same for all its updates"""
+    return MappingProxyType({
         'name': bot.name,
         'logger': bot.logger,
         'bot': bot,
         'handler': bot.handler_func,
-    }
-    deps['all_deps'] = deps
-    return deps
+    })
+
+
+NO_LAZY_DEPENDENCIES: Mapping[str, Callable[[dict], Any]] = MappingProxyType({})
+
+
+class UpdateDependencies(dict):
+    """The dependencies of one update. The dict itself keeps only the values of the update
+    and the values set by middlewares. The values shared by all the updates of the bot are looked up
+    in `shared` instead of being copied for every update. `all_deps` is the object itself.
+    Values of `lazy` are functions, which make the value from the dependencies the first time it's requested,
+    e.g. a chat isn't made for the handlers which don't need it.
+    Iteration, `keys`, `values`, `items` and `to_dict` skip `all_deps` and the lazy values which aren't made yet.
+    """
+
+    __slots__ = ('lazy', 'shared')
+
+    def __init__(self,
+                 shared: Mapping[str, Any],
+                 values: Mapping[str, Any],
+                 lazy: Mapping[str, Callable[[dict], Any]] = NO_LAZY_DEPENDENCIES,
+                 ):
+        super().__init__(values)
+        self.shared = shared
+        self.lazy = lazy
+
+    def __missing__(self, key: str) -> Any:
+        if key == 'all_deps':
+            return self
+        make = self.lazy.get(key)
+        if make is not None:
+            value = self[key] = make(self)
+            return value
+        return self.shared[key]
+
+    def __contains__(self, key: object) -> bool:
+        return dict.__contains__(self, key) or key in self.shared or key in self.lazy or key == 'all_deps'
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __iter__(self) -> Iterator[str]:
+        yield from dict.__iter__(self)
+        for key in self.shared:
+            if not dict.__contains__(self, key):
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({self.to_dict()!r})'
+
+    def keys(self) -> 'dict_keys[str, Any]':
+        return self.to_dict().keys()
+
+    def values(self) -> 'dict_values[str, Any]':
+        return self.to_dict().values()
+
+    def items(self) -> 'dict_items[str, Any]':
+        return self.to_dict().items()
+
+    def copy(self) -> 'UpdateDependencies':
+        return UpdateDependencies(self.shared, dict(dict.items(self)), self.lazy)
+
+    def to_dict(self) -> dict[str, Any]:
+        """The values of the update and the shared values as a plain dict"""
+        return {key: self[key] for key in self}
 
 
 
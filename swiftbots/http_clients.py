@@ -0,0 +1,73 @@
+import asyncio
+
+import httpx
+
+
+class HttpClientPool:
+    """Keeps pooled HTTP connections which are shared by all the bots and admin reporters of the app,
+    so TLS handshakes are made once per host instead of once per request.
+    An asynchronous client is bound to an event loop. If the pool is used in another loop
+    (e.g. an app is run in serverless mode), a new client is created.
+    """
+
+    def __init__(self,
+                 max_connections: int | None = 100,
+                 max_keepalive_connections: int | None = 20,
+                 keepalive_expiry: float | None = 30.,
+                 http2: bool = False,
+                 timeout: float = 30.,
+                 ):
+        """:param max_connections: maximum number of concurrent connections.
+        :param max_keepalive_connections: maximum number of idle connections kept alive.
+        :param keepalive_expiry: idle connections are closed after this number of seconds.
+        :param http2: use HTTP/2 if a server supports it. Requires `httpx[http2]` to be installed.
+        :param timeout: default timeout of requests.
+        """
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+        self.timeout = timeout
+        self.__async_client: httpx.AsyncClient | None = None
+        self.__loop: asyncio.AbstractEventLoop | None = None
+        self.__client: httpx.Client | None = None
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self.__async_client is None or self.__async_client.is_closed or self.__loop is not loop:
+            self.__async_client = httpx.AsyncClient(limits=self.limits, http2=self.http2, timeout=self.timeout)
+            self.__loop = loop
+        return self.__async_client
+
+    @property
+    def client(self) -> httpx.Client:
+        if self.__client is None or self.__client.is_closed:
+            self.__client = httpx.Client(limits=self.limits, http2=self.http2, timeout=self.timeout)
+        return self.__client
+
+    async def close_async(self) -> None:
+        """Close the asynchronous client. It will be created again if needed"""
+        if self.__async_client is not None and not self.__async_client.is_closed:
+            await self.__async_client.aclose()
+        self.__async_client = None
+        self.__loop = None
+
+    def close(self) -> None:
+        """Close the synchronous client. It will be created again if needed"""
+        if self.__client is not None and not self.__client.is_closed:
+            self.__client.close()
+        self.__client = None
+
+
+__default_http_pool: HttpClientPool | None = None
+
+
+def get_default_http_pool() -> HttpClientPool:
+    """The pool used by the app and by admin reporters unless another one is given"""
+    global __default_http_pool
+    if __default_http_pool is None:
+        __default_http_pool = HttpClientPool()
+    return __default_http_pool
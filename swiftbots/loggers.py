@@ -1,10 +1,24 @@
+import asyncio
+import atexit
 import inspect
+import json
 import logging
-from collections.abc import Callable, Coroutine
+import queue
+import sys
+import weakref
+from collections.abc import Callable, Coroutine, MutableMapping
+from logging.handlers import QueueHandler, QueueListener
 from traceback import format_exc
 from typing import Any
 
 from swiftbots.all_types import ILogger, ILoggerFactory
+from swiftbots.utils import update_contexts
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
 
 report_func_type = Callable[[str], None]
 report_async_func_type = Callable[[str], Coroutine[Any, Any, None]]
@@ -44,10 +58,26 @@ def logger_exc_catcher(func: Callable) -> Callable:
     return sync_wrapper
 
 
+def is_loop_running() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def format_message(msg: str, args: tuple) -> str:
+    """Format a message the same way as `logging` does"""
+    return msg % args if args else msg
+
+
 class SysIOLogger(ILogger):
-    def __init__(self, root_logger: logging.Logger) -> None:
+    def __init__(self, root_logger: logging.Logger | logging.LoggerAdapter) -> None:
         self._root_logger = root_logger
 
+    def is_enabled_for(self, level: int) -> bool:
+        return self._root_logger.isEnabledFor(level)
+
     async def debug_async(self, msg: str, *args, **kwargs) -> None:
         self._root_logger.debug(msg, *args, **kwargs)
 
@@ -92,11 +122,94 @@ class SysIOLogger(ILogger):
         self._root_logger.warning(msg)
 
 
+# The aggregators which may have reports to send when the app is closing
+report_aggregators: 'weakref.WeakSet[ReportAggregator]' = weakref.WeakSet()
+
+
+async def flush_report_aggregators_async() -> None:
+    """Send the reports collected by all the aggregators. The app calls it when it's closing"""
+    for aggregator in list(report_aggregators):
+        await aggregator.flush_async()
+
+
+class ReportAggregator:
+    """Collects error reports for `window` seconds and sends them to the administrator as one digest,
+    so an error storm doesn't turn into a storm of messages.
+    Identical reports (e.g. the same traceback) are sent once with the number of repeats.
+    Reports are sent in the background, the caller doesn't wait for it.
+    """
+
+    def __init__(self,
+                 async_report_func: report_async_func_type,
+                 window: float = 10.,
+                 max_distinct_reports: int = 20,
+                 ):
+        """:param window: how many seconds to collect reports after the first one before sending them.
+        :param max_distinct_reports: how many different reports a digest contains. Others are only counted.
+        """
+        assert window > 0, 'Window must be positive'
+        self.window = window
+        self.max_distinct_reports = max_distinct_reports
+        self.__report_func_async = async_report_func
+        # Insertion ordered, the earliest reports go first
+        self.__reports: dict[str, int] = {}
+        self.__flush_task: asyncio.Task | None = None
+        report_aggregators.add(self)
+
+    @property
+    def pending_count(self) -> int:
+        """Number of reports waiting to be sent, including repeats"""
+        return sum(self.__reports.values())
+
+    def add(self, msg: str) -> None:
+        """Add the report to the digest. Must be called within an event loop"""
+        self.__reports[msg] = self.__reports.get(msg, 0) + 1
+        if self.__flush_task is None:
+            self.__flush_task = asyncio.get_running_loop().create_task(self.__flush_later_async())
+
+    async def flush_async(self) -> None:
+        """Send the collected reports right now"""
+        if self.__flush_task is not None and self.__flush_task is not asyncio.current_task():
+            self.__flush_task.cancel()
+        self.__flush_task = None
+        if not self.__reports:
+            return
+        reports, self.__reports = self.__reports, {}
+        await self.__send_async(self.make_digest(reports))
+
+    def make_digest(self, reports: dict[str, int]) -> str:
+        if len(reports) == 1 and next(iter(reports.values())) == 1:
+            return next(iter(reports))
+        total = sum(reports.values())
+        parts = [f'{total} reports in the last {self.window:g} seconds:']
+        for msg, count in list(reports.items())[:self.max_distinct_reports]:
+            parts.append(msg if count == 1 else f'[{count} times] {msg}')
+        skipped = sum(list(reports.values())[self.max_distinct_reports:])
+        if skipped > 0:
+            parts.append(f'...and {skipped} more reports')
+        return '\n\n'.join(parts)
+
+    async def __flush_later_async(self) -> None:
+        try:
+            await asyncio.sleep(self.window)
+        except asyncio.CancelledError:
+            # Not cancelled by `flush_async`, e.g. the loop is closing, so the reports are sent right now
+            if self.__flush_task is asyncio.current_task():
+                await self.flush_async()
+            raise
+        await self.flush_async()
+
+    @logger_exc_catcher
+    async def __send_async(self, msg: str) -> None:
+        await self.__report_func_async(msg)
+
+
 class AdminLogger(SysIOLogger):
     """A logger that logs the same as SysIOLogger, but it also reports
     to the administrator messages with levels ERROR, CRITICAL and EXCEPTION.
     Methods `report` and `report_async` send a message to an administrator
     directly and use level WARNING to log with base logging instance.
+    If an aggregator is given, errors are reported in digests.
     """
 
     def __init__(
@@ -104,43 +217,64 @@ class AdminLogger(SysIOLogger):
         report_func: report_func_type,
         async_report_func: report_async_func_type,
         root_logger: logging.Logger,
+        aggregator: ReportAggregator | None = None,
     ):
         super().__init__(root_logger)
         self._report_func = report_func
         self._report_func_async = async_report_func
+        self._aggregator = aggregator
+
+    def is_enabled_for(self, level: int) -> bool:
+        # Errors are reported even if they aren't logged
+        return level >= logging.ERROR or super().is_enabled_for(level)
 
     async def error_async(self, msg: str, *args, **kwargs) -> None:
         await super().error_async(msg, *args, **kwargs)
-        await self._call_report_func_async(msg)
+        await self._report_error_async(format_message(msg, args))
 
     def error(self, msg: str, *args, **kwargs) -> None:
         super().error(msg, *args, **kwargs)
-        self._call_report_func(msg)
+        self._report_error(format_message(msg, args))
 
     async def critical_async(self, msg: str, *args, **kwargs) -> None:
         await super().critical_async(msg, *args, **kwargs)
-        await self._call_report_func_async(msg)
+        await self._report_error_async(format_message(msg, args))
 
     def critical(self, msg: str, *args, **kwargs) -> None:
-        super().error(msg, *args, **kwargs)
-        self._call_report_func(msg)
+        super().critical(msg, *args, **kwargs)
+        self._report_error(format_message(msg, args))
 
     async def exception_async(self, msg: str, *args, **kwargs) -> None:
         await super().exception_async(msg, *args, **kwargs)
-        await self._call_report_func_async(msg)
+        await self._report_error_async(format_message(msg, args))
 
     def exception(self, msg: str, *args, **kwargs) -> None:
         super().exception(msg, *args, **kwargs)
-        self._call_report_func(msg)
+        self._report_error(format_message(msg, args))
 
     async def report_async(self, msg: str) -> None:
         await super().warning_async(msg)
+        if self._aggregator is not None:
+            # Errors which happened before are sent first
+            await self._aggregator.flush_async()
         await self._call_report_func_async(msg)
 
     def report(self, msg: str) -> None:
         super().warning(msg)
         self._call_report_func(msg)
 
+    async def _report_error_async(self, msg: str) -> None:
+        if self._aggregator is not None:
+            self._aggregator.add(msg)
+        else:
+            await self._call_report_func_async(msg)
+
+    def _report_error(self, msg: str) -> None:
+        if self._aggregator is not None and is_loop_running():
+            self._aggregator.add(msg)
+        else:
+            self._call_report_func(msg)
+
     @logger_exc_catcher
     def _call_report_func(self, msg: str) -> None:
         self._report_func(msg)
@@ -151,9 +285,12 @@ class AdminLogger(SysIOLogger):
 
 
 class SysIOLoggerFactory(ILoggerFactory):
-    def __init__(self, logger: logging.Logger | None = None):
+    def __init__(self, logger: logging.Logger | None = None, level: int = logging.INFO):
+        """:param logger: a configured logger. By default, the root logger is configured with `basicConfig`.
+        :param level: the level of the default logger. Ignored if the logger is given.
+        """
         if logger is None:
-            logging.basicConfig(level=logging.NOTSET)
+            logging.basicConfig(level=level)
             logger = logging.getLogger()
         self.logger = logger
 
@@ -167,10 +304,194 @@ class AdminLoggerFactory(SysIOLoggerFactory):
         report_func: report_func_type,
         async_report_func: report_async_func_type,
         logger: logging.Logger | None = None,
+        level: int = logging.INFO,
+        report_window: float | None = None,
     ):
-        super().__init__(logger)
+        """:param report_window: if set, errors of all the bots are collected for this number of seconds
+        and reported in one digest. See `ReportAggregator`.
+        """
+        super().__init__(logger, level)
         self.__report_func = report_func
         self.__report_func_async = async_report_func
+        self.aggregator = None if report_window is None else ReportAggregator(async_report_func, report_window)
 
     def get_logger(self) -> AdminLogger:
-        return AdminLogger(self.__report_func, self.__report_func_async, self.logger)
+        return AdminLogger(self.__report_func, self.__report_func_async, self.logger, self.aggregator)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """Puts records to a bounded queue without waiting.
+    If the queue is full, the record is dropped and counted.
+    """
+
+    def __init__(self, records_queue: queue.Queue):
+        super().__init__(records_queue)
+        self.dropped_count = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped_count += 1
+
+
+class BlockingStopQueueListener(QueueListener):
+    queue: queue.Queue
+    # The record which stops the listener. It's set by QueueListener, but isn't in the type stubs
+    _sentinel: None
+
+    def enqueue_sentinel(self) -> None:
+        # The queue may be full when stopping, then wait until the listener takes some records
+        self.queue.put(self._sentinel)
+
+
+class QueueLoggerFactory(SysIOLoggerFactory):
+    """Logs the same as SysIOLoggerFactory, but the handlers of the logger are called in a background thread,
+    so a slow stream, file or network handler doesn't block the event loop.
+    The handlers are moved from the logger behind a bounded queue. If the queue is full, records are dropped.
+    """
+
+    def __init__(self,
+                 logger: logging.Logger | None = None,
+                 handlers: list[logging.Handler] | None = None,
+                 max_queue_size: int = 10000,
+                 ):
+        """:param handlers: handlers to call in the background. By default, the handlers of the logger.
+        :param max_queue_size: how many records can wait for the handlers.
+        """
+        super().__init__(logger)
+        assert max_queue_size > 0, 'Max queue size must be positive'
+        if handlers is None:
+            handlers = list(self.logger.handlers)
+        for handler in handlers:
+            self.logger.removeHandler(handler)
+        self.__queue: queue.Queue = queue.Queue(max_queue_size)
+        self.__handler = BoundedQueueHandler(self.__queue)
+        self.logger.addHandler(self.__handler)
+        self.__listener = BlockingStopQueueListener(self.__queue, *handlers, respect_handler_level=True)
+        self.__listener.start()
+        self.__closed = False
+        atexit.register(self.close)
+
+    @property
+    def dropped_count(self) -> int:
+        """Number of records dropped because the queue was full"""
+        return self.__handler.dropped_count
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of records waiting for the handlers"""
+        return self.__queue.qsize()
+
+    def close(self) -> None:
+        """Wait until the handlers get all the queued records and stop the background thread.
+        The handlers are returned to the logger, so it keeps on logging synchronously.
+        """
+        if self.__closed:
+            return
+        self.__closed = True
+        atexit.unregister(self.close)
+        self.__listener.stop()
+        self.logger.removeHandler(self.__handler)
+        for handler in self.__listener.handlers:
+            self.logger.addHandler(handler)
+        if self.dropped_count > 0:
+            self.logger.warning('%d log records were dropped because the logging queue was full', self.dropped_count)
+
+
+def dumps_json(obj: dict) -> str:
+    if HAS_ORJSON:
+        return orjson.dumps(obj, default=str).decode()
+    return json.dumps(obj, default=str, ensure_ascii=False, separators=(',', ':'))
+
+
+class UpdateContextAdapter(logging.LoggerAdapter):
+    """Attaches the bot name and the context of the handled update to records.
+    It's done when a record is created, so the context is right even if the record is handled in another thread.
+    """
+
+    def process(self, msg: Any, kwargs: MutableMapping[str, Any]) -> tuple[Any, MutableMapping[str, Any]]:
+        extra = dict(self.extra or {})
+        context = update_contexts.get()
+        if context is not None:
+            extra['update_id'] = context.update_id
+            extra['sender'] = context.sender
+            extra['handler'] = None if context.handler is None else context.handler.__name__
+            extra['elapsed_ms'] = round(context.elapsed * 1000, 3)
+        if 'extra' in kwargs:
+            extra.update(kwargs['extra'])
+        kwargs['extra'] = extra
+        return msg, kwargs
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as a compact JSON line. Uses `orjson` if it's installed"""
+
+    context_fields = ('bot_name', 'update_id', 'sender', 'handler', 'elapsed_ms')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in self.context_fields:
+            value = getattr(record, field, None)
+            if value is not None:
+                line[field] = value
+        if record.exc_info:
+            line['exception'] = self.formatException(record.exc_info)
+        return dumps_json(line)
+
+    def formatTime(self, record: logging.LogRecord, datefmt: str | None = None) -> str:  # noqa: N802
+        if datefmt is not None:
+            return super().formatTime(record, datefmt)
+        return f'{super().formatTime(record, "%Y-%m-%dT%H:%M:%S")}.{int(record.msecs):03d}'
+
+
+class JsonLogger(SysIOLogger):
+    """Logs the same as SysIOLogger, but attaches the bot name and the context of the handled update to records:
+    its update_id, sender, handler and the time elapsed since the update came.
+    """
+
+    def __init__(self, root_logger: logging.Logger) -> None:
+        # The bot name is unknown until the logger is given to a bot
+        self.__extra: dict[str, str | None] = {'bot_name': None}
+        super().__init__(UpdateContextAdapter(root_logger, self.__extra))
+
+    @property
+    def bot_name(self) -> str:
+        return self.__extra['bot_name'] or ''
+
+    @bot_name.setter
+    def bot_name(self, name: str) -> None:
+        self.__extra['bot_name'] = name
+
+
+class JsonLoggerFactory(ILoggerFactory):
+    """Writes logs as JSON lines, one per record, so they can be indexed without parsing"""
+
+    def __init__(self,
+                 logger: logging.Logger | None = None,
+                 handler: logging.Handler | None = None,
+                 level: int = logging.INFO,
+                 ):
+        """:param logger: the logger to write to. By default, the `swiftbots` logger, which doesn't propagate
+        records to the root logger.
+        :param handler: the handler to format records as JSON. By default, the records are written to stderr.
+        :param level: the level of the default logger. Ignored if the logger is given.
+        """
+        if logger is None:
+            logger = logging.getLogger('swiftbots')
+            logger.setLevel(level)
+            logger.propagate = False
+        if handler is None:
+            handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JsonFormatter())
+        if handler not in logger.handlers:
+            logger.addHandler(handler)
+        self.logger = logger
+
+    def get_logger(self) -> JsonLogger:
+        return JsonLogger(self.logger)
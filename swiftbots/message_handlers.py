@@ -1,7 +1,9 @@
 import re
+from types import MappingProxyType
 from typing import Union
 
-from swiftbots.c_ext import search_ext
+from swiftbots.access_lists import AccessList, make_access_list
+from swiftbots.c_ext import search_trie
 from swiftbots.types import DecoratedCallable
 
 FINAL_INDICATOR = '**'
@@ -12,9 +14,9 @@ class CompiledChatCommand:
         self,
         command_name: str,
         method: DecoratedCallable,
-        pattern: re.Pattern,
-        whitelist_users: list[str] | None,
-        blacklist_users: list[str] | None,
+        pattern: re.Pattern | None,
+        whitelist_users: AccessList | None,
+        blacklist_users: AccessList | None,
     ):
         self.command_name = command_name
         self.method = method
@@ -23,6 +25,9 @@ class CompiledChatCommand:
         self.blacklist_users = blacklist_users
 
 
+# Legacy API: the character trie searched with `swiftbots.c_ext` and the per-command patterns
+# of `compile_command_as_regex`. Bots route messages with `CommandIndex` only. It's kept for the public API
+# and for `benchmarks/search_trie.py`, which compares both ways of routing.
 Trie = dict[str, Union["Trie", "CompiledChatCommand"]]
 
 
@@ -33,35 +38,109 @@ def insert_trie(trie: Trie, word: str, command: CompiledChatCommand) -> None:
 
 
 def search_best_command_match(trie: Trie, word: str) -> tuple[CompiledChatCommand | None, re.Match | None]:
+    """Legacy search of the command, use `CommandIndex.match` instead.
+    The pattern of a command without one is compiled with `compile_command_as_regex` on the first match.
+    """
     matches = [trie[FINAL_INDICATOR]] if FINAL_INDICATOR in trie else []
     sub_word = word
-    while trie is not None:
-        trie = search_ext.search_trie(trie, sub_word.lower())
-        if trie is not None:
-            command: CompiledChatCommand = trie[FINAL_INDICATOR]
+    node: dict | None = trie
+    while node is not None:
+        node = search_trie(node, sub_word.lower())
+        if node is not None:
+            command: CompiledChatCommand = node[FINAL_INDICATOR]
             matches.append(command)
             sub_word = word[len(command.command_name):]
     for command in reversed(matches):
+        if command.pattern is None:
+            command.pattern = compile_command_as_regex(command.command_name)
         match = command.pattern.fullmatch(word)
         if match is not None:
             return command, match
     return None, None
 
 
+class CommandIndex:
+    """An immutable index of all the commands of a bot, built once with `build_command_index`.
+    All the command names are compiled into one regex shaped as a trie, for example
+    `(?:add(?: note)?|remove)`, so the longest matching command and its arguments
+    are found with a single `fullmatch` call.
+    """
+
+    __slots__ = ('_commands', '_default_command', '_pattern')
+
+    def __init__(self,
+                 pattern: re.Pattern | None,
+                 commands: dict[str, CompiledChatCommand],
+                 default_command: CompiledChatCommand | None):
+        self._pattern = pattern
+        self._commands = MappingProxyType(commands)
+        self._default_command = default_command
+
+    def match(self, message: str) -> tuple[CompiledChatCommand | None, str]:
+        """Find the longest command the message starts with.
+        :returns: the command (None if nothing matched) and the arguments, which is the rest of the message.
+        """
+        if self._pattern is not None:
+            match = self._pattern.fullmatch(message)
+            if match is not None:
+                command_name, arguments = match.groups()
+                command = self._commands.get(command_name.lower())
+                if command is not None:
+                    return command, arguments or ''
+        if self._default_command is not None:
+            return self._default_command, message
+        return None, ''
+
+
+def _build_trie_pattern(node: dict) -> str:
+    """Make a regex from a trie of characters. The end of a command in the trie is marked with FINAL_INDICATOR.
+    Longer commands are preferred, because the optional group of a command continuation is greedy.
+    """
+    is_final = FINAL_INDICATOR in node
+    branches = [re.escape(ch) + _build_trie_pattern(child) for ch, child in node.items() if ch != FINAL_INDICATOR]
+    if not branches:
+        return ''
+    pattern = branches[0] if len(branches) == 1 and not is_final else f"(?:{'|'.join(branches)})"
+    return f'{pattern}?' if is_final else pattern
+
+
+def build_command_index(commands: list[CompiledChatCommand]) -> CommandIndex:
+    named_commands: dict[str, CompiledChatCommand] = {}
+    default_command = None
+    for command in commands:
+        if command.command_name == '':
+            default_command = command
+        else:
+            named_commands[command.command_name.lower()] = command
+    pattern = None
+    if named_commands:
+        trie: dict = {}
+        for name in named_commands:
+            node = trie
+            for ch in name:
+                node = node.setdefault(ch, {})
+            node[FINAL_INDICATOR] = {}
+        # Group 1 is the command, group 2 is the arguments after any whitespace characters
+        pattern = re.compile(rf"({_build_trie_pattern(trie)})(?:\s+(.*))?", re.IGNORECASE | re.DOTALL)
+    return CommandIndex(pattern, named_commands, default_command)
+
+
 class ChatMessageHandler:
     def __init__(self,
                  commands: list[str],
                  function: DecoratedCallable,
-                 whitelist_users: list[str | int] | None,
-                 blacklist_users: list[str | int] | None):
+                 whitelist_users: AccessList | list[str | int] | None,
+                 blacklist_users: AccessList | list[str | int] | None):
         self.commands = commands
         self.function = function
-        self.whitelist_users = None if whitelist_users is None else [str(x).casefold() for x in whitelist_users]
-        self.blacklist_users = None if blacklist_users is None else [str(x).casefold() for x in blacklist_users]
+        # All the commands of the handler share the same access lists
+        self.whitelist_users = make_access_list(whitelist_users)
+        self.blacklist_users = make_access_list(blacklist_users)
 
 
 def compile_command_as_regex(name: str) -> re.Pattern:
-    """Compile with regex patterns all the command names for the faster search.
+    """Legacy API, used only by `search_best_command_match`.
+    Compile with regex patterns all the command names for the faster search.
     Pattern is:
     1. Begins with the NAME OF COMMAND (case-insensitive).
     2. Then any whitespace characters [ \f\n\r\t\v] (zero or more).
@@ -77,11 +156,12 @@ def compile_command_as_regex(name: str) -> re.Pattern:
 def compile_chat_commands(
     handlers: list[ChatMessageHandler],
 ) -> list[CompiledChatCommand]:
+    """The commands are routed with `build_command_index`, so no per-command pattern is compiled here"""
     return [
         CompiledChatCommand(
             command_name=command,
             method=handler.function,
-            pattern=compile_command_as_regex(command),
+            pattern=None,
             blacklist_users=handler.blacklist_users,
             whitelist_users=handler.whitelist_users,
         )
@@ -91,12 +171,12 @@ def compile_chat_commands(
 
 
 def is_user_allowed(user: str | int,
-                    whitelist_users: list[str] | None,
-                    blacklist_users: list[str] | None,
+                    whitelist_users: AccessList | None,
+                    blacklist_users: AccessList | None,
                     ) -> bool:
-    user = str(user).casefold()
-    if blacklist_users is not None:
-        return user not in blacklist_users
+    """The blacklist has a privilege upon the whitelist: a user from both lists isn't allowed"""
+    if blacklist_users is not None and user in blacklist_users:
+        return False
     if whitelist_users is not None:
         return user in whitelist_users
     return True
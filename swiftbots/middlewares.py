@@ -1,16 +1,19 @@
 import asyncio
-from collections.abc import AsyncGenerator, Coroutine
+import logging
+from collections.abc import AsyncGenerator, Callable, Coroutine
 from traceback import format_exc
-from typing import TYPE_CHECKING, Any
+from typing import TYPE_CHECKING, Any, cast
 
 from swiftbots.all_types import ExitBotException, RestartListeningException
-from swiftbots.functions import decompose_bot_as_dependencies, resolve_function_args
-from swiftbots.message_handlers import is_user_allowed, search_best_command_match
+from swiftbots.functions import UpdateDependencies, call_with_resolved_args_async
+from swiftbots.message_handlers import is_user_allowed
 from swiftbots.types import CallNextMiddleware, Middleware
 from swiftbots.utils import (
     CRITICAL_ERROR_STARTUP_THRESHOLD_SECONDS,
     ErrorRateMonitor,
+    UpdateContext,
     error_rate_monitors,
+    update_contexts,
 )
 
 if TYPE_CHECKING:
@@ -24,6 +27,17 @@ def make_layer(bot: 'Bot', cur_layer: Middleware, next_layer: CallNextMiddleware
 
 
 def compose_middlewares(bot: 'Bot', middlewares: list[Middleware]) -> CallNextMiddleware:
+    """Build the pipeline of the middlewares. A default stack of the framework middlewares
+    (with any user middlewares before `call_with_dependencies_injected`) is compiled into one flattened coroutine,
+    other stacks are chained layer by layer.
+    """
+    fused = compile_fused_pipeline(bot, middlewares)
+    if fused is not None:
+        return fused
+    return chain_middlewares(bot, middlewares)
+
+
+def chain_middlewares(bot: 'Bot', middlewares: list[Middleware]) -> CallNextMiddleware:
     next_callable: CallNextMiddleware = lambda x: x  # noqa: E731
 
     for middleware in reversed(middlewares):
@@ -41,107 +55,169 @@ async def process_listener_exceptions(
     Too frequent exceptions cause the bot to sleep for some time.
     Used only for listener functions.
     """
-    err_monitor = error_rate_monitors.get(None)
-    if err_monitor is None:
-        err_monitor = ErrorRateMonitor(cooldown=60)
-        error_rate_monitors.set(err_monitor)
+    err_monitor = get_error_rate_monitor()
 
     try:
         await call_next(listen_generator)
     except RestartListeningException:
-        return bot.listener_func()
+        return start_listener(bot)
     except Exception as e:
-        await bot.logger.exception_async(
-            f"Bot {bot.name} was raised with unhandled `{e.__class__.__name__}`"
-            f" and kept listening on:\n{e}.\nFull traceback:\n{format_exc()}",
-        )
-        if err_monitor.since_start < CRITICAL_ERROR_STARTUP_THRESHOLD_SECONDS:
-            msg = f"Bot {bot.name} raises immediately after start listening. Stopping the bot."
-            raise ExitBotException(msg) from e
-        if err_monitor.exceeded_error_rate:
-            await bot.logger.error_async(f"Bot {bot.name} sleeps for 30 seconds.")
-            await asyncio.sleep(30)
-            err_monitor.reset_error_count()
-        return bot.listener_func()
+        return await recover_listener_async(bot, e, err_monitor)
     else:
         return listen_generator
 
 
-async def execute_listener(_: 'Bot', listen_generator: AsyncGenerator, call_next: CallNextMiddleware) -> Any:
+def start_listener(bot: 'Bot') -> AsyncGenerator:
+    """Make a new generator of the bot listener, e.g. when the listener is restarted"""
+    listener_func = cast('Callable[[], AsyncGenerator]', bot.listener_func)
+    return listener_func()
+
+
+def get_error_rate_monitor() -> ErrorRateMonitor:
+    err_monitor = error_rate_monitors.get(None)
+    if err_monitor is None:
+        err_monitor = ErrorRateMonitor(cooldown=60)
+        error_rate_monitors.set(err_monitor)
+    return err_monitor
+
+
+async def recover_listener_async(bot: 'Bot', e: Exception, err_monitor: ErrorRateMonitor) -> AsyncGenerator:
+    """Log the exception raised by the listener and return a new listener generator.
+    Must be called in the `except` block.
+    """
+    await bot.logger.exception_async(
+        "Bot %s was raised with unhandled `%s` and kept listening on:\n%s.\nFull traceback:\n%s",
+        bot.name, e.__class__.__name__, e, format_exc(),
+    )
+    if err_monitor.since_start < CRITICAL_ERROR_STARTUP_THRESHOLD_SECONDS:
+        msg = f"Bot {bot.name} raises immediately after start listening. Stopping the bot."
+        raise ExitBotException(msg) from e
+    if err_monitor.exceeded_error_rate:
+        await bot.logger.error_async("Bot %s sleeps for 30 seconds.", bot.name)
+        await asyncio.sleep(30)
+        err_monitor.reset_error_count()
+    return start_listener(bot)
+
+
+async def execute_listener(bot: 'Bot', listen_generator: AsyncGenerator, call_next: CallNextMiddleware) -> Any:
     """The middleware extracts the request from the bot listener and passes it to the next middleware.
+    If the bot has a concurrent dispatcher, the next middleware is scheduled as a task
+    and the listener doesn't wait until it's finished.
+    Updates rejected by the update filters of the bot are dropped here.
     """
     output = await listen_generator.__anext__()
+    if bot._update_filters and not passes_update_filters(bot, output):
+        return None
+    if bot._dispatcher is not None:
+        return await bot._dispatcher.dispatch(call_next, output)
     return await call_next(output)
 
 
+def passes_update_filters(bot: 'Bot', update: Any) -> bool:
+    """Check the raw update before anything is made for it, so junk updates are dropped cheaply"""
+    return all(update_filter(bot, update) for update_filter in bot._update_filters)
+
+
 async def process_handler_exceptions(bot: 'Bot', output: Any, call_next: CallNextMiddleware) -> Any:
     try:
         return await call_next(output)
-    except (AttributeError, TypeError, KeyError, AssertionError) as e:
+    except Exception as e:
+        await log_handler_exception_async(bot, e)
+
+
+async def log_handler_exception_async(bot: 'Bot', e: Exception) -> None:
+    """Must be called in the `except` block"""
+    if isinstance(e, (AttributeError, TypeError, KeyError, AssertionError)):
         await bot.logger.critical_async(
-            f"Fix the code. Critical `{e.__class__.__name__}` "
-            f"raised:\n{e}.\nFull traceback:\n{format_exc()}",
+            "Fix the code. Critical `%s` raised:\n%s.\nFull traceback:\n%s",
+            e.__class__.__name__, e, format_exc(),
         )
-    except Exception as e:
+    else:
         await bot.logger.exception_async(
-            f"Bot {bot.name} was raised with unhandled `{e.__class__.__name__}` "
-            f"and kept on working:\n{e}.\nFull traceback:\n{format_exc()}",
+            "Bot %s was raised with unhandled `%s` and kept on working:\n%s.\nFull traceback:\n%s",
+            bot.name, e.__class__.__name__, e, format_exc(),
         )
 
 
 async def load_dependencies(bot: 'Bot', output: dict, call_next: CallNextMiddleware) -> Any:
-    deps = decompose_bot_as_dependencies(bot)
-    deps.update(output)
-    return await call_next(deps)
+    deps = UpdateDependencies(bot._shared_dependencies, output)
+    # Loggers attach the context to the records logged while the update is handled
+    token = update_contexts.set(UpdateContext(bot.name, output))
+    try:
+        return await call_next(deps)
+    finally:
+        update_contexts.reset(token)
 
 
 async def call_with_dependencies_injected(_: 'Bot', deps: dict, __: CallNextMiddleware) -> Any:
+    return await call_handler_async(deps)
+
+
+def call_handler_async(deps: dict) -> Coroutine:
     handler = deps['handler']
-    args = resolve_function_args(handler, deps)
-    return await handler(**args)
+    context = update_contexts.get()
+    if context is not None:
+        context.handler = handler
+    return call_with_resolved_args_async(handler, deps)
 
 
 async def load_chat_dependencies(bot: 'ChatBot', deps: dict, call_next: CallNextMiddleware) -> Any:
-    deps['raw_message'] = deps['message']
-    chat = bot._make_chat(deps)
-    deps['chat'] = chat
+    add_chat_dependencies(bot, deps)
     return await call_next(deps)
 
 
+def add_chat_dependencies(bot: 'ChatBot', deps: dict) -> None:
+    deps['raw_message'] = deps['message']
+    if isinstance(deps, UpdateDependencies):
+        # The chat is made only if the handler or a middleware asks for it
+        deps.lazy = bot._lazy_chat_dependencies
+    else:
+        deps['chat'] = bot._make_chat(deps)
+
+
 async def route_chat_message(bot: 'ChatBot', deps: dict, call_next: CallNextMiddleware) -> dict:
-    trie = bot._trie
-    chat = deps['chat']
-    message = chat.message
-    best_matched_command, match = search_best_command_match(trie, message)
+    reply = find_chat_route(bot, deps)
+    if reply is not None:
+        return await reply()
+    return await call_next(deps)
 
-    if best_matched_command and not is_user_allowed(chat.sender, best_matched_command.whitelist_users,
-                                                    best_matched_command.blacklist_users):
-        return await chat.refuse_async()
 
-    arguments = ""
-    # check if the command has arguments like `ADD NOTE apple, cigarettes, cheese`,
+def find_chat_route(bot: 'ChatBot', deps: dict) -> Callable[[], Coroutine] | None:
+    """Find the command of the message and put its handler and arguments to the dependencies.
+    If the message can't be handled, return the reply to send instead.
+    """
+    message = deps['raw_message']
+    # Find the command and its arguments like `ADD NOTE apple, cigarettes, cheese`,
     # where `ADD NOTE` is a command and the rest is arguments
-    if match:
-        message_without_command = match.group(1)
-        if message_without_command:
-            arguments = message_without_command
+    best_matched_command, arguments = bot._command_index.match(message)
+
+    if best_matched_command and not is_user_allowed(deps['sender'], best_matched_command.whitelist_users,
+                                                    best_matched_command.blacklist_users):
+        return deps['chat'].refuse_async
 
     # Found the command. Call the method attached to the command
     if not best_matched_command: # No matches. Send `unknown message`
-        return await chat.unknown_command_async()
+        return deps['chat'].unknown_command_async
 
     command_name = best_matched_command.command_name
     deps['arguments'] = deps['args'] = deps['message'] = arguments
     deps['command'] = command_name
     deps['handler'] = best_matched_command.method
-    return await call_next(deps)
+    return None
 
 
 async def deconstruct_telegram_message(bot: 'TelegramBot', update: dict, call_next: CallNextMiddleware) -> dict | None:
     """https://core.telegram.org/bots/api#message
+    The update is a single object of the `getUpdates` result or a webhook request.
     """
-    if 'result' in update:
-        update = update["result"][0]
+    output = await parse_telegram_update_async(bot, update)
+    if output is None:
+        return None
+    return await call_next(output)
+
+
+async def parse_telegram_update_async(bot: 'TelegramBot', update: dict) -> dict | None:
+    """Extract the message from the update. None if the update isn't supported"""
     if "message" in update:
         message = update["message"]
         sender = message["from"]["id"]
@@ -152,11 +228,12 @@ async def deconstruct_telegram_message(bot: 'TelegramBot', update: dict, call_ne
             text = message["text"]
         if "photo" in message:
             photo = message["photo"][-1]["file_id"]
-        await bot.logger.info_async(
-            f"Came message {'with photo' + photo if photo else ''} from '{sender}' ({username}): '{text}'",
-        )
+        if bot.logger.is_enabled_for(logging.INFO):
+            await bot.logger.info_async(
+                "Came message%s from '%s' (%s): '%s'", ' with photo ' + photo if photo else '', sender, username, text,
+            )
         if text or photo:
-            output = {
+            return {
                 "message": text,
                 "photo": photo,
                 "sender": sender,
@@ -164,6 +241,100 @@ async def deconstruct_telegram_message(bot: 'TelegramBot', update: dict, call_ne
                 "username": username,
                 "raw_update": update,
             }
-            return await call_next(output)
-    await bot.logger.error_async("Unknown message type:\n" + str(update))
+    await bot.logger.error_async("Unknown message type:\n%s", update)
     return None
+
+
+def compile_fused_pipeline(bot: 'Bot', middlewares: list[Middleware]) -> CallNextMiddleware | None:
+    """Compile a default stack into one coroutine which does the work of the framework middlewares inline,
+    instead of awaiting a coroutine per middleware. User middlewares are chained as usual
+    and are called where `call_with_dependencies_injected` would be called.
+    The stack is `[process_listener_exceptions], execute_listener, [deconstruct_telegram_message],
+    [process_handler_exceptions], load_dependencies, [load_chat_dependencies, route_chat_message],
+    *user middlewares, call_with_dependencies_injected`.
+    Return None if the stack is different.
+    """
+    stack: list[Callable[..., Any]] = list(middlewares)
+
+    def take(*expected: Callable[..., Any]) -> bool:
+        if stack[:len(expected)] == list(expected):
+            del stack[:len(expected)]
+            return True
+        return False
+
+    catch_listener = take(process_listener_exceptions)
+    if not take(execute_listener):
+        return None
+    parse_telegram = take(deconstruct_telegram_message)
+    catch_handler = take(process_handler_exceptions)
+    if not take(load_dependencies):
+        return None
+    route_chat = take(load_chat_dependencies, route_chat_message)
+    if not stack or stack[-1] is not call_with_dependencies_injected:
+        return None
+    if any(middleware in FUSABLE_MIDDLEWARES for middleware in stack[:-1]):
+        return None
+    tail = chain_middlewares(bot, stack) if len(stack) > 1 else call_handler_async
+
+    # The stack has the chat and telegram middlewares only if the bot is such
+    chat_bot = cast('ChatBot', bot)
+    telegram_bot = cast('TelegramBot', bot)
+
+    async def handle(output: Any) -> Any:
+        if parse_telegram:
+            output = await parse_telegram_update_async(telegram_bot, output)
+            if output is None:
+                return None
+        try:
+            deps = UpdateDependencies(bot._shared_dependencies, output)
+            token = update_contexts.set(UpdateContext(bot.name, output))
+            try:
+                if route_chat:
+                    add_chat_dependencies(chat_bot, deps)
+                    reply = find_chat_route(chat_bot, deps)
+                    if reply is not None:
+                        return await reply()
+                return await tail(deps)
+            finally:
+                update_contexts.reset(token)
+        except Exception as e:
+            if not catch_handler:
+                raise
+            await log_handler_exception_async(bot, e)
+
+    async def listen(listen_generator: AsyncGenerator) -> Any:
+        if not catch_listener:
+            output = await listen_generator.__anext__()
+            if bot._update_filters and not passes_update_filters(bot, output):
+                return None
+            if bot._dispatcher is not None:
+                return await bot._dispatcher.dispatch(handle, output)
+            return await handle(output)
+
+        err_monitor = get_error_rate_monitor()
+        try:
+            output = await listen_generator.__anext__()
+            if not bot._update_filters or passes_update_filters(bot, output):
+                if bot._dispatcher is not None:
+                    await bot._dispatcher.dispatch(handle, output)
+                else:
+                    await handle(output)
+        except RestartListeningException:
+            return start_listener(bot)
+        except Exception as e:
+            return await recover_listener_async(bot, e, err_monitor)
+        return listen_generator
+
+    return listen
+
+
+FUSABLE_MIDDLEWARES = frozenset((
+    process_listener_exceptions,
+    execute_listener,
+    deconstruct_telegram_message,
+    process_handler_exceptions,
+    load_dependencies,
+    load_chat_dependencies,
+    route_chat_message,
+    call_with_dependencies_injected,
+))
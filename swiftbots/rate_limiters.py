@@ -0,0 +1,138 @@
+import asyncio
+import time
+
+# Buckets of idle chats are evicted when there are more than this number of buckets
+CHAT_BUCKETS_EVICTION_THRESHOLD = 10000
+
+
+class TokenBucket:
+    """Allows `rate` events per second with bursts up to `capacity` events.
+    Tokens may be reserved in advance, then the bucket goes into debt
+    and the caller is told how long to wait for its token.
+    """
+
+    __slots__ = ('capacity', 'rate', 'tokens', 'updated', 'waiting')
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        assert rate > 0, 'Rate must be positive'
+        assert capacity >= 1, 'Capacity must be at least 1'
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.waiting = 0
+
+    def reserve(self, now: float) -> float:
+        """Take a token. Return the number of seconds to wait until the token is actually available"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0. if self.tokens >= 0 else -self.tokens / self.rate
+
+    def is_idle(self, now: float) -> bool:
+        return self.waiting == 0 and self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class TelegramRateLimiter:
+    """Keeps outbound requests of a bot within Telegram limits
+    https://core.telegram.org/bots/faq#my-bot-is-hitting-limits-how-do-i-avoid-this.
+    There is a global limit for all the chats, a limit for each private chat and a limit for each group.
+    Requests exceeding the limits wait in the queue in the order they came.
+    """
+
+    def __init__(self,
+                 global_rate: float = 30.,
+                 chat_rate: float = 1.,
+                 group_rate: float = 20 / 60,
+                 chat_burst: float = 3.,
+                 ):
+        """:param global_rate: messages per second to all the chats.
+        :param chat_rate: messages per second to one private chat.
+        :param group_rate: messages per second to one group or channel.
+        :param chat_burst: how many messages can be sent to one chat at once before limiting.
+        """
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.__global_bucket = TokenBucket(global_rate, global_rate, time.monotonic())
+        self.__chat_buckets: dict[int | str, TokenBucket] = {}
+        self.__eviction_threshold = CHAT_BUCKETS_EVICTION_THRESHOLD
+        self.__blocked_until = 0.
+        self.__unblocked = asyncio.Event()
+        self.__unblocked.set()
+        self.__unblock_handle: asyncio.TimerHandle | None = None
+        self.__waiting = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of requests waiting to be sent"""
+        return self.__waiting
+
+    @property
+    def blocked_for(self) -> float:
+        """Number of seconds left until Telegram allows to send again"""
+        return max(0., self.__blocked_until - time.monotonic())
+
+    def chat_queue_depth(self, chat_id: int | str) -> int:
+        """Number of requests waiting to be sent to the chat"""
+        bucket = self.__chat_buckets.get(chat_id)
+        return 0 if bucket is None else bucket.waiting
+
+    def block(self, seconds: float) -> None:
+        """Stop sending anything for some time. Used when Telegram responds with `retry_after`.
+        Must be called in the event loop.
+        """
+        self.__blocked_until = max(self.__blocked_until, time.monotonic() + seconds)
+        if self.__unblock_handle is not None:
+            self.__unblock_handle.cancel()
+        self.__unblocked.clear()
+        self.__unblock_handle = asyncio.get_running_loop().call_later(self.blocked_for, self.__unblock)
+
+    def __unblock(self) -> None:
+        self.__unblock_handle = None
+        self.__unblocked.set()
+
+    async def acquire_async(self, chat_id: int | str | None) -> None:
+        """Wait until a message can be sent to the chat"""
+        self.__waiting += 1
+        bucket = None if chat_id is None else self.__get_chat_bucket(chat_id)
+        if bucket is not None:
+            bucket.waiting += 1
+        try:
+            if bucket is not None:
+                delay = bucket.reserve(time.monotonic())
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await self.__unblocked.wait()
+            delay = self.__global_bucket.reserve(time.monotonic())
+            if delay > 0:
+                await asyncio.sleep(delay)
+        finally:
+            self.__waiting -= 1
+            if bucket is not None:
+                bucket.waiting -= 1
+
+    def __get_chat_bucket(self, chat_id: int | str) -> TokenBucket:
+        bucket = self.__chat_buckets.get(chat_id)
+        if bucket is None:
+            now = time.monotonic()
+            if len(self.__chat_buckets) >= self.__eviction_threshold:
+                self.__evict_idle_buckets(now)
+            rate = self.group_rate if self.__is_group(chat_id) else self.chat_rate
+            bucket = self.__chat_buckets[chat_id] = TokenBucket(rate, self.chat_burst, now)
+        return bucket
+
+    def __evict_idle_buckets(self, now: float) -> None:
+        self.__chat_buckets = {
+            chat_id: bucket for chat_id, bucket in self.__chat_buckets.items() if not bucket.is_idle(now)
+        }
+        # If most of the chats are active, don't try to evict them on every new chat
+        self.__eviction_threshold = max(CHAT_BUCKETS_EVICTION_THRESHOLD, len(self.__chat_buckets) * 2)
+
+    @staticmethod
+    def __is_group(chat_id: int | str) -> bool:
+        """Group and channel ids are negative. Channels can also be addressed by `@username`"""
+        if isinstance(chat_id, int):
+            return chat_id < 0
+        return chat_id.startswith(('-', '@'))
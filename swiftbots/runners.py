@@ -10,6 +10,8 @@ from swiftbots.all_types import (
 )
 from swiftbots.app.container import AppContainer
 from swiftbots.bots import Bot, build_scheduler, stop_bot_async
+from swiftbots.functions import app_dependency_cache
+from swiftbots.loggers import flush_report_aggregators_async
 from swiftbots.middlewares import compose_middlewares
 
 __ALL_TASKS: set[str] = set()
@@ -24,6 +26,13 @@ async def start_async_listener(bot: Bot) -> None:
     """Launches all bot listeners, and sends all updates to their handlers.
     Runs asynchronously.
     """
+    if bot._dispatcher is not None:
+        await bot._dispatcher.supervise(bot, listen_async(bot))
+    else:
+        await listen_async(bot)
+
+
+async def listen_async(bot: Bot) -> None:
     generator = bot.listener_func()
     middlewares = bot._middlewares
     entry = compose_middlewares(bot, middlewares)
@@ -65,6 +74,9 @@ async def start_async_loop(app_container: AppContainer) -> None:
             await app_container.logger.report_async("Bots application's closed. The reason is no bots launched now.")
             for bot_to_close in bots:
                 await bot_to_close.before_close_async()
+            await flush_report_aggregators_async()
+            await app_dependency_cache.close_async()
+            await app_container.http_pool.close_async()
             sys.exit(1)
         done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
         for task in done:
@@ -72,19 +84,13 @@ async def start_async_loop(app_container: AppContainer) -> None:
             logger = bots_dict[name].logger if name != __SCHEDULER_TASK_NAME else app_container.logger
             try:
                 result = task.result()
-                await logger.critical_async(
-                    f"Bot {name} is finished with result {result} and restarted",
-                )
+                await logger.critical_async("Bot %s is finished with result %s and restarted", name, result)
             except (asyncio.CancelledError, ExitBotException) as ex:
                 if isinstance(ex, asyncio.CancelledError):
-                    await logger.warning_async(
-                        f"Bot {name} is cancelled. Not started again",
-                    )
+                    await logger.warning_async("Bot %s is cancelled. Not started again", name)
                     await logger.report_async(f"Bot {name}'s exited")
                 elif isinstance(ex, ExitBotException):
-                    await logger.error_async(
-                        f"Bot {name} is exited with message: {ex}",
-                    )
+                    await logger.error_async("Bot %s is exited with message: %s", name, ex)
                 bot = bots_dict[name]
                 await stop_bot_async(bot, sched)
                 tasks.remove(task)
@@ -112,9 +118,7 @@ async def start_async_loop(app_container: AppContainer) -> None:
                     )
                     tasks.add(new_task)
                 except Exception as e:
-                    await logger.critical_async(
-                        f"Couldn't start bot {ex}. Exception: {e}",
-                    )
+                    await logger.critical_async("Couldn't start bot %s. Exception: %s", ex, e)
             except ExitApplicationException:
                 # close all bots
                 for a_task in tasks:
@@ -128,6 +132,9 @@ async def start_async_loop(app_container: AppContainer) -> None:
                 for bot_to_close in bots:
                         await bot_to_close.before_close_async()
                 await logger.report_async("Bots application's closed")
+                await flush_report_aggregators_async()
+                await app_dependency_cache.close_async()
+                await app_container.http_pool.close_async()
                 sys.exit(0)
 
 
@@ -144,6 +151,9 @@ async def run_oneshot_async(container: AppContainer, run_with: dict, timeout: fl
         entry = compose_middlewares(bot, bot._middlewares)
         await entry(message)
         await bot.before_close_async()
+        await flush_report_aggregators_async()
+        await app_dependency_cache.close_async()
+        await container.http_pool.close_async()
 
 
 def run_oneshot(container: AppContainer, run_with: dict, timeout: float | None = None) -> None:
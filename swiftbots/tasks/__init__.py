@@ -1,10 +1,18 @@
 __all__ = [
+    'AtTrigger',
+    'CronTrigger',
+    'HeapScheduler',
+    'JitteredPeriodTrigger',
+    'JobState',
+    'MemoryJobStore',
     'PeriodTrigger',
+    'SQLiteJobStore',
     'SimpleScheduler',
     'TaskInfo',
 ]
 
 
-from swiftbots.tasks.schedulers import SimpleScheduler
+from swiftbots.tasks.job_stores import JobState, MemoryJobStore, SQLiteJobStore
+from swiftbots.tasks.schedulers import HeapScheduler, SimpleScheduler
 from swiftbots.tasks.tasks import TaskInfo
-from swiftbots.tasks.triggers import PeriodTrigger
+from swiftbots.tasks.triggers import AtTrigger, CronTrigger, JitteredPeriodTrigger, PeriodTrigger
@@ -0,0 +1,116 @@
+__all__ = [
+    'JobState',
+    'MemoryJobStore',
+    'SQLiteJobStore',
+]
+
+import asyncio
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime
+
+from swiftbots.all_types import IJobStore
+
+
+@dataclass
+class JobState:
+    last_run: datetime | None
+    next_run: datetime | None
+
+
+class MemoryJobStore(IJobStore):
+    """Keeps states in memory only, so they are lost when the app is restarted. Used by default"""
+
+    def __init__(self) -> None:
+        self.__states: dict[str, JobState] = {}
+
+    def load(self, name: str) -> JobState | None:
+        return self.__states.get(name)
+
+    def save(self, name: str, state: JobState) -> None:
+        self.__states[name] = state
+
+    def delete(self, name: str) -> None:
+        self.__states.pop(name, None)
+
+
+class SQLiteJobStore(IJobStore):
+    """Keeps states in a SQLite database file.
+    States are read once, when the first task is added, and are written in batches in a separate thread,
+    so the event loop isn't blocked by the disk.
+    """
+
+    def __init__(self, path: str, table: str = 'swiftbots_jobs'):
+        """:param path: the database file. It's created if it doesn't exist.
+        :param table: the table to keep states in. It's created if it doesn't exist.
+        """
+        assert table.isidentifier(), 'Table name must be a valid identifier'
+        self.path = path
+        self.table = table
+        self.__connection: sqlite3.Connection | None = None
+        self.__states: dict[str, JobState] | None = None
+        self.__pending: dict[str, JobState] = {}
+        self.__deleted: set[str] = set()
+
+    def load(self, name: str) -> JobState | None:
+        if self.__states is None:
+            self.__states = self.__read_states()
+        return self.__states.get(name)
+
+    def save(self, name: str, state: JobState) -> None:
+        if self.__states is not None:
+            self.__states[name] = state
+        self.__pending[name] = state
+        self.__deleted.discard(name)
+
+    def delete(self, name: str) -> None:
+        if self.__states is not None:
+            self.__states.pop(name, None)
+        self.__pending.pop(name, None)
+        self.__deleted.add(name)
+
+    async def flush_async(self) -> None:
+        if not self.__pending and not self.__deleted:
+            return
+        pending, self.__pending = self.__pending, {}
+        deleted, self.__deleted = self.__deleted, set()
+        await asyncio.to_thread(self.__write_states, pending, deleted)
+
+    async def close_async(self) -> None:
+        await self.flush_async()
+        if self.__connection is not None:
+            self.__connection.close()
+            self.__connection = None
+
+    def __connect(self) -> sqlite3.Connection:
+        if self.__connection is None:
+            # Writes are made from worker threads, but never at the same time
+            self.__connection = sqlite3.connect(self.path, check_same_thread=False)
+            with self.__connection:
+                self.__connection.execute(
+                    f'CREATE TABLE IF NOT EXISTS {self.table} '
+                    f'(name TEXT PRIMARY KEY, last_run TEXT, next_run TEXT)',
+                )
+        return self.__connection
+
+    def __read_states(self) -> dict[str, JobState]:
+        rows = self.__connect().execute(f'SELECT name, last_run, next_run FROM {self.table}')
+        return {name: JobState(self.__parse_time(last_run), self.__parse_time(next_run))
+                for name, last_run, next_run in rows}
+
+    def __write_states(self, states: dict[str, JobState], deleted: set[str]) -> None:
+        with self.__connect() as connection:
+            connection.executemany(f'DELETE FROM {self.table} WHERE name = ?', [(name,) for name in deleted])
+            connection.executemany(
+                f'INSERT OR REPLACE INTO {self.table} (name, last_run, next_run) VALUES (?, ?, ?)',
+                [(name, self.__format_time(state.last_run), self.__format_time(state.next_run))
+                 for name, state in states.items()],
+            )
+
+    @staticmethod
+    def __format_time(time: datetime | None) -> str | None:
+        return None if time is None else time.isoformat()
+
+    @staticmethod
+    def __parse_time(time: str | None) -> datetime | None:
+        return None if time is None else datetime.fromisoformat(time)
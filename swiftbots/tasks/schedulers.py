@@ -1,57 +1,210 @@
 __all__ = [
+    'HeapScheduler',
     'SimpleScheduler',
+    'TaskSupervisor',
 ]
 
 import asyncio
 import datetime
+import heapq
+import itertools
+import logging
 from collections.abc import Callable, Iterable
+from contextlib import suppress
 from typing import Any
 
-from swiftbots.all_types import IPeriodTrigger, IScheduler
+from swiftbots.all_types import IJobStore, IScheduler, ITrigger
+from swiftbots.tasks.job_stores import JobState, MemoryJobStore
 from swiftbots.tasks.tasks import TaskInfo
 
+# The misfire policy 'run_all' doesn't make more runs than this number
+MAX_MISSED_RUNS = 1000
+# HeapScheduler doesn't run the same task more often, e.g. with a zero period
+MIN_RUN_INTERVAL = datetime.timedelta(seconds=0.01)
+
 
 def now() -> datetime.datetime:
     return datetime.datetime.now(tz=datetime.timezone.utc)
 
 
 class TaskContainer:
-    __last_called: datetime.datetime | None = None
-    __called_once = False
+    __slots__ = (
+        '__called_once',
+        '__last_called',
+        '__next_run_time',
+        'caller',
+        'misfire',
+        'name',
+        'overlap',
+        'queued',
+        'run_at_start',
+        'running_count',
+        'start_point',
+        'triggers',
+    )
 
     def __init__(self,
                  task_info: TaskInfo,
                  caller: Callable,
-                 start_point: datetime.datetime):
+                 start_point: datetime.datetime,
+                 state: JobState | None = None):
+        """:param state: the state saved by a job store before the app was restarted.
+        If it's given, `run_at_start` is ignored and the misfire policy of the task is applied.
+        The misfire policy is also applied to the first run of a task which is already due, e.g. `AtTrigger(now)`.
+        """
         self.caller: Callable[..., Any] = caller
         self.name = task_info.name
         self.triggers = task_info.triggers
         self.run_at_start = task_info.run_at_start
+        self.overlap = task_info.overlap
+        self.misfire = task_info.misfire
         self.start_point = start_point
+        self.running_count = 0
+        # Number of runs to make one by one after the current run is finished
+        self.queued = 0
+        self.__last_called: datetime.datetime | None = None
+        self.__called_once = False
+        if state is not None and state.last_run is not None:
+            self.__last_called = state.last_run
+            self.__called_once = True
+        self.__next_run_time = self.__calculate_next_run_time()
+        self.__apply_misfire_policy()
 
     def set_called(self) -> None:
         self.__last_called = now()
         self.__called_once = True
+        self.__next_run_time = self.__calculate_next_run_time()
 
     def should_run(self) -> bool:
-        if not self.__called_once and self.run_at_start:
-            return True
+        return self.__next_run_time is not None and now() >= self.__next_run_time
+
+    def next_run_time(self) -> datetime.datetime | None:
+        """When the task should run next time. None if it shouldn't run anymore"""
+        return self.__next_run_time
+
+    def get_state(self) -> JobState:
+        return JobState(last_run=self.__last_called, next_run=self.__next_run_time)
+
+    def __calculate_next_run_time(self) -> datetime.datetime | None:
+        if not self.__called_once:
+            if self.run_at_start:
+                return self.start_point
+            first_run_times = [trigger.first_fire_time(self.start_point) for trigger in self.triggers]
+            return min((run_time for run_time in first_run_times if run_time is not None), default=None)
 
         left_point = self.__last_called if self.__last_called else self.start_point
+        return self.__fire_time_after(left_point)
+
+    def __fire_time_after(self, point: datetime.datetime) -> datetime.datetime | None:
+        run_times = [trigger.next_fire_after(point) for trigger in self.triggers]
+        return min((run_time for run_time in run_times if run_time is not None), default=None)
+
+    def __apply_misfire_policy(self) -> None:
+        run_time = self.__next_run_time
+        if run_time is None or run_time > self.start_point:
+            return
+        if self.misfire == 'skip':
+            self.__next_run_time = self.__fire_time_after(self.start_point)
+        elif self.misfire == 'run_all':
+            missed_runs = 0
+            while run_time is not None and run_time <= self.start_point and missed_runs < MAX_MISSED_RUNS:
+                missed_runs += 1
+                run_time = self.__fire_time_after(run_time)
+            self.queued = missed_runs - 1
+
+
+class TaskSupervisor:
+    """Runs task callers as asyncio tasks, so a long task doesn't delay the others.
+    Limits the number of runs at once and applies the overlap policy of each task
+    when it must run again while the previous run is not finished yet.
+    An exception, which is not a subclass of `Exception`, raised by a task is raised again by `raise_failure`.
+    """
+
+    def __init__(self, max_concurrency: int | None = None, on_failure: Callable[[], None] | None = None):
+        """:param max_concurrency: how many tasks can run at once. Others wait for a free slot. None for no limit.
+        :param on_failure: called when a task fails, so a scheduler can wake up and call `raise_failure`.
+        """
+        assert max_concurrency is None or max_concurrency > 0, 'Max concurrency must be positive'
+        self.max_concurrency = max_concurrency
+        self.__on_failure = on_failure
+        self.__semaphore: asyncio.Semaphore | None = None
+        self.__running: set[asyncio.Task] = set()
+        self.__failure: BaseException | None = None
+        self.__stopping = False
+
+    @property
+    def in_flight(self) -> int:
+        """Number of runs which are started and not finished yet, including ones waiting for a free slot"""
+        return len(self.__running)
+
+    def launch(self, task: TaskContainer) -> None:
+        if task.running_count > 0:
+            if task.overlap == 'skip':
+                return
+            if task.overlap == 'queue':
+                task.queued = max(task.queued, 1)
+                return
+        self.__spawn(task)
+
+    def raise_failure(self) -> None:
+        if self.__failure is not None:
+            failure, self.__failure = self.__failure, None
+            raise failure
+
+    async def stop(self) -> None:
+        self.__stopping = True
+        for running in self.__running:
+            running.cancel()
+        await asyncio.gather(*self.__running, return_exceptions=True)
 
-        for trigger in self.triggers:
-            if isinstance(trigger, IPeriodTrigger) and now() - left_point >= trigger.get_period():
-                return True
-        return False
+    def __spawn(self, task: TaskContainer) -> None:
+        if self.__semaphore is None and self.max_concurrency is not None:
+            self.__semaphore = asyncio.Semaphore(self.max_concurrency)
+        task.running_count += 1
+        running = asyncio.create_task(self.__run(task))
+        self.__running.add(running)
+        running.add_done_callback(self.__running.discard)
+
+    async def __run(self, task: TaskContainer) -> None:
+        try:
+            if self.__semaphore is None:
+                await task.caller()
+            else:
+                async with self.__semaphore:
+                    await task.caller()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Task callers built for bots have the bot, so the error goes to its logger
+            bot = getattr(task.caller, 'bot', None)
+            if bot is not None:
+                await bot.logger.exception_async('Task %s of bot %s raised an unhandled `%s`:\n%s',
+                                                 task.name, bot.name, e.__class__.__name__, e)
+            else:
+                logging.exception('Task %s raised an unhandled exception', task.name)
+        except BaseException as e:
+            self.__failure = e
+            if self.__on_failure is not None:
+                self.__on_failure()
+        finally:
+            task.running_count -= 1
+            if task.queued > 0 and task.running_count == 0 and not self.__stopping:
+                task.queued -= 1
+                self.__spawn(task)
 
 
 class SimpleScheduler(IScheduler):
     __tasks: dict[str, TaskContainer]
     __ping_updates_period_seconds: float = 1.0
-    __supported_trigger_types = (IPeriodTrigger,)
+    __supported_trigger_types = (ITrigger,)
 
-    def __init__(self):
+    def __init__(self, max_concurrency: int | None = None, job_store: IJobStore | None = None):
+        """:param max_concurrency: how many tasks can run at once. None for no limit.
+        :param job_store: keeps run times of tasks between restarts. By default, they are kept in memory.
+        """
         self.__tasks = {}
+        self.__supervisor = TaskSupervisor(max_concurrency)
+        self.__job_store = job_store or MemoryJobStore()
 
     def add_task(self,
                  task_info: TaskInfo,
@@ -62,29 +215,176 @@ class SimpleScheduler(IScheduler):
             assert isinstance(trigger, self.__supported_trigger_types), \
                 f'Trigger type {trigger.__class__.__name__} is not supported'
 
-        self.__tasks[task_info.name] = TaskContainer(task_info, caller, now())
+        task = TaskContainer(task_info, caller, now(), self.__job_store.load(task_info.name))
+        if task.next_run_time() is None:
+            # The task won't run at all, e.g. its only moment is skipped by the misfire policy
+            self.__job_store.delete(task_info.name)
+            return
+        self.__tasks[task_info.name] = task
 
     def remove_task(self, name: str) -> None:
         assert name in self.__tasks, f'Task {name} has not been added'
         del self.__tasks[name]
 
+    def delete_task(self, name: str) -> None:
+        self.__tasks.pop(name, None)
+        self.__job_store.delete(name)
+
     def list_tasks(self) -> list[str]:
         return list(self.__tasks.keys())
 
+    def has_task(self, name: str) -> bool:
+        return name in self.__tasks
+
     async def start(self) -> None:
         await asyncio.sleep(0)
-        while True:
-            await self.__run_pending_tasks()
-            await asyncio.sleep(self.__ping_updates_period_seconds)
+        try:
+            while True:
+                self.__run_pending_tasks()
+                await self.__job_store.flush_async()
+                await asyncio.sleep(self.__ping_updates_period_seconds)
+                self.__supervisor.raise_failure()
+        finally:
+            await self.__supervisor.stop()
+            await self.__job_store.close_async()
 
     def __find_tasks_to_run(self) -> Iterable[TaskContainer]:
         return filter(lambda task: task.should_run(), self.__tasks.values())
 
-    async def __run_pending_tasks(self) -> None:
-        for task in self.__find_tasks_to_run():
-            # TODO(ondache): a temporary solution. Had better launch with `create_task`,
-            #  but then class must supervise these tasks
-            # 003
+    def __run_pending_tasks(self) -> None:
+        for task in list(self.__find_tasks_to_run()):
+            task.set_called()
+            if task.next_run_time() is None:
+                # The task won't run anymore, so its state isn't kept either
+                del self.__tasks[task.name]
+                self.__job_store.delete(task.name)
+            else:
+                self.__job_store.save(task.name, task.get_state())
+            self.__supervisor.launch(task)
+
+
+class HeapScheduler(IScheduler):
+    """Keeps tasks in a min-heap ordered by the next run time and sleeps exactly until the earliest one.
+    Adding or removing tasks wakes the scheduler up to recalculate the time to sleep.
+    Unlike `SimpleScheduler`, it doesn't check all the tasks every second,
+    so it suits for thousands of tasks and runs them without a delay.
+    The same task isn't run more often than every `MIN_RUN_INTERVAL`, even if its period is zero.
+    """
+    __tasks: dict[str, TaskContainer]
+    __heap: list[tuple[datetime.datetime, int, TaskContainer]]
+    __supported_trigger_types = (ITrigger,)
+
+    def __init__(self, max_concurrency: int | None = None, job_store: IJobStore | None = None):
+        """:param max_concurrency: how many tasks can run at once. None for no limit.
+        :param job_store: keeps run times of tasks between restarts. By default, they are kept in memory.
+        """
+        self.__tasks = {}
+        self.__heap = []
+        # Removed tasks stay in the heap until they are popped or the heap is compacted
+        self.__removed_count = 0
+        self.__supervisor = TaskSupervisor(max_concurrency, on_failure=self.__wake_up)
+        self.__job_store = job_store or MemoryJobStore()
+        # Breaks ties between tasks with the same run time, so containers are never compared
+        self.__counter = itertools.count()
+        self.__wakeup: asyncio.Event | None = None
+
+    def add_task(self,
+                 task_info: TaskInfo,
+                 caller: Callable[[], Any],
+                 ) -> None:
+        assert task_info.name not in self.__tasks, f'Task {task_info.name} has already been added'
+        for trigger in task_info.triggers:
+            assert isinstance(trigger, self.__supported_trigger_types), \
+                f'Trigger type {trigger.__class__.__name__} is not supported'
+
+        task = TaskContainer(task_info, caller, now(), self.__job_store.load(task_info.name))
+        if task.next_run_time() is None:
+            # The task won't run at all, e.g. its only moment is skipped by the misfire policy
+            self.__job_store.delete(task_info.name)
+            return
+        self.__tasks[task_info.name] = task
+        self.__push(task)
+        self.__wake_up()
+
+    def remove_task(self, name: str) -> None:
+        assert name in self.__tasks, f'Task {name} has not been added'
+        # The task stays in the heap, but it's skipped when its time comes
+        del self.__tasks[name]
+        self.__removed_count += 1
+        if self.__removed_count * 2 > len(self.__heap):
+            self.__compact()
+        self.__wake_up()
+
+    def delete_task(self, name: str) -> None:
+        if name in self.__tasks:
+            self.remove_task(name)
+        self.__job_store.delete(name)
+
+    def list_tasks(self) -> list[str]:
+        return list(self.__tasks.keys())
+
+    def has_task(self, name: str) -> bool:
+        return name in self.__tasks
+
+    async def start(self) -> None:
+        self.__wakeup = asyncio.Event()
+        try:
+            while True:
+                self.__run_pending_tasks()
+                await self.__job_store.flush_async()
+                self.__wakeup.clear()
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self.__wakeup.wait(), timeout=self.__seconds_to_sleep())
+                self.__supervisor.raise_failure()
+        finally:
+            await self.__supervisor.stop()
+            await self.__job_store.close_async()
+
+    def __push(self, task: TaskContainer, not_before: datetime.datetime | None = None) -> None:
+        run_time = task.next_run_time()
+        if run_time is not None:
+            if not_before is not None and run_time < not_before:
+                run_time = not_before
+            heapq.heappush(self.__heap, (run_time, next(self.__counter), task))
+
+    def __wake_up(self) -> None:
+        if self.__wakeup is not None:
+            self.__wakeup.set()
+
+    def __is_removed(self, task: TaskContainer) -> bool:
+        return self.__tasks.get(task.name) is not task
+
+    def __compact(self) -> None:
+        """Drop removed tasks from the heap, so far-future tasks which are cancelled don't pile up"""
+        self.__heap = [entry for entry in self.__heap if not self.__is_removed(entry[2])]
+        heapq.heapify(self.__heap)
+        self.__removed_count = 0
+
+    def __pop_removed(self) -> None:
+        heapq.heappop(self.__heap)
+        self.__removed_count = max(0, self.__removed_count - 1)
+
+    def __seconds_to_sleep(self) -> float | None:
+        while self.__heap and self.__is_removed(self.__heap[0][2]):
+            self.__pop_removed()
+        if not self.__heap:
+            return None
+        return max(0., (self.__heap[0][0] - now()).total_seconds())
+
+    def __run_pending_tasks(self) -> None:
+        current_time = now()
+        while self.__heap and self.__heap[0][0] <= current_time:
+            task = self.__heap[0][2]
+            if self.__is_removed(task):
+                self.__pop_removed()
+                continue
+            heapq.heappop(self.__heap)
             task.set_called()
-            await task.caller()
-            await asyncio.sleep(0)
+            if task.next_run_time() is None:
+                # The task won't run anymore, so its state isn't kept either
+                del self.__tasks[task.name]
+                self.__job_store.delete(task.name)
+            else:
+                self.__job_store.save(task.name, task.get_state())
+            self.__supervisor.launch(task)
+            self.__push(task, not_before=current_time + MIN_RUN_INTERVAL)
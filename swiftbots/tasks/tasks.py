@@ -1,12 +1,21 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Any
 
 from swiftbots.all_types import ITrigger
-from swiftbots.types import DecoratedCallable
+from swiftbots.functions import DependencyCache
+from swiftbots.types import DecoratedCallable, MisfirePolicy, TaskOverlapPolicy
 
 
-@dataclass
+@dataclass(slots=True)
 class TaskInfo:
     name: str
     func: DecoratedCallable
     triggers: list[ITrigger]
     run_at_start: bool
+    overlap: TaskOverlapPolicy = 'skip'
+    timeout: float | None = None
+    misfire: MisfirePolicy = 'run_once'
+    # Values given to the task as dependencies, e.g. by `Bot.schedule`
+    data: dict[str, Any] | None = None
+    # Results of the task scoped dependencies. Created when the task needs them
+    dependency_cache: DependencyCache | None = field(default=None, repr=False, compare=False)
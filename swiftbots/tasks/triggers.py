@@ -1,13 +1,36 @@
-from datetime import timedelta
+import random
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone, tzinfo
 
-from swiftbots.all_types import IPeriodTrigger
+from swiftbots.all_types import IPeriodTrigger, ITrigger
+
+CRON_ALIASES = {
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+    '@monthly': '0 0 1 * *',
+    '@weekly': '0 0 * * 0',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@hourly': '0 * * * *',
+}
+# (name, min value, max value) of the cron fields in their order
+CRON_FIELDS = (
+    ('minute', 0, 59),
+    ('hour', 0, 23),
+    ('day of month', 1, 31),
+    ('month', 1, 12),
+    ('day of week', 0, 7),
+)
+DECEMBER = 12
+# A cron expression matching no date (e.g. February 30) is detected after this number of years
+CRON_SEARCH_YEARS = 8
 
 
 class PeriodTrigger(IPeriodTrigger):
     def __init__(self,
                  hours: float = 0,
                  minutes: float = 0,
-                 seconds: int = 0,
+                 seconds: float = 0,
                  ):
         if hours < 0 or minutes < 0 or seconds < 0:
             msg = 'Time for scheduler must be positive or zero'
@@ -16,3 +39,145 @@ class PeriodTrigger(IPeriodTrigger):
 
     def get_period(self) -> timedelta:
         return self.__period
+
+
+class JitteredPeriodTrigger(PeriodTrigger):
+    """Fires periodically, but every run is delayed by a random number of seconds from 0 to `jitter`.
+    Spreads the runs of many similar tasks, so they don't hit the same service at the same moment.
+    """
+
+    def __init__(self,
+                 hours: float = 0,
+                 minutes: float = 0,
+                 seconds: float = 0,
+                 jitter: float = 0,
+                 ):
+        super().__init__(hours=hours, minutes=minutes, seconds=seconds)
+        if jitter < 0:
+            msg = 'Jitter must be positive or zero'
+            raise ValueError(msg)
+        self.jitter = jitter
+
+    def next_fire_after(self, t: datetime) -> datetime | None:
+        return t + self.get_period() + timedelta(seconds=random.uniform(0, self.jitter))
+
+
+class AtTrigger(ITrigger):
+    """Fires once at the moment. A naive datetime is considered to be in UTC"""
+
+    def __init__(self, at: datetime):
+        self.at = at if at.tzinfo is not None else at.replace(tzinfo=timezone.utc)
+
+    def next_fire_after(self, t: datetime) -> datetime | None:
+        return self.at if self.at > t else None
+
+    def first_fire_time(self, start: datetime) -> datetime | None:
+        # The moment is fixed, so it doesn't depend on when the task is scheduled
+        del start
+        return self.at
+
+
+class CronTrigger(ITrigger):
+    """Fires at wall-clock moments described by a cron expression:
+    `minute hour day-of-month month day-of-week`, e.g. `0 * * * *` is the top of every hour.
+    Fields support `*`, values, ranges `1-5`, steps `*/15` and `1-30/2`, and lists `1,15,30`.
+    Sunday is either 0 or 7. Aliases `@hourly`, `@daily`, `@weekly`, `@monthly` and `@yearly` are supported too.
+    As in cron, when both days of month and days of week are restricted, a day matching either of them fits.
+    """
+
+    def __init__(self, expression: str, tz: tzinfo = timezone.utc):
+        """:param tz: the time zone of the expression. UTC by default.
+        """
+        self.expression = expression
+        self.tz = tz
+        fields = CRON_ALIASES.get(expression.strip(), expression).split()
+        if len(fields) != len(CRON_FIELDS):
+            msg = f'Cron expression must have {len(CRON_FIELDS)} fields: {expression}'
+            raise ValueError(msg)
+        minutes, hours, days, months, weekdays = (
+            self.__parse_field(field, min_value, max_value)
+            for field, (_, min_value, max_value) in zip(fields, CRON_FIELDS, strict=True)
+        )
+        self.__minutes = sorted(minutes)
+        self.__hours = sorted(hours)
+        self.__days = days
+        self.__months = months
+        self.__weekdays = {weekday % 7 for weekday in weekdays}
+        self.__any_day = fields[2].startswith('*')
+        self.__any_weekday = fields[4].startswith('*')
+
+    def next_fire_after(self, t: datetime) -> datetime | None:
+        local = t.astimezone(self.tz).replace(tzinfo=None, second=0, microsecond=0)
+        while True:
+            next_local = self.__next_local_time(local + timedelta(minutes=1))
+            if next_local is None:
+                return None
+            local = next_local
+            # When clocks go back, the wall-clock time happens twice, and the second one may be still ahead.
+            # When clocks go forward, the skipped wall-clock time fires as soon as the clocks are moved
+            for fold in (0, 1):
+                fire_time = local.replace(tzinfo=self.tz, fold=fold).astimezone(timezone.utc)
+                if fire_time > t:
+                    return fire_time
+
+    def __next_local_time(self, local: datetime) -> datetime | None:
+        """The closest wall-clock time from `local` matching the expression.
+        Whole months, days and hours which don't fit are skipped.
+        """
+        last_year = local.year + CRON_SEARCH_YEARS
+        while local.year <= last_year:
+            if local.month not in self.__months:
+                local = self.__next_month(local)
+                continue
+            if not self.__day_fits(local):
+                local = local.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            hour_index = bisect_left(self.__hours, local.hour)
+            if hour_index == len(self.__hours):
+                local = local.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if self.__hours[hour_index] != local.hour:
+                local = local.replace(hour=self.__hours[hour_index], minute=0)
+            minute_index = bisect_left(self.__minutes, local.minute)
+            if minute_index == len(self.__minutes):
+                local = local.replace(minute=0) + timedelta(hours=1)
+                continue
+            return local.replace(minute=self.__minutes[minute_index])
+        return None
+
+    def __day_fits(self, local: datetime) -> bool:
+        day_fits = local.day in self.__days
+        # `isoweekday` is 7 for Sunday, cron uses 0
+        weekday_fits = local.isoweekday() % 7 in self.__weekdays
+        if self.__any_day or self.__any_weekday:
+            return day_fits and weekday_fits
+        return day_fits or weekday_fits
+
+    @staticmethod
+    def __next_month(local: datetime) -> datetime:
+        if local.month == DECEMBER:
+            return local.replace(year=local.year + 1, month=1, day=1, hour=0, minute=0)
+        return local.replace(month=local.month + 1, day=1, hour=0, minute=0)
+
+    @staticmethod
+    def __parse_field(field: str, min_value: int, max_value: int) -> set[int]:
+        msg = f'Invalid cron field "{field}". Values must be from {min_value} to {max_value}'
+        values: set[int] = set()
+        for part in field.split(','):
+            value_range, _, step = part.partition('/')
+            try:
+                if value_range == '*':
+                    start, end = min_value, max_value
+                elif '-' in value_range:
+                    start, end = map(int, value_range.split('-', 1))
+                else:
+                    start = end = int(value_range)
+                    if step:
+                        end = max_value
+                step_value = int(step) if step else 1
+            except ValueError:
+                raise ValueError(msg) from None
+            if not min_value <= start <= end <= max_value or step_value < 1:
+                raise ValueError(msg)
+            values.update(range(start, end + 1, step_value))
+        return values
@@ -1,13 +1,24 @@
 from collections.abc import AsyncGenerator, Callable, Coroutine
-from typing import TYPE_CHECKING, Any, TypeVar
+from typing import TYPE_CHECKING, Any, Literal, TypeVar
 
 if TYPE_CHECKING:
     from swiftbots.bots import Bot
 
 
+DependencyScope = Literal['request', 'task', 'bot', 'app']
+DEPENDENCY_SCOPES = ('request', 'task', 'bot', 'app')
+
+TaskOverlapPolicy = Literal['skip', 'queue', 'parallel']
+TASK_OVERLAP_POLICIES = ('skip', 'queue', 'parallel')
+
+MisfirePolicy = Literal['run_once', 'run_all', 'skip']
+MISFIRE_POLICIES = ('run_once', 'run_all', 'skip')
+
+
 class DependencyContainer:
-    def __init__(self, dependency: Callable[..., Any]):
+    def __init__(self, dependency: Callable[..., Any], scope: DependencyScope = 'request'):
         self.dependency = dependency
+        self.scope = scope
 
 
 DecoratedCallable = TypeVar("DecoratedCallable", bound=Callable[..., Any])
@@ -15,3 +26,4 @@ AsyncSenderFunction = TypeVar("AsyncSenderFunction", bound=Callable[[str, str |
 AsyncListenerFunction = TypeVar("AsyncListenerFunction", bound=AsyncGenerator[Any, dict])
 CallNextMiddleware = Callable[[Any], Coroutine]
 Middleware = Callable[['Bot', Any, CallNextMiddleware], Coroutine]
+UpdateFilter = Callable[['Bot', Any], bool]
@@ -1,5 +1,9 @@
 import time
 from contextvars import ContextVar
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
 
 MAXIMUM_ERROR_RATE = 5
 CRITICAL_ERROR_STARTUP_THRESHOLD_SECONDS = 300
@@ -36,3 +40,27 @@ class ErrorRateMonitor:
 
 
 error_rate_monitors: ContextVar[ErrorRateMonitor]  = ContextVar('error_rate_monitors')
+
+
+class UpdateContext:
+    """What is known about the update being handled. Loggers attach it to log records"""
+
+    __slots__ = ('bot_name', 'handler', 'sender', 'started', 'update_id')
+
+    def __init__(self, bot_name: str, output: dict):
+        self.bot_name = bot_name
+        update_id = output.get('update_id')
+        if update_id is None and isinstance(output.get('raw_update'), dict):
+            update_id = output['raw_update'].get('update_id')
+        self.update_id = update_id
+        self.sender = output.get('sender')
+        self.handler: Callable | None = None
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the update started to be handled"""
+        return time.perf_counter() - self.started
+
+
+update_contexts: ContextVar[UpdateContext | None] = ContextVar('update_contexts', default=None)
@@ -0,0 +1,168 @@
+__all__ = [
+    'WebhookServer',
+]
+
+import asyncio
+import hmac
+import json
+import ssl
+from dataclasses import dataclass
+from http import HTTPStatus
+
+SECRET_TOKEN_HEADER = 'x-telegram-bot-api-secret-token'
+MAX_HEADERS_SIZE = 16 * 1024
+
+
+@dataclass
+class WebhookRoute:
+    secret_token: str | None
+    queue: asyncio.Queue
+
+
+class WebhookServer:
+    """A lightweight HTTP server, receiving webhook updates for many Telegram bots on one port.
+    Bots are routed by the request path. Every update is put into the queue of its bot
+    and the response is sent right after, so the update is processed in the background.
+    When the queue of the bot is full, the response is delayed until there is space in the queue.
+    The server is started when the first bot is started and is stopped when the last bot is closed.
+    """
+
+    def __init__(self,
+                 host: str = '0.0.0.0',
+                 port: int = 8443,
+                 ssl_context: ssl.SSLContext | None = None,
+                 max_queue_size: int = 1000,
+                 max_body_size: int = 1024 * 1024,
+                 keep_alive_timeout: float = 60.,
+                 ):
+        """:param ssl_context: Telegram sends webhooks only with HTTPS. Pass None if TLS is terminated by a proxy.
+        :param max_queue_size: how many unprocessed updates each bot can have.
+        :param max_body_size: requests with bigger bodies are refused.
+        :param keep_alive_timeout: idle connections are closed after this number of seconds.
+        """
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self.max_queue_size = max_queue_size
+        self.max_body_size = max_body_size
+        self.keep_alive_timeout = keep_alive_timeout
+        self.__routes: dict[str, WebhookRoute] = {}
+        self.__server: asyncio.Server | None = None
+        self.__connections: set[asyncio.StreamWriter] = set()
+        self.__handlers: set[asyncio.Task] = set()
+
+    @property
+    def is_serving(self) -> bool:
+        return self.__server is not None and self.__server.is_serving()
+
+    @property
+    def bound_port(self) -> int | None:
+        """The actual port of the server. Useful if the server was started with the port 0"""
+        if self.__server is None or not self.__server.sockets:
+            return None
+        return self.__server.sockets[0].getsockname()[1]
+
+    def add_route(self, path: str, secret_token: str | None = None) -> asyncio.Queue:
+        """Register a bot at the path. Updates sent to the path will appear in the returned queue.
+        :param secret_token: if set, requests without the same `X-Telegram-Bot-Api-Secret-Token` header are refused.
+        """
+        assert path.startswith('/'), 'Webhook path must start with "/"'
+        assert path not in self.__routes, f'Webhook path {path} is already used'
+        queue: asyncio.Queue = asyncio.Queue(self.max_queue_size)
+        self.__routes[path] = WebhookRoute(secret_token=secret_token, queue=queue)
+        return queue
+
+    def remove_route(self, path: str) -> None:
+        self.__routes.pop(path, None)
+
+    def list_routes(self) -> list[str]:
+        return list(self.__routes.keys())
+
+    async def start(self) -> None:
+        if self.is_serving:
+            return
+        self.__server = await asyncio.start_server(
+            self.__handle_connection,
+            host=self.host,
+            port=self.port,
+            ssl=self.ssl_context,
+            limit=MAX_HEADERS_SIZE,
+        )
+
+    async def stop(self) -> None:
+        if self.__server is None:
+            return
+        self.__server.close()
+        # Idle keep-alive connections would delay the closing,
+        # and requests waiting for space in a full queue would never finish
+        for writer in self.__connections:
+            writer.close()
+        for handler in self.__handlers:
+            handler.cancel()
+        if self.__handlers:
+            await asyncio.wait(self.__handlers)
+        await self.__server.wait_closed()
+        self.__server = None
+
+    async def __handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        handler = asyncio.current_task()
+        if handler is not None:
+            self.__handlers.add(handler)
+        self.__connections.add(writer)
+        try:
+            while True:
+                head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.keep_alive_timeout)
+                request_line, *header_lines = head.decode('latin-1').rstrip('\r\n').split('\r\n')
+                method, target, _ = request_line.split(' ', 2)
+                headers = {}
+                for line in header_lines:
+                    key, _, value = line.partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                keep_alive = headers.get('connection', '').lower() != 'close'
+
+                if 'transfer-encoding' in headers:
+                    status = HTTPStatus.LENGTH_REQUIRED
+                    keep_alive = False
+                elif int(headers.get('content-length', 0)) > self.max_body_size:
+                    status = HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(int(headers.get('content-length', 0)))
+                    status = await self.__handle_request(method, target, headers, body)
+
+                writer.write(
+                    f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+                    f'Content-Length: 0\r\n'
+                    f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode('latin-1'),
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError,
+                ConnectionError, ValueError):
+            # The client has closed the connection, it's idle for too long, or the request is malformed
+            pass
+        finally:
+            self.__connections.discard(writer)
+            if handler is not None:
+                self.__handlers.discard(handler)
+            writer.close()
+
+    async def __handle_request(self, method: str, target: str, headers: dict[str, str], body: bytes) -> HTTPStatus:
+        if method != 'POST':
+            return HTTPStatus.METHOD_NOT_ALLOWED
+        route = self.__routes.get(target.partition('?')[0])
+        if route is None:
+            return HTTPStatus.NOT_FOUND
+        if route.secret_token is not None and not hmac.compare_digest(
+                headers.get(SECRET_TOKEN_HEADER, '').encode(), route.secret_token.encode(),
+        ):
+            return HTTPStatus.FORBIDDEN
+        try:
+            update = json.loads(body)
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST
+        if not isinstance(update, dict):
+            return HTTPStatus.BAD_REQUEST
+        await route.queue.put(update)
+        return HTTPStatus.OK
@@ -3,6 +3,8 @@ import asyncio
 import pytest
 
 from swiftbots import ChatBot, SwiftBots
+from swiftbots.filters import BannedSendersFilter, DuplicateUpdatesFilter, UpdateTypesFilter
+from swiftbots.middlewares import chain_middlewares, compose_middlewares
 from tests.common import close_test_app, run_raisable, extract_exception_handler_middlewares
 
 global_dict = {}
@@ -83,3 +85,147 @@ class TestChatBot:
         global global_dict
         assert global_dict['answer1'] == 'Not matching command from default handler'
         assert global_dict['user1'] == 'Pferd'
+
+    @pytest.mark.timeout(3)
+    def test_fused_pipeline_matches_chained(self):
+        messages = ['Command 1 first', 'Command 2 fails', 'Unknown', 'Command 1 last']
+        replies = []
+        seen_by_middleware = []
+        bot = ChatBot()
+
+        @bot.listener()
+        async def listen_async():
+            for message in messages:
+                yield {'message': message, 'sender': 'Katze'}
+
+        @bot.sender()
+        async def send_async(message, user):
+            replies.append(message)
+
+        @bot.message_handler(commands=['command 1'])
+        async def command_handler_1(message: str, chat: bot.Chat):
+            await chat.reply_async(message)
+
+        @bot.message_handler(commands=['command 2'])
+        async def failing_handler():
+            raise ValueError('Expected')
+
+        @bot.middleware()
+        async def remember_command(_, deps: dict, call_next):
+            seen_by_middleware.append(deps['command'])
+            return await call_next(deps)
+
+        SwiftBots().add_bots([bot])
+
+        async def handle_messages(entry) -> None:
+            generator = bot.listener_func()
+            for _ in messages:
+                generator = await entry(generator)
+
+        fused = compose_middlewares(bot, bot._middlewares)
+        assert fused.__name__ == 'listen'
+        results = []
+        for entry in (chain_middlewares(bot, bot._middlewares), fused):
+            replies.clear()
+            seen_by_middleware.clear()
+            asyncio.run(handle_messages(entry))
+            results.append((list(replies), list(seen_by_middleware)))
+
+        assert results[0] == results[1]
+        assert results[0][0][0] == 'first'
+        assert results[0][0][-1] == 'last'
+        assert len(results[0][0]) == 3
+        assert results[0][1] == ['command 1', 'command 2', 'command 1']
+
+    @pytest.mark.timeout(3)
+    def test_update_filters(self):
+        updates = [
+            {'update_id': 1, 'message': 'first', 'sender': 'Katze'},
+            {'update_id': 1, 'message': 'duplicate', 'sender': 'Katze'},
+            {'update_id': 2, 'message': 'banned', 'sender': 'SPAMMER'},
+            {'update_id': 3, 'poll': 'unsupported', 'sender': 'Katze'},
+            {'update_id': 4, 'message': 'last', 'sender': 'Katze'},
+        ]
+        replies = []
+        bot = ChatBot()
+        bot.update_filter()(UpdateTypesFilter(['message']))
+        bot.update_filter()(BannedSendersFilter(['spammer']))
+        bot.update_filter()(DuplicateUpdatesFilter(capacity=2))
+
+        @bot.listener()
+        async def listen_async():
+            for update in updates:
+                yield update
+
+        @bot.sender()
+        async def send_async(message, user):
+            replies.append(message)
+
+        @bot.default_handler()
+        async def default_handler(message: str, chat: bot.Chat):
+            await chat.reply_async(message)
+
+        SwiftBots().add_bots([bot])
+
+        async def handle_updates(entry) -> None:
+            generator = bot.listener_func()
+            for _ in updates:
+                generator = await entry(generator)
+
+        for entry in (chain_middlewares(bot, bot._middlewares), compose_middlewares(bot, bot._middlewares)):
+            replies.clear()
+            bot._update_filters[-1] = DuplicateUpdatesFilter(capacity=2)
+            asyncio.run(handle_updates(entry))
+            assert replies == ['first', 'last']
+
+    @pytest.mark.timeout(3)
+    def test_chat_is_made_lazily(self):
+        messages = ['count', 'echo hello', 'Unknown', 'forbidden']
+        replies = []
+        made_chats = []
+        bot = ChatBot()
+
+        @bot.listener()
+        async def listen_async():
+            for message in messages:
+                yield {'message': message, 'sender': 'Katze'}
+
+        @bot.sender()
+        async def send_async(message, user):
+            replies.append(message)
+
+        @bot.message_handler(commands=['count'])
+        async def count(message: str):
+            pass
+
+        @bot.message_handler(commands=['echo'])
+        async def echo(message: str, chat: bot.Chat):
+            assert not hasattr(chat, '__dict__')
+            await chat.reply_async(message)
+
+        @bot.message_handler(commands=['forbidden'], blacklist_users=['katze'])
+        async def forbidden():
+            pass
+
+        make_chat = bot._make_chat
+
+        def make_chat_counted(deps):
+            chat = make_chat(deps)
+            made_chats.append(chat)
+            return chat
+
+        bot._make_chat = make_chat_counted
+        SwiftBots().add_bots([bot])
+
+        async def handle_messages(entry) -> None:
+            generator = bot.listener_func()
+            for _ in messages:
+                generator = await entry(generator)
+
+        for entry in (chain_middlewares(bot, bot._middlewares), compose_middlewares(bot, bot._middlewares)):
+            replies.clear()
+            made_chats.clear()
+            asyncio.run(handle_messages(entry))
+            assert replies == ['hello', 'Unknown command', 'Access forbidden']
+            # No chat is made for the handler which doesn't ask for it
+            assert [chat.message for chat in made_chats] == ['echo hello', 'Unknown', 'forbidden']
@@ -1,10 +1,19 @@
+import asyncio
+
 import pytest
 
+from swiftbots import ChatBot, SwiftBots
+from swiftbots.access_lists import AccessList
+from swiftbots.c_ext import search_py, search_trie
 from swiftbots.message_handlers import (
+    ChatMessageHandler,
     CompiledChatCommand,
     Trie,
+    build_command_index,
+    compile_chat_commands,
     compile_command_as_regex,
     insert_trie,
+    is_user_allowed,
     search_best_command_match,
 )
 
@@ -41,3 +50,127 @@ class TestChatHandlers:
         assert try_on(trie, "cherry apple") is None
         assert try_on(trie, "pple") is None
         assert try_on(trie, "苹果") == 4
+
+    @pytest.mark.timeout(3)
+    def test_command_index(self):
+        def command(command_name: str, result: int) -> CompiledChatCommand:
+            return CompiledChatCommand(command_name, lambda: result, compile_command_as_regex(command_name), [], [])
+
+        index = build_command_index([
+            command("apple", 1),
+            command("cranberry", 2),
+            command("apple cranberry", 3),
+            command("苹果", 4),
+            command("a.b", 5),
+        ])
+
+        def try_index(word: str) -> tuple[int | None, str]:
+            found, arguments = index.match(word)
+            return (found.method() if found else None), arguments
+
+        assert try_index("apple") == (1, '')
+        assert try_index("APPLE") == (1, '')
+        assert try_index("cranberry") == (2, '')
+        assert try_index("apple cranberry") == (3, '')
+        assert try_index("apple  cranberry jam") == (1, 'cranberry jam')
+        assert try_index("apple cranberry jam") == (3, 'jam')
+        assert try_index("apple pear") == (1, 'pear')
+        assert try_index("applecherry") == (None, '')
+        assert try_index("apple cranberrycherry") == (1, 'cranberrycherry')
+        assert try_index("a") == (None, '')
+        assert try_index("cherry apple") == (None, '')
+        assert try_index("苹果 2\n3") == (4, '2\n3')
+        assert try_index("a.b") == (5, '')
+        assert try_index("axb") == (None, '')
+
+        with_default = build_command_index([command("apple", 1), command("", 0)])
+        found, arguments = with_default.match(" pear")
+        assert (found.method(), arguments) == (0, ' pear')
+
+    @pytest.mark.timeout(3)
+    def test_commands_are_compiled_without_patterns(self):
+        commands = compile_chat_commands([ChatMessageHandler(["apple", "apple cranberry"], lambda: None, None, None)])
+        assert [command.pattern for command in commands] == [None, None]
+        assert build_command_index(commands).match("apple cranberry jam")[1] == 'jam'
+
+        # The legacy search compiles the pattern of the matched command on demand
+        trie = {}
+        for command in commands:
+            insert_trie(trie, command.command_name, command)
+        command, match = search_best_command_match(trie, "apple pear")
+        assert command is commands[0]
+        assert match.group(1) == 'pear'
+        assert commands[1].pattern is None
+
+    @pytest.mark.timeout(3)
+    def test_pure_python_search_trie(self):
+        trie = {}
+        for name in ("apple", "apple cranberry", "苹果"):
+            insert_trie(trie, name, CompiledChatCommand(name, lambda: None, compile_command_as_regex(name), [], []))
+
+        for word in ("apple", "apple cranberry", "apple pear", "applecherry", "a", "pple", "苹果", ""):
+            assert search_py.search_trie(trie, word) is search_trie(trie, word)
+
+    @pytest.mark.timeout(3)
+    def test_user_access(self):
+        whitelist = AccessList(['Admin', 123])
+        blacklist = AccessList(['123', 'spammer'])
+
+        assert is_user_allowed('admin', whitelist, None)
+        assert is_user_allowed('123', whitelist, None)
+        assert not is_user_allowed('guest', whitelist, None)
+        assert is_user_allowed('guest', None, blacklist)
+        assert not is_user_allowed('SPAMMER', None, blacklist)
+        # The blacklist has a privilege, but the whitelist is still checked
+        assert not is_user_allowed(123, whitelist, blacklist)
+        assert not is_user_allowed('guest', whitelist, blacklist)
+        assert is_user_allowed('admin', whitelist, blacklist)
+
+    @pytest.mark.timeout(3)
+    def test_access_list_sources(self, tmp_path):
+        path = tmp_path / 'banned.txt'
+        path.write_text('# Banned users\n1001\n\nSpammer\n', encoding='utf-8')
+        file_list = AccessList(['static'], source=path, refresh_interval=60)
+        sync_list = AccessList(source=lambda: range(1000, 1010))
+        banned_by_async = []
+
+        async def load_banned_async():
+            return banned_by_async
+
+        async_list = AccessList(source=load_banned_async, refresh_interval=60)
+
+        bot = ChatBot()
+        bot.listener()(lambda: None)
+
+        @bot.message_handler(commands=['a'], blacklist_users=file_list)
+        async def a():
+            pass
+
+        @bot.message_handler(commands=['b'], blacklist_users=file_list, whitelist_users=sync_list)
+        async def b():
+            pass
+
+        @bot.default_handler(blacklist_users=async_list)
+        async def default():
+            pass
+
+        SwiftBots().add_bots([bot])
+
+        assert file_list.is_loaded and sync_list.is_loaded and not async_list.is_loaded
+        assert {'1001', 'spammer', 'static'} == file_list.users
+        assert 1005 in sync_list
+        assert len(bot._access_lists) == 3
+        assert len(bot._scheduled_tasks) == 2
+        # The refresh tasks keep their keys across restarts, so their job states aren't orphaned in a job store
+        file_position, async_position = bot._access_lists.index(file_list), bot._access_lists.index(async_list)
+        assert set(bot._scheduled_tasks) == {f'{bot.name}-refresh-access-list-{file_position}',
+                                             f'{bot.name}-refresh-access-list-{async_position}'}
+        blacklists = {command.command_name: command.blacklist_users for command in bot._compiled_chat_commands}
+        assert blacklists['a'] is blacklists['b'] is file_list
+
+        path.write_text('1002\n', encoding='utf-8')
+        banned_by_async.append('Late')
+        asyncio.run(bot.before_start_async())
+        asyncio.run(file_list.load_async())
+        assert file_list.users == {'1002', 'static'}
+        assert 'late' in async_list
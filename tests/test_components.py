@@ -1,11 +1,26 @@
 import asyncio
-from datetime import datetime, timedelta
+import functools
+import gc
+import time
+import tracemalloc
+import weakref
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
 
 import pytest
 
-from swiftbots import PeriodTrigger, StubBot, depends
-from swiftbots.functions import resolve_function_args
-from swiftbots.tasks import SimpleScheduler
+from swiftbots import AtTrigger, Bot, CronTrigger, JitteredPeriodTrigger, PeriodTrigger, StubBot, SwiftBots, depends
+from swiftbots.bots import build_scheduler, build_task_caller, disable_tasks
+from swiftbots.functions import (
+    UpdateDependencies,
+    app_dependency_cache,
+    call_with_resolved_args_async,
+    decompose_bot_as_dependencies,
+    get_function_plan,
+    resolve_function_args,
+)
+from swiftbots.middlewares import compose_middlewares
+from swiftbots.tasks import HeapScheduler, JobState, MemoryJobStore, SimpleScheduler, SQLiteJobStore
 
 
 class TestComponents:
@@ -79,4 +94,596 @@ class TestComponents:
             ('1', 4)
         )
 
+    @pytest.mark.timeout(3)
+    def test_dependency_plan_is_cached(self):
+        def dep(s: int):
+            return s * 2
+
+        def caller(c: int, d: int = depends(dep)):
+            return c + d
+
+        plan = get_function_plan(caller)
+        assert get_function_plan(caller) is plan
+        assert [(name, sub_plan is not None) for name, sub_plan, _, _ in plan.parameters] == [('c', False), ('d', True)]
+        assert plan.parameters[1][1] is get_function_plan(dep)
+        assert resolve_function_args(caller, {'c': 1, 's': 3}) == {'c': 1, 'd': 6}
+        with pytest.raises(AssertionError):
+            resolve_function_args(caller, {'c': 1})
+
+        @functools.wraps(caller)
+        def traced(c: int):
+            return -caller(c, 0)
+
+        assert get_function_plan(traced).function is traced
+        assert get_function_plan(caller) is plan
+
+        class Handler:
+            def handle(self, c: int, d: int = depends(dep)):
+                return c + d
+
+        handler = Handler()
+        method_plan = get_function_plan(handler.handle)
+        assert method_plan.function == handler.handle and [name for name, *_ in method_plan.parameters] == ['c', 'd']
+        assert resolve_function_args(handler.handle, {'c': 1, 's': 3}) == {'c': 1, 'd': 6}
+
+    @pytest.mark.timeout(3)
+    def test_dependency_plans_are_freed(self):
+        def make_task(n: int):
+            async def task(c: int):
+                return c + n
+            return task
+
+        tasks = [make_task(n) for n in range(100)]
+        for task in tasks:
+            get_function_plan(task)
+        # The functions aren't kept alive by their cached plans
+        functions = weakref.WeakSet(tasks)
+        del task
+        tasks.clear()
+        gc.collect()
+        assert len(functions) == 0
+
+        class Handler:
+            def handle(self, value: int):
+                return value
+
+        handler = Handler()
+        plan = get_function_plan(handler.handle)
+        assert [name for name, *_ in plan.parameters] == ['value']
+        assert plan.function == handler.handle
+        assert resolve_function_args(handler.handle, {'value': 1}) == {'value': 1}
+
+    @pytest.mark.timeout(3)
+    def test_scoped_dependencies(self):
+        calls = []
+        events = []
+
+        async def session():
+            events.append('open')
+            yield 'session'
+            events.append('close')
+
+        async def client():
+            await asyncio.sleep(0)
+            calls.append('client')
+            return 'client'
+
+        def counter():
+            calls.append('counter')
+            return len(calls)
+
+        async def handler(s1: str = depends(session),
+                          s2: str = depends(session),
+                          c: str = depends(client, scope='bot'),
+                          n1: int = depends(counter),
+                          n2: int = depends(counter)):
+            events.append('handle')
+            return s1, s2, c, n1, n2
+
+        bot = StubBot()
+
+        async def run():
+            first = await call_with_resolved_args_async(handler, {'bot': bot})
+            second = await call_with_resolved_args_async(handler, {'bot': bot})
+            await bot.before_close_async()
+            return first, second
+
+        first, second = asyncio.run(run())
+
+        assert first == ('session', 'session', 'client', 2, 2)
+        assert second == ('session', 'session', 'client', 3, 3)
+        assert calls == ['client', 'counter', 'counter']
+        assert events == ['open', 'handle', 'close', 'open', 'handle', 'close']
+
+    @pytest.mark.timeout(3)
+    def test_scoped_sync_generator_dependencies(self):
+        events = []
+        bot = StubBot()
+
+        def resource():
+            events.append('open')
+            yield 'resource'
+            events.append('close')
+
+        @bot.task(PeriodTrigger(hours=1), name='with-resource')
+        async def task(task, r=depends(resource, scope='task')):
+            return r
+
+        async def request_handler(r: str = depends(resource)):
+            return r
+
+        async def bot_handler(r: str = depends(resource, scope='bot')):
+            return r
+
+        async def app_handler(r: str = depends(resource, scope='app')):
+            return r
+
+        caller = build_task_caller(task, bot)
+
+        async def run():
+            assert await call_with_resolved_args_async(request_handler, {'bot': bot}) == 'resource'
+            assert events == ['open', 'close']
+            events.clear()
+            for handler in (bot_handler, bot_handler, app_handler, app_handler):
+                assert await call_with_resolved_args_async(handler, {'bot': bot}) == 'resource'
+            await caller()
+            await caller()
+            assert events == ['open', 'open', 'open']
+            await bot.before_close_async()
+            assert events == ['open', 'open', 'open', 'close', 'close']
+            await app_dependency_cache.close_async()
+            assert events[-1] == 'close'
+
+        asyncio.run(run())
+
+    @pytest.mark.timeout(3)
+    def test_cancelled_creator_of_scoped_dependency(self):
+        created = []
+        bot = StubBot()
+
+        async def client():
+            created.append('client')
+            await asyncio.sleep(0.1 if len(created) == 1 else 0)
+            return 'client'
+
+        async def handler(c: str = depends(client, scope='bot')):
+            return c
+
+        async def run():
+            creator = asyncio.create_task(call_with_resolved_args_async(handler, {'bot': bot}))
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(call_with_resolved_args_async(handler, {'bot': bot}))
+            await asyncio.sleep(0.01)
+            creator.cancel()
+            assert await waiter == 'client'
+            assert await call_with_resolved_args_async(handler, {'bot': bot}) == 'client'
+            assert creator.cancelled()
+
+        asyncio.run(run())
+        assert created == ['client', 'client']
+
+    @pytest.mark.timeout(3)
+    def test_heap_scheduler(self):
+        logs: list[tuple[str, float]] = []
+        bot = StubBot()
+
+        @bot.task(PeriodTrigger(seconds=0.2), run_at_start=False, name='period')
+        async def period_task():
+            ...
+
+        @bot.task(PeriodTrigger(hours=1), run_at_start=True, name='at-start')
+        async def at_start_task():
+            ...
+
+        @bot.task(PeriodTrigger(hours=1), run_at_start=True, name='added-later')
+        async def added_later_task():
+            ...
+
+        def make_caller(name: str):
+            async def caller():
+                logs.append((name, round(time.monotonic() - start_point, 1)))
+            return caller
+
+        sched = HeapScheduler()
+        sched.add_task(period_task, make_caller('period'))
+        sched.add_task(at_start_task, make_caller('at-start'))
+
+        async def start():
+            task_scheduler = asyncio.create_task(sched.start())
+            await asyncio.sleep(0.3)
+            sched.add_task(added_later_task, make_caller('added-later'))
+            await asyncio.sleep(0.2)
+            sched.remove_task('period')
+            await asyncio.sleep(0.3)
+            task_scheduler.cancel()
+
+        start_point = time.monotonic()
+        asyncio.run(start())
+        assert logs == [
+            ('at-start', 0.0),
+            ('period', 0.2),
+            ('added-later', 0.3),
+            ('period', 0.4),
+        ]
+        assert sched.list_tasks() == ['at-start', 'added-later']
+
+    @pytest.mark.timeout(3)
+    def test_tasks_overlap_policies(self):
+        logs: list[tuple[str, float]] = []
+        bot = StubBot()
+
+        @bot.task(PeriodTrigger(seconds=0.1), run_at_start=True, name='skip', overlap='skip')
+        async def skip_task():
+            ...
+
+        @bot.task(PeriodTrigger(seconds=0.1), run_at_start=True, name='queue', overlap='queue')
+        async def queue_task():
+            ...
+
+        @bot.task(PeriodTrigger(seconds=0.1), run_at_start=True, name='ping')
+        async def ping_task():
+            ...
+
+        def make_caller(name: str, duration: float):
+            async def caller():
+                logs.append((name, round(time.monotonic() - start_point, 1)))
+                await asyncio.sleep(duration)
+            return caller
+
+        sched = HeapScheduler()
+        sched.add_task(skip_task, make_caller('skip', 0.22))
+        sched.add_task(queue_task, make_caller('queue', 0.22))
+        sched.add_task(ping_task, make_caller('ping', 0))
+
+        async def start():
+            task_scheduler = asyncio.create_task(sched.start())
+            await asyncio.sleep(0.35)
+            task_scheduler.cancel()
+
+        start_point = time.monotonic()
+        asyncio.run(start())
+        assert [at for name, at in logs if name == 'skip'] == [0.0, 0.3]
+        assert [at for name, at in logs if name == 'queue'] == [0.0, 0.2]
+        assert [at for name, at in logs if name == 'ping'] == [0.0, 0.1, 0.2, 0.3]
+
+    @pytest.mark.timeout(3)
+    def test_task_timeout(self):
+        finished = []
+        bot = StubBot()
+
+        @bot.task(PeriodTrigger(hours=1), timeout=0.1)
+        async def slow_task():
+            await asyncio.sleep(1)
+            finished.append(True)
+
+        caller = build_task_caller(slow_task, bot)
+        start_point = time.monotonic()
+        asyncio.run(caller())
+        assert time.monotonic() - start_point < 0.5
+        assert finished == []
+
+    @pytest.mark.timeout(3)
+    def test_cron_trigger(self):
+        moment = datetime(2024, 2, 28, 23, 59, 30, tzinfo=timezone.utc)
+
+        def next_fire(expression: str) -> datetime | None:
+            return CronTrigger(expression).next_fire_after(moment)
+
+        assert next_fire('0 * * * *') == datetime(2024, 2, 29, 0, 0, tzinfo=timezone.utc)
+        assert next_fire('*/15 9-17 * * 1-5') == datetime(2024, 2, 29, 9, 0, tzinfo=timezone.utc)
+        assert next_fire('30 2 * * 0') == datetime(2024, 3, 3, 2, 30, tzinfo=timezone.utc)
+        assert next_fire('0 0 13 * 5') == datetime(2024, 3, 1, 0, 0, tzinfo=timezone.utc)
+        assert next_fire('@monthly') == datetime(2024, 3, 1, 0, 0, tzinfo=timezone.utc)
+        assert next_fire('0 0 30 2 *') is None
+        for expression in ('* * *', '60 * * * *', '*/0 * * * *', 'a * * * *'):
+            with pytest.raises(ValueError):
+                CronTrigger(expression)
+
+    @pytest.mark.timeout(3)
+    def test_cron_trigger_over_dst_changes(self):
+        new_york = ZoneInfo('America/New_York')
+        every_minute = CronTrigger('* * * * *', tz=new_york)
+        # 1:30 EST, the second time the clocks show 1:30 this night
+        moment = datetime(2026, 11, 1, 6, 30, tzinfo=timezone.utc)
+        assert every_minute.next_fire_after(moment) == datetime(2026, 11, 1, 6, 31, tzinfo=timezone.utc)
+        # 2:30 doesn't happen when the clocks go forward, so the task fires right after the change
+        half_past_two = CronTrigger('30 2 * * *', tz=new_york)
+        moment = datetime(2026, 3, 8, 6, 0, tzinfo=timezone.utc)
+        assert half_past_two.next_fire_after(moment) == datetime(2026, 3, 8, 7, 30, tzinfo=timezone.utc)
+        for moment in (datetime(2026, 11, 1, 5, 0, tzinfo=timezone.utc) + timedelta(minutes=i) for i in range(150)):
+            assert every_minute.next_fire_after(moment) > moment
+
+    @pytest.mark.timeout(3)
+    def test_one_shot_and_jittered_triggers(self):
+        logs: list[tuple[str, float]] = []
+        bot = StubBot()
+
+        @bot.task(AtTrigger(datetime.now(tz=timezone.utc) + timedelta(seconds=0.2)), name='once')
+        async def once_task():
+            ...
+
+        @bot.task(JitteredPeriodTrigger(seconds=0.05, jitter=0.1), name='jittered')
+        async def jittered_task():
+            ...
+
+        @bot.task(PeriodTrigger(seconds=0), name='zero-period')
+        async def zero_period_task():
+            ...
+
+        def make_caller(name: str):
+            async def caller():
+                logs.append((name, round(time.monotonic() - start_point, 1)))
+            return caller
+
+        sched = HeapScheduler()
+        sched.add_task(once_task, make_caller('once'))
+        sched.add_task(jittered_task, make_caller('jittered'))
+        sched.add_task(zero_period_task, make_caller('zero-period'))
+
+        async def start():
+            task_scheduler = asyncio.create_task(sched.start())
+            await asyncio.sleep(0.5)
+            task_scheduler.cancel()
+
+        start_point = time.monotonic()
+        asyncio.run(start())
+        assert [at for name, at in logs if name == 'once'] == [0.2]
+        assert 3 <= len([at for name, at in logs if name == 'jittered']) <= 10
+        # The zero period doesn't make the scheduler spin
+        assert 10 <= len([at for name, at in logs if name == 'zero-period']) <= 51
+
+    @pytest.mark.timeout(3)
+    def test_job_store_misfire_policies(self, tmp_path):
+        path = str(tmp_path / 'jobs.db')
+        logs: list[str] = []
+        bot = StubBot()
+
+        @bot.task(PeriodTrigger(seconds=1), name='run-once')
+        async def run_once_task():
+            ...
+
+        @bot.task(PeriodTrigger(seconds=1), name='run-all', misfire='run_all')
+        async def run_all_task():
+            ...
+
+        @bot.task(PeriodTrigger(seconds=1), name='skip', misfire='skip')
+        async def skip_task():
+            ...
+
+        @bot.task(PeriodTrigger(hours=1), run_at_start=True, name='at-start')
+        async def at_start_task():
+            ...
+
+        def make_caller(name: str):
+            async def caller():
+                logs.append(name)
+            return caller
+
+        async def save_states():
+            store = SQLiteJobStore(path)
+            last_run = datetime.now(tz=timezone.utc) - timedelta(seconds=3.5)
+            for name in ('run-once', 'run-all', 'skip'):
+                store.save(name, JobState(last_run=last_run, next_run=None))
+            store.save('at-start', JobState(last_run=datetime.now(tz=timezone.utc), next_run=None))
+            await store.close_async()
+
+        async def start():
+            sched = HeapScheduler(job_store=SQLiteJobStore(path))
+            for task in (run_once_task, run_all_task, skip_task, at_start_task):
+                sched.add_task(task, make_caller(task.name))
+            task_scheduler = asyncio.create_task(sched.start())
+            await asyncio.sleep(0.3)
+            task_scheduler.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task_scheduler
+
+        asyncio.run(save_states())
+        asyncio.run(start())
+        assert sorted(logs) == ['run-all', 'run-all', 'run-all', 'run-once']
+        state = SQLiteJobStore(path).load('run-once')
+        assert datetime.now(tz=timezone.utc) - state.last_run < timedelta(seconds=1)
+        assert state.next_run == state.last_run + timedelta(seconds=1)
+
+    @pytest.mark.timeout(3)
+    def test_schedule_tasks_at_runtime(self):
+        reminded: list[int] = []
+        bot = StubBot()
+        sched = HeapScheduler()
+        build_scheduler([bot], sched)
+
+        async def remind(user_id: int):
+            reminded.append(user_id)
+
+        async def start():
+            task_scheduler = asyncio.create_task(sched.start())
+            bot.schedule(remind, AtTrigger(datetime.now(tz=timezone.utc) + timedelta(seconds=0.1)),
+                         key='once', user_id=1)
+            bot.schedule(remind, PeriodTrigger(seconds=0.1), key='period', user_id=2)
+            bot.schedule(remind, PeriodTrigger(seconds=0.1), key='cancelled', user_id=3)
+            bot.unschedule('cancelled')
+            await asyncio.sleep(0.35)
+            assert sched.list_tasks() == ['period']
+            assert list(bot._scheduled_tasks) == ['period']
+            disable_tasks(bot, sched)
+            assert not sched.has_task('period')
+            task_scheduler.cancel()
+
+        asyncio.run(start())
+        assert sorted(reminded) == [1, 2, 2, 2]
+
+    @pytest.mark.timeout(3)
+    def test_cancelled_tasks_dont_pile_up(self, tmp_path):
+        bot = StubBot()
+        saved_store = SQLiteJobStore(str(tmp_path / 'jobs.db'))
+        saved_store.load('999')
+        saved_store.save('999', JobState(None, None))
+        asyncio.run(saved_store.close_async())
+        job_store = SQLiteJobStore(str(tmp_path / 'jobs.db'))
+        sched = HeapScheduler(job_store=job_store)
+        build_scheduler([bot], sched)
+
+        async def remind():
+            ...
+
+        async def start():
+            bot.schedule(remind, PeriodTrigger(hours=1), key='kept')
+            for i in range(1000):
+                key = bot.schedule(remind, AtTrigger(datetime.now(tz=timezone.utc) + timedelta(days=1)), key=f'{i}')
+                bot.unschedule(key)
+            assert len(sched._HeapScheduler__heap) <= 3
+            assert sched.list_tasks() == ['kept']
+            await job_store.close_async()
+
+        asyncio.run(start())
+        assert SQLiteJobStore(str(tmp_path / 'jobs.db')).load('999') is None
+
+    @pytest.mark.timeout(3)
+    def test_due_one_shot_tasks(self):
+        reminded: list[str] = []
+        bot = StubBot()
+        sched = HeapScheduler()
+        build_scheduler([bot], sched)
+
+        async def remind(label: str):
+            reminded.append(label)
+
+        async def start():
+            task_scheduler = asyncio.create_task(sched.start())
+            current_time = datetime.now(tz=timezone.utc)
+            bot.schedule(remind, AtTrigger(current_time), key='now', label='now')
+            bot.schedule(remind, AtTrigger(current_time - timedelta(seconds=5)), key='past', label='past')
+            bot.schedule(remind, AtTrigger(current_time - timedelta(seconds=5)), key='skipped', misfire='skip',
+                         label='skipped')
+            assert not sched.has_task('skipped') and 'skipped' not in bot._scheduled_tasks
+            await asyncio.sleep(0.1)
+            task_scheduler.cancel()
+
+        asyncio.run(start())
+        assert sorted(reminded) == ['now', 'past']
+        assert sched.list_tasks() == [] and bot._scheduled_tasks == {}
+
+    @pytest.mark.timeout(3)
+    def test_finished_tasks_are_deleted_from_job_store(self):
+        job_store = MemoryJobStore()
+        sched = HeapScheduler(job_store=job_store)
+        bot = StubBot()
+        build_scheduler([bot], sched)
+
+        async def remind():
+            ...
+
+        async def start():
+            task_scheduler = asyncio.create_task(sched.start())
+            for i in range(100):
+                bot.schedule(remind, AtTrigger(datetime.now(tz=timezone.utc) + timedelta(seconds=0.05)), key=f'{i}')
+            await asyncio.sleep(0.2)
+            task_scheduler.cancel()
+
+        asyncio.run(start())
+        assert sched.list_tasks() == []
+        assert all(job_store.load(f'{i}') is None for i in range(100))
+
+    @pytest.mark.timeout(3)
+    def test_task_scoped_dependencies(self):
+        events = []
+        bot = StubBot()
+
+        async def connection():
+            events.append('open')
+            yield 'connection'
+            events.append('close')
+
+        @bot.task(PeriodTrigger(hours=1), name='with-connection')
+        async def task_with_connection(task, conn=depends(connection, scope='task')):
+            events.append((task.name, conn))
+
+        caller = build_task_caller(task_with_connection, bot)
+
+        async def run():
+            await caller()
+            await caller()
+            await bot.before_close_async()
+
+        asyncio.run(run())
+        assert events == ['open', ('with-connection', 'connection'), ('with-connection', 'connection'), 'close']
+
+    @pytest.mark.timeout(3)
+    def test_update_dependencies(self):
+        shared = {'name': 'bot', 'handler': 'default handler'}
+        deps = UpdateDependencies(shared, {'message': 'hi'})
+        deps['handler'] = 'command handler'
+
+        assert deps['name'] == 'bot'
+        assert deps['handler'] == 'command handler'
+        assert deps['all_deps'] is deps
+        assert 'name' in deps and 'all_deps' in deps and 'sender' not in deps
+        assert deps.get('sender', 1) == 1
+        assert set(deps) == {'message', 'handler', 'name'}
+        assert len(deps) == 3
+        assert repr(deps) == "UpdateDependencies({'message': 'hi', 'handler': 'command handler', 'name': 'bot'})"
+        assert dict(deps.items()) == deps.to_dict() == {'message': 'hi', 'handler': 'command handler', 'name': 'bot'}
+        assert {**deps}['name'] == 'bot'
+        made_chats = []
+        lazy_deps = UpdateDependencies(shared, {'message': 'hi'}, {'chat': lambda _: made_chats.append('chat') or 'chat'})
+        assert 'chat' in lazy_deps
+        assert list(lazy_deps.values()) == ['hi', 'bot', 'default handler'] and made_chats == []
+        assert lazy_deps['chat'] == 'chat' and 'chat' in lazy_deps.keys() and made_chats == ['chat']
+        assert shared['handler'] == 'default handler'
+        assert resolve_function_args(lambda name, message: (name, message), deps) == {'name': 'bot', 'message': 'hi'}
+        with pytest.raises(AssertionError):
+            resolve_function_args(lambda sender: sender, deps)
+
+    @pytest.mark.timeout(10)
+    def test_update_dependencies_allocations(self):
+        updates_count = 2000
+        bot = Bot()
+
+        @bot.listener()
+        async def listen_async():
+            while True:
+                yield {'value': 'Some value', 'update_id': 1}
+
+        @bot.handler()
+        async def handler(value: str, name: str, all_deps: dict):
+            pass
+
+        SwiftBots().add_bots([bot])
+        output = {'value': 'Some value', 'update_id': 1}
+
+        def measure_allocated(make_deps) -> int:
+            before = tracemalloc.get_traced_memory()[0]
+            kept = [make_deps() for _ in range(updates_count)]
+            allocated = tracemalloc.get_traced_memory()[0] - before
+            kept.clear()
+            return allocated
+
+        def copy_dependencies() -> dict:
+            deps = decompose_bot_as_dependencies(bot)
+            deps.update(output)
+            return deps
+
+        async def handle_updates(entry, count: int) -> None:
+            generator = bot.listener_func()
+            for _ in range(count):
+                generator = await entry(generator)
+            await generator.aclose()
+
+        entry = compose_middlewares(bot, bot._middlewares)
+        gc.disable()
+        tracemalloc.start()
+        try:
+            copied = measure_allocated(copy_dependencies)
+            layered = measure_allocated(lambda: UpdateDependencies(bot._shared_dependencies, output))
+            asyncio.run(handle_updates(entry, 10))
+            before = tracemalloc.get_traced_memory()[0]
+            asyncio.run(handle_updates(entry, updates_count))
+            leaked = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+            gc.enable()
 
+        # The dependencies of the bot aren't copied for every update
+        assert layered < copied
+        # There are no reference cycles, so the dependencies are freed right after the update is handled
+        # even when the garbage collector is disabled
+        assert leaked / updates_count < 50
@@ -0,0 +1,178 @@
+import asyncio
+
+import pytest
+
+from swiftbots import Bot, ChatBot, SwiftBots
+from swiftbots.dispatchers import ConcurrentDispatcher, KeyedDispatcher
+from tests.common import close_test_app, run_raisable
+
+
+class TestConcurrency:
+    @pytest.mark.timeout(3)
+    def test_slow_handler_does_not_block_listener(self):
+        app = SwiftBots()
+        bot = Bot(max_concurrency=2)
+        fast_handled = asyncio.Event()
+        order = []
+
+        @bot.listener()
+        async def listen_async():
+            yield {'value': 'slow'}
+            yield {'value': 'fast'}
+            await asyncio.sleep(1000)
+
+        @bot.handler()
+        async def handler(value: str):
+            if value == 'slow':
+                await fast_handled.wait()
+                order.append(value)
+                close_test_app()
+            else:
+                order.append(value)
+                fast_handled.set()
+
+        app.add_bots([bot])
+
+        run_raisable(app)
+
+        assert order == ['fast', 'slow']
+
+    @pytest.mark.timeout(3)
+    def test_concurrency_is_bounded(self):
+        app = SwiftBots()
+        bot = Bot(max_concurrency=2)
+        running = 0
+        max_running = 0
+        handled = 0
+
+        @bot.listener()
+        async def listen_async():
+            for _ in range(10):
+                yield {}
+            await asyncio.sleep(1000)
+
+        @bot.handler()
+        async def handler():
+            nonlocal running, max_running, handled
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            handled += 1
+            if handled == 10:
+                close_test_app()
+
+        app.add_bots([bot])
+
+        run_raisable(app)
+
+        assert max_running == 2
+
+    @pytest.mark.timeout(3)
+    def test_chat_bot_keeps_order_per_sender(self):
+        app = SwiftBots()
+        bot = ChatBot(max_concurrency=4)
+        other_sender_handled = asyncio.Event()
+        handled = []
+
+        @bot.listener()
+        async def listen_async():
+            for i in range(3):
+                yield {'message': f'{i}', 'sender': 'Katze'}
+            yield {'message': '0', 'sender': 'Maus'}
+            await asyncio.sleep(1000)
+
+        @bot.default_handler()
+        async def default_handler(message: str, sender: str):
+            if sender == 'Katze' and message == '0':
+                await other_sender_handled.wait()
+            await asyncio.sleep(0)
+            handled.append((sender, message))
+            if sender == 'Maus':
+                other_sender_handled.set()
+            if len(handled) == 4:
+                close_test_app()
+
+        @bot.sender()
+        async def send_async(message, user):
+            ...
+
+        app.add_bots([bot])
+
+        run_raisable(app)
+
+        assert handled == [('Maus', '0'), ('Katze', '0'), ('Katze', '1'), ('Katze', '2')]
+        assert bot._dispatcher.queues_count == 0
+
+    @pytest.mark.timeout(3)
+    def test_cancelled_error_of_handler_does_not_stop_workers(self):
+        app = SwiftBots()
+        bot = ChatBot(max_concurrency=2)
+
+        @bot.listener()
+        async def listen_async():
+            yield {'message': 'cancel', 'sender': 'Katze'}
+            yield {'message': 'cancel', 'sender': 'Maus'}
+            yield {'message': 'close', 'sender': 'Hund'}
+            await asyncio.sleep(1000)
+
+        @bot.default_handler()
+        async def default_handler(message: str):
+            if message == 'cancel':
+                future = asyncio.get_running_loop().create_future()
+                future.cancel()
+                await future
+            close_test_app()
+
+        @bot.sender()
+        async def send_async(message, user):
+            ...
+
+        app.add_bots([bot])
+
+        run_raisable(app)
+
+        assert bot._dispatcher.queues_count == 0
+
+    @pytest.mark.timeout(3)
+    def test_restarted_dispatcher_keeps_the_limit(self):
+        bot = Bot()
+
+        async def slow_handler(_):
+            await asyncio.sleep(1000)
+
+        async def start_slow_handler(dispatcher):
+            await dispatcher.dispatch(slow_handler, None)
+
+        async def free_slots(dispatcher):
+            # Handlers of the previous run are finishing their cancellation now
+            await asyncio.sleep(0.01)
+            return dispatcher._semaphore._value
+
+        async def restart(dispatcher):
+            await dispatcher.supervise(bot, start_slow_handler(dispatcher))
+            return await dispatcher.supervise(bot, free_slots(dispatcher))
+
+        assert asyncio.run(restart(ConcurrentDispatcher(1))) == 1
+        assert asyncio.run(restart(KeyedDispatcher(1, key=lambda _: 'key'))) == 16
+
+    @pytest.mark.timeout(3)
+    def test_exited_worker_is_replaced(self):
+        bot = Bot()
+        handled = []
+
+        async def handler(obj):
+            handled.append(obj)
+
+        async def listen(dispatcher):
+            # A worker exits as if it was cancelled by someone else
+            next(iter(dispatcher._workers)).cancel()
+            await asyncio.sleep(0)
+            for obj in ('a', 'b', 'c'):
+                await dispatcher.dispatch(handler, obj)
+            await asyncio.sleep(0.01)
+            return len(dispatcher._workers), dispatcher.in_flight
+
+        dispatcher = KeyedDispatcher(1, key=lambda obj: obj)
+        assert asyncio.run(dispatcher.supervise(bot, listen(dispatcher))) == (1, 0)
+        assert handled == ['a', 'b', 'c']
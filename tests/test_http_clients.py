@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from swiftbots import SwiftBots, TelegramBot
+from swiftbots.http_clients import HttpClientPool, get_default_http_pool
+
+
+class TestHttpClients:
+    @pytest.mark.timeout(3)
+    def test_client_is_shared_within_loop(self):
+        pool = HttpClientPool(max_connections=10, max_keepalive_connections=5)
+
+        async def get_clients():
+            clients = pool.async_client, pool.async_client
+            return clients
+
+        first_loop_clients = asyncio.run(get_clients())
+        second_loop_clients = asyncio.run(get_clients())
+
+        assert first_loop_clients[0] is first_loop_clients[1]
+        assert second_loop_clients[0] is second_loop_clients[1]
+        assert first_loop_clients[0] is not second_loop_clients[0]
+
+    @pytest.mark.timeout(3)
+    def test_bots_use_app_pool(self):
+        pool = HttpClientPool()
+        app = SwiftBots(http_pool=pool)
+        bot1 = TelegramBot('token1')
+        bot2 = TelegramBot('token2')
+        for bot in (bot1, bot2):
+            bot.default_handler()(lambda: None)
+        app.add_bots([bot1, bot2])
+
+        assert bot1._http_pool is pool
+        assert bot2._http_pool is pool
+        assert SwiftBots()._SwiftBots__http_pool is get_default_http_pool()
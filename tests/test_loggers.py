@@ -0,0 +1,176 @@
+import asyncio
+import io
+import json
+import logging
+import threading
+
+import pytest
+
+from swiftbots import Bot, SwiftBots
+from swiftbots.loggers import (
+    AdminLoggerFactory,
+    JsonLoggerFactory,
+    QueueLoggerFactory,
+    SysIOLoggerFactory,
+    flush_report_aggregators_async,
+)
+from tests.common import close_test_app, extract_exception_handler_middlewares, run_raisable
+
+
+class SlowHandler(logging.Handler):
+    def __init__(self, release: threading.Event):
+        super().__init__()
+        self.unblocked = release
+        self.messages: list[str] = []
+        self.threads: list[str] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.unblocked.wait()
+        self.threads.append(threading.current_thread().name)
+        self.messages.append(record.getMessage())
+
+
+class CountingStr:
+    def __init__(self):
+        self.count = 0
+
+    def __str__(self) -> str:
+        self.count += 1
+        return 'formatted'
+
+
+class TestLoggers:
+    @pytest.mark.timeout(3)
+    def test_queue_logger_doesnt_block(self):
+        release = threading.Event()
+        handler = SlowHandler(release)
+        logger = logging.getLogger('test_queue_logger')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.addHandler(handler)
+
+        factory = QueueLoggerFactory(logger, max_queue_size=3)
+        bot_logger = factory.get_logger()
+        for i in range(10):
+            bot_logger.info('message %d', i)
+        # The handler is blocked, but logging is not
+        assert factory.queue_depth + factory.dropped_count + 1 >= 10
+        assert factory.dropped_count >= 6
+
+        release.set()
+        factory.close()
+        assert handler.messages[0] == 'message 0'
+        assert handler.messages[-1].endswith('dropped because the logging queue was full')
+        # Queued records are handled in the background, the warning about dropped ones is logged after closing
+        assert threading.current_thread().name not in handler.threads[:-1]
+        assert logger.handlers == [handler]
+
+    @pytest.mark.timeout(3)
+    def test_disabled_messages_are_not_formatted(self):
+        logger = logging.getLogger('test_lazy_logger')
+        logger.setLevel(logging.WARNING)
+        reports = []
+
+        async def report_async(msg: str) -> None:
+            reports.append(msg)
+
+        sysio_logger = SysIOLoggerFactory(logger).get_logger()
+        admin_logger = AdminLoggerFactory(reports.append, report_async, logger).get_logger()
+        arg = CountingStr()
+
+        async def log():
+            await sysio_logger.info_async('Message %s', arg)
+            await admin_logger.debug_async('Message %s', arg)
+            assert arg.count == 0
+            await admin_logger.error_async('Error %s', arg)
+            admin_logger.critical('Critical %s', arg)
+
+        asyncio.run(log())
+        assert not sysio_logger.is_enabled_for(logging.INFO)
+        assert admin_logger.is_enabled_for(logging.ERROR)
+        assert reports == ['Error formatted', 'Critical formatted']
+
+    @pytest.mark.timeout(3)
+    def test_errors_are_reported_in_digests(self):
+        logger = logging.getLogger('test_digest_logger')
+        reports = []
+
+        async def report_async(msg: str) -> None:
+            reports.append(msg)
+
+        factory = AdminLoggerFactory(reports.append, report_async, logger, report_window=0.1)
+        admin_logger = factory.get_logger()
+
+        async def log():
+            for _ in range(3):
+                await admin_logger.error_async('Timeout in %s', 'handler')
+            await admin_logger.critical_async('Database is down')
+            assert reports == []
+            await asyncio.sleep(0.15)
+            assert len(reports) == 1
+            await admin_logger.error_async('Timeout in %s', 'handler')
+            await admin_logger.report_async('Application is closed')
+
+        asyncio.run(log())
+        assert reports == [
+            '4 reports in the last 0.1 seconds:\n\n[3 times] Timeout in handler\n\nDatabase is down',
+            'Timeout in handler',
+            'Application is closed',
+        ]
+
+    @pytest.mark.timeout(3)
+    def test_digests_are_sent_at_shutdown(self):
+        logger = logging.getLogger('test_digest_shutdown_logger')
+        reports = []
+
+        async def report_async(msg: str) -> None:
+            reports.append(msg)
+
+        factory = AdminLoggerFactory(reports.append, report_async, logger, report_window=60)
+        admin_logger = factory.get_logger()
+
+        async def close_app():
+            await admin_logger.error_async('Sent when the app is closed')
+            await flush_report_aggregators_async()
+            assert reports == ['Sent when the app is closed']
+
+        async def close_loop():
+            await admin_logger.error_async('Sent when the loop is closed')
+
+        asyncio.run(close_app())
+        asyncio.run(close_loop())
+        assert reports == ['Sent when the app is closed', 'Sent when the loop is closed']
+
+    @pytest.mark.timeout(3)
+    def test_json_logs_with_update_context(self):
+        stream = io.StringIO()
+        logger = logging.getLogger('test_json_logger')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        factory = JsonLoggerFactory(logger, logging.StreamHandler(stream))
+        bot = Bot(name='json-bot', bot_logger_factory=factory)
+        extract_exception_handler_middlewares(bot)
+
+        @bot.handler()
+        async def greet(logger, sender: int):
+            await logger.info_async('Greeting %s', sender)
+            close_test_app()
+
+        @bot.listener()
+        async def listen_async():
+            yield {'update_id': 7, 'sender': 42}
+
+        app = SwiftBots()
+        app.add_bot(bot)
+        bot.logger.warning('Not in an update')
+        run_raisable(app)
+
+        first, second = (json.loads(line) for line in stream.getvalue().splitlines()[:2])
+        assert first['message'] == 'Not in an update'
+        assert first['bot_name'] == 'json-bot'
+        assert 'update_id' not in first
+        assert second['message'] == 'Greeting 42'
+        assert second['level'] == 'INFO'
+        assert (second['bot_name'], second['update_id'], second['sender'], second['handler']) == \
+               ('json-bot', 7, 42, 'greet')
+        assert second['elapsed_ms'] >= 0
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from swiftbots import TelegramBot
+from swiftbots.rate_limiters import TelegramRateLimiter
+
+
+def make_update(update_id: int, text: str, sender: int = 1) -> dict:
+    return {
+        'update_id': update_id,
+        'message': {'message_id': update_id, 'from': {'id': sender}, 'text': text},
+    }
+
+
+def use_transport(bot: TelegramBot, handler) -> None:
+    bot._TelegramBot__http_session = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+class TestTelegramBot:
+    @pytest.mark.timeout(3)
+    def test_batch_long_polling(self):
+        bot = TelegramBot('token', skip_old_updates=False)
+        requests = []
+        batches = [
+            [make_update(10, 'a'), make_update(11, 'b'), make_update(12, 'c')],
+            [make_update(13, 'd')],
+        ]
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            data = json.loads(request.content)
+            requests.append(data)
+            if data['limit'] == 1:  # skipping old updates
+                return httpx.Response(200, json={'ok': True, 'result': []})
+            return httpx.Response(200, json={'ok': True, 'result': batches.pop(0)})
+
+        async def collect() -> list[dict]:
+            use_transport(bot, handler)
+            updates = []
+            async for update in bot._get_updates_async():
+                updates.append(update)
+                if len(updates) == 4:
+                    break
+            return updates
+
+        updates = asyncio.run(collect())
+
+        assert [u['update_id'] for u in updates] == [10, 11, 12, 13]
+        assert requests[1]['limit'] == 100
+        assert requests[2]['offset'] == 13
+
+    @pytest.mark.timeout(3)
+    def test_restarted_polling_keeps_the_rest_of_batch(self):
+        bot = TelegramBot('token', skip_old_updates=False)
+        requests = []
+        batches = [
+            [make_update(10, 'a'), make_update(11, 'b'), make_update(12, 'c')],
+            [make_update(12, 'c')],
+        ]
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            data = json.loads(request.content)
+            requests.append(data)
+            if data['limit'] == 1:  # skipping old updates
+                return httpx.Response(200, json={'ok': True, 'result': []})
+            return httpx.Response(200, json={'ok': True, 'result': batches.pop(0)})
+
+        async def collect(count: int) -> list[int]:
+            updates = []
+            listener = bot._get_updates_async()
+            async for update in listener:
+                updates.append(update['update_id'])
+                if len(updates) == count:
+                    break
+            await listener.aclose()
+            return updates
+
+        async def restart() -> list[int]:
+            use_transport(bot, handler)
+            return await collect(2) + await collect(1)
+
+        assert asyncio.run(restart()) == [10, 11, 12]
+        assert requests[-1]['offset'] == 12
+
+    @pytest.mark.timeout(3)
+    def test_retry_after_is_honored(self):
+        bot = TelegramBot('token')
+        answers = [
+            {'ok': False, 'error_code': 429, 'description': 'Too Many Requests', 'parameters': {'retry_after': 0.3}},
+            {'ok': True, 'result': {}},
+        ]
+        sent_at = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            sent_at.append(time.monotonic())
+            return httpx.Response(200, json=answers.pop(0))
+
+        async def send():
+            use_transport(bot, handler)
+            return await bot.fetch_async('sendMessage', {'chat_id': 1, 'text': 'hi'})
+
+        answer = asyncio.run(send())
+
+        assert answer['ok']
+        assert len(sent_at) == 2
+        assert sent_at[1] - sent_at[0] >= 0.3
+
+    @pytest.mark.timeout(3)
+    def test_rate_limiter_queues_messages_to_one_chat(self):
+        limiter = TelegramRateLimiter(global_rate=100, chat_rate=10, chat_burst=1)
+        depths = []
+
+        async def send_many():
+            start = time.monotonic()
+            sends = [asyncio.create_task(limiter.acquire_async(42)) for _ in range(4)]
+            await asyncio.sleep(0.01)
+            depths.append((limiter.queue_depth, limiter.chat_queue_depth(42)))
+            await asyncio.gather(*sends)
+            await limiter.acquire_async(-100)
+            depths.append((limiter.queue_depth, limiter.chat_queue_depth(42)))
+            return time.monotonic() - start
+
+        elapsed = asyncio.run(send_many())
+
+        assert 0.3 <= elapsed < 1
+        assert depths == [(3, 3), (0, 0)]
+
+    @pytest.mark.timeout(3)
+    def test_rate_limiter_block_is_prolonged(self):
+        limiter = TelegramRateLimiter()
+
+        async def send_while_blocked():
+            start = time.monotonic()
+            limiter.block(0.1)
+            send = asyncio.create_task(limiter.acquire_async(42))
+            await asyncio.sleep(0.05)
+            limiter.block(0.2)
+            await send
+            return time.monotonic() - start
+
+        elapsed = asyncio.run(send_while_blocked())
+
+        assert 0.25 <= elapsed < 1
+        assert limiter.blocked_for == 0
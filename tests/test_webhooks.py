@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+import pytest
+
+from swiftbots.webhooks import WebhookServer
+
+
+async def post(port: int, path: str, body: bytes, headers: dict | None = None) -> int:
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    head = f'POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\nConnection: close\r\n'
+    for key, value in (headers or {}).items():
+        head += f'{key}: {value}\r\n'
+    writer.write(head.encode() + b'\r\n' + body)
+    await writer.drain()
+    status_line = await reader.readline()
+    writer.close()
+    return int(status_line.split()[1])
+
+
+class TestWebhooks:
+    @pytest.mark.timeout(3)
+    def test_routing_and_secret_token(self):
+        statuses = []
+        received = {}
+
+        async def run():
+            server = WebhookServer(host='127.0.0.1', port=0)
+            queue1 = server.add_route('/bot1', secret_token='secret')
+            queue2 = server.add_route('/bot2')
+            await server.start()
+            port = server.bound_port
+            update = json.dumps({'update_id': 1}).encode()
+
+            statuses.append(await post(port, '/bot1', update, {'X-Telegram-Bot-Api-Secret-Token': 'secret'}))
+            statuses.append(await post(port, '/bot1', update, {'X-Telegram-Bot-Api-Secret-Token': 'wrong'}))
+            statuses.append(await post(port, '/bot2', update))
+            statuses.append(await post(port, '/bot3', update))
+            statuses.append(await post(port, '/bot2', b'not a json'))
+
+            received['bot1'] = queue1.qsize(), queue1.get_nowait()
+            received['bot2'] = queue2.qsize(), queue2.get_nowait()
+            await server.stop()
+
+        asyncio.run(run())
+
+        assert statuses == [200, 403, 200, 404, 400]
+        assert received == {'bot1': (1, {'update_id': 1}), 'bot2': (1, {'update_id': 1})}
+
+    @pytest.mark.timeout(3)
+    def test_keep_alive_connection(self):
+        statuses = []
+
+        async def run():
+            server = WebhookServer(host='127.0.0.1', port=0)
+            queue = server.add_route('/bot')
+            await server.start()
+            reader, writer = await asyncio.open_connection('127.0.0.1', server.bound_port)
+            for i in range(3):
+                body = json.dumps({'update_id': i}).encode()
+                writer.write(f'POST /bot HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n'.encode() + body)
+                statuses.append(int((await reader.readline()).split()[1]))
+                while await reader.readline() != b'\r\n':
+                    pass
+            writer.close()
+            await server.stop()
+            return [queue.get_nowait()['update_id'] for _ in range(queue.qsize())]
+
+        assert asyncio.run(run()) == [0, 1, 2]
+        assert statuses == [200, 200, 200]
+
+    @pytest.mark.timeout(3)
+    def test_stop_with_full_queue(self):
+        async def run():
+            server = WebhookServer(host='127.0.0.1', port=0, max_queue_size=1)
+            server.add_route('/bot')
+            await server.start()
+            port = server.bound_port
+            assert await post(port, '/bot', json.dumps({'update_id': 1}).encode()) == 200
+            # Nobody reads the queue, so the second request waits for space in it
+            blocked = asyncio.create_task(post(port, '/bot', json.dumps({'update_id': 2}).encode()))
+            await asyncio.sleep(0.1)
+            await server.stop()
+            await asyncio.wait_for(asyncio.gather(blocked, return_exceptions=True), 1)
+            return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+        assert asyncio.run(run()) == []